@@ -0,0 +1,53 @@
+# benchmark_features.py (debe estar en la raíz del proyecto)
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+# Agregar la carpeta src al path para poder importar los módulos
+sys.path.append('src')
+
+from utils import load_config
+from data_processing import CoffeeDataProcessor
+
+def synthetic_monthly_data(n_countries=50, n_types=4, start='1990-01-01', end='2020-12-01', seed=42):
+    """Monthly sell-through rows for every (country, coffee_type) series"""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, end, freq='MS')
+    countries = [f'Country_{i:03d}' for i in range(n_countries)]
+    coffee_types = ['Arabica', 'Robusta', 'Liberica', 'Excelsa'][:n_types]
+
+    index = pd.MultiIndex.from_product([countries, coffee_types, dates], names=['country', 'coffee_type', 'date'])
+    df = index.to_frame(index=False)
+    n = len(df)
+    seasonal = 1 + 0.2 * np.sin(2 * np.pi * df['date'].dt.month.to_numpy() / 12)
+    df['consumption_cups'] = rng.gamma(5, 20, n) * seasonal
+    df['price_per_cup'] = rng.normal(3.5, 0.5, n)
+    # Algunos faltantes para ejercitar el relleno hacia adelante
+    df.loc[rng.random(n) < 0.01, 'consumption_cups'] = np.nan
+    # Orden aleatorio, como llegaría de un origen sin ordenar
+    return df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+def run(n_countries):
+    config = load_config('config/parameters.yaml')
+    processor = CoffeeDataProcessor(config)
+    processor.df = synthetic_monthly_data(n_countries=n_countries)
+    rows = len(processor.df)
+
+    timings = {}
+    for step in ('parse_dates', 'handle_missing_values', 'create_temporal_features',
+                 'create_lag_features', 'create_rolling_features'):
+        start = time.perf_counter()
+        getattr(processor, step)()
+        timings[step] = time.perf_counter() - start
+
+    total = sum(timings.values())
+    print(f"\n{rows:,} filas ({n_countries} países, frecuencia {processor.frequency})")
+    for step, seconds in timings.items():
+        print(f"  {step:<26} {seconds:8.3f} s")
+    print(f"  {'total':<26} {total:8.3f} s  ({rows / total:,.0f} filas/s)")
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10, 50, 200]
+    for n_countries in sizes:
+        run(n_countries)
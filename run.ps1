@@ -4,8 +4,13 @@ Write-Host "Iniciando preparacion para presentacion ejecutiva..." -ForegroundCol
 Write-Host ""
 
 # 1. Procesar datos
-Write-Host "1. PROCESANDO DATOS HISTORICOS (1990-2020)..." -ForegroundColor Cyan
-python -c "import sys; sys.path.append('src'); from data_processing import CoffeeDataProcessor; from utils import load_config; config = load_config('config/parameters.yaml'); processor = CoffeeDataProcessor(config); df = processor.process(); print('SUCCESS: Datos procesados - ' + str(df.shape[0]) + ' registros, ' + str(df.shape[1]) + ' caracteristicas')"
+Write-Host "1. ACTUALIZANDO DATOS, PRONOSTICOS, MODELOS Y REPORTES (1990-2020)..." -ForegroundColor Cyan
+# Procesamiento, pronosticos, modelos, segmentacion y reportes en una sola ejecucion
+# (las etapas independientes corren en paralelo; usar --resume tras un fallo)
+python src/pipeline.py
+if ($LASTEXITCODE -ne 0) {
+    Write-Host "ERROR: El pipeline fallo. Reintentar con: python src/pipeline.py --resume" -ForegroundColor Red
+}
 
 # 2. Verificar que los datos estan listos
 Write-Host "`n2. VERIFICANDO INTEGRIDAD DE DATOS..." -ForegroundColor Cyan
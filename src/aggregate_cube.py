@@ -0,0 +1,153 @@
+import pandas as pd
+import numpy as np
+
+class AggregateCube:
+    """Pre-aggregated year x country x coffee_type cube
+
+    Every cell holds additive measures (row count, consumption sum/count, price
+    sum/count and price*consumption sum), so any KPI over a filter selection is
+    answered by summing the selected cells instead of scanning the rows.
+    """
+
+    MEASURES = (
+        'rows',
+        'consumption_sum',
+        'consumption_count',
+        'price_sum',
+        'price_count',
+        'price_consumption_sum'
+    )
+
+    def __init__(self, config):
+        self.config = config
+        self.year_col = config['preprocessing']['date_column']
+        self.country_col = config['preprocessing']['country_column']
+        self.coffee_type_col = config['preprocessing']['coffee_type_column']
+        self.consumption_col = config['preprocessing']['consumption_column']
+        self.price_col = config['preprocessing']['price_column']
+
+        self.years = None
+        self.countries = None
+        self.coffee_types = None
+        self.cells = {}
+
+    def build(self, df):
+        """Aggregate the rows into the cube (single pass with bincount)"""
+        year_codes, self.years = pd.factorize(df[self.year_col], sort=True)
+        # Países y tipos en orden de aparición, como df[col].unique()
+        country_codes, self.countries = pd.factorize(df[self.country_col])
+        type_codes, self.coffee_types = pd.factorize(df[self.coffee_type_col])
+        self.years = np.asarray(self.years)
+        self.countries = list(self.countries)
+        self.coffee_types = list(self.coffee_types)
+
+        shape = (len(self.years), len(self.countries), len(self.coffee_types))
+        flat = np.ravel_multi_index((year_codes, country_codes, type_codes), shape)
+        size = int(np.prod(shape))
+
+        consumption = df[self.consumption_col].to_numpy(dtype=float)
+        price = df[self.price_col].to_numpy(dtype=float)
+        has_consumption = ~np.isnan(consumption)
+        has_price = ~np.isnan(price)
+        product = consumption * price
+
+        measures = {
+            'rows': np.ones(len(flat)),
+            'consumption_sum': np.where(has_consumption, consumption, 0),
+            'consumption_count': has_consumption.astype(float),
+            'price_sum': np.where(has_price, price, 0),
+            'price_count': has_price.astype(float),
+            'price_consumption_sum': np.where(np.isnan(product), 0, product)
+        }
+        self.cells = {
+            name: np.bincount(flat, weights=values, minlength=size).reshape(shape)
+            for name, values in measures.items()
+        }
+        self._country_pos = {country: pos for pos, country in enumerate(self.countries)}
+        self._type_pos = {coffee_type: pos for pos, coffee_type in enumerate(self.coffee_types)}
+        return self
+
+    def _positions(self, lookup, values):
+        if values is None:
+            return np.arange(len(lookup))
+        return np.array([lookup[value] for value in values if value in lookup], dtype=int)
+
+    def select(self, countries=None, coffee_types=None, year_range=None):
+        """Return the sub-cube of every measure for a filter selection"""
+        if year_range is None:
+            years = slice(None)
+        else:
+            years = slice(
+                np.searchsorted(self.years, year_range[0], side='left'),
+                np.searchsorted(self.years, year_range[1], side='right')
+            )
+        country_idx = self._positions(self._country_pos, countries)
+        type_idx = self._positions(self._type_pos, coffee_types)
+
+        selection = {
+            name: cells[years][:, country_idx][:, :, type_idx]
+            for name, cells in self.cells.items()
+        }
+        selection['years'] = self.years[years]
+        selection['countries'] = [self.countries[i] for i in country_idx]
+        selection['coffee_types'] = [self.coffee_types[i] for i in type_idx]
+        return selection
+
+    def kpis(self, selection):
+        """Headline metrics for a selection"""
+        consumption_sum = selection['consumption_sum'].sum()
+        consumption_count = selection['consumption_count'].sum()
+        return {
+            'records': int(selection['rows'].sum()),
+            'total_consumption': consumption_sum,
+            'avg_consumption': consumption_sum / consumption_count if consumption_count else np.nan,
+            'weighted_price': (
+                selection['price_consumption_sum'].sum() / consumption_sum if consumption_sum > 0 else np.nan
+            ),
+            'countries': int((selection['rows'].sum(axis=(0, 2)) > 0).sum())
+        }
+
+    def trend(self, selection):
+        """Consumption per (year, country, coffee_type) cell present in the data"""
+        year_idx, country_idx, type_idx = np.nonzero(selection['rows'])
+        trend = pd.DataFrame({
+            self.year_col: selection['years'][year_idx],
+            self.country_col: np.asarray(selection['countries'], dtype=object)[country_idx],
+            self.coffee_type_col: np.asarray(selection['coffee_types'], dtype=object)[type_idx],
+            self.consumption_col: selection['consumption_sum'][year_idx, country_idx, type_idx]
+        })
+        return trend.sort_values([self.year_col, self.country_col, self.coffee_type_col], ignore_index=True)
+
+    def _by_axis(self, selection, axis_name, labels, other_axes):
+        present = selection['rows'].sum(axis=other_axes) > 0
+        totals = pd.DataFrame({
+            axis_name: np.asarray(labels, dtype=object)[present],
+            self.consumption_col: selection['consumption_sum'].sum(axis=other_axes)[present]
+        })
+        return totals.sort_values(axis_name, ignore_index=True)
+
+    def by_country(self, selection):
+        """Total consumption per country"""
+        return self._by_axis(selection, self.country_col, selection['countries'], (0, 2))
+
+    def by_coffee_type(self, selection):
+        """Total consumption per coffee type"""
+        return self._by_axis(selection, self.coffee_type_col, selection['coffee_types'], (0, 1))
+
+    def price_consumption(self, selection):
+        """Mean price and total consumption per (year, country)"""
+        rows = selection['rows'].sum(axis=2)
+        price_sum = selection['price_sum'].sum(axis=2)
+        price_count = selection['price_count'].sum(axis=2)
+        consumption_sum = selection['consumption_sum'].sum(axis=2)
+
+        year_idx, country_idx = np.nonzero(rows)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_price = price_sum[year_idx, country_idx] / price_count[year_idx, country_idx]
+        data = pd.DataFrame({
+            self.year_col: selection['years'][year_idx],
+            self.country_col: np.asarray(selection['countries'], dtype=object)[country_idx],
+            self.price_col: mean_price,
+            self.consumption_col: consumption_sum[year_idx, country_idx]
+        })
+        return data.sort_values([self.year_col, self.country_col], ignore_index=True)
@@ -0,0 +1,269 @@
+# src/anomaly_detection.py
+import os
+import json
+import numpy as np
+import pandas as pd
+
+# Posiciones estacionales por frecuencia (datos anuales: sin estacionalidad)
+SEASONS = {
+    'annual': 1,
+    'quarterly': 4,
+    'monthly': 12,
+    'weekly': 53,
+    'daily': 7
+}
+
+STATE_ARRAYS = ('count', 'level', 'resid_var', 'median', 'mad', 'seasonal', 'seasonal_count', 'last_date')
+
+class AnomalyDetector:
+    """Online anomaly detector with O(1) state per (country, coffee_type) series and metric
+
+    For every series and metric it keeps an EWMA level, a seasonal offset per
+    season position (sub-annual data), an EW variance of the residuals and a
+    stochastic-approximation median/MAD of the residuals. Each new observation
+    is scored against the state before the state is updated with it:
+    z = residual / sqrt(variance), robust_z = 0.6745 * (residual - median) / MAD,
+    and flagged when both exceed their thresholds. Updates use the residual
+    clipped to z_threshold deviations, so outliers barely move the state.
+    Rows older than the last date seen for their series are ignored, so
+    re-feeding the full dataset only processes what is new.
+    """
+
+    def __init__(self, config, frequency='annual'):
+        self.config = config
+        self.params = config['anomaly_detection']
+        self.group_cols = [
+            config['preprocessing']['country_column'],
+            config['preprocessing']['coffee_type_column']
+        ]
+        self.metrics = [
+            config['preprocessing']['consumption_column'],
+            config['preprocessing']['price_column']
+        ]
+        self.frequency = frequency
+        self.n_seasons = SEASONS[frequency]
+        self.keys = []
+        self._positions = {}
+        self._init_state(0)
+
+    def _empty_state(self, n_series):
+        m = len(self.metrics)
+        return {
+            'count': np.zeros((n_series, m)),
+            'level': np.zeros((n_series, m)),
+            'resid_var': np.zeros((n_series, m)),
+            'median': np.zeros((n_series, m)),
+            'mad': np.zeros((n_series, m)),
+            'seasonal': np.zeros((n_series, m, self.n_seasons)),
+            'seasonal_count': np.zeros((n_series, m, self.n_seasons)),
+            # Última fecha procesada por serie (ns desde epoch; mínimo int64 = nunca)
+            'last_date': np.full(n_series, np.iinfo(np.int64).min, dtype=np.int64)
+        }
+
+    def _init_state(self, n_series):
+        for name, values in self._empty_state(n_series).items():
+            setattr(self, name, values)
+
+    def _series_positions(self, keys):
+        """Row of every key in the state arrays, growing them for unseen series"""
+        new_keys = [key for key in dict.fromkeys(keys) if key not in self._positions]
+        if new_keys:
+            for name, values in self._empty_state(len(new_keys)).items():
+                setattr(self, name, np.concatenate([getattr(self, name), values]))
+            for key in new_keys:
+                self._positions[key] = len(self.keys)
+                self.keys.append(key)
+        return np.array([self._positions[key] for key in keys], dtype=int)
+
+    def _season_index(self, dates):
+        if self.frequency == 'quarterly':
+            return dates.dt.quarter.to_numpy() - 1
+        if self.frequency == 'monthly':
+            return dates.dt.month.to_numpy() - 1
+        if self.frequency == 'weekly':
+            return dates.dt.isocalendar().week.to_numpy(dtype=int) - 1
+        if self.frequency == 'daily':
+            return dates.dt.dayofweek.to_numpy()
+        return np.zeros(len(dates), dtype=int)
+
+    def update(self, df):
+        """Score and learn from the rows of df newer than the state; returns the anomalous rows"""
+        dates = pd.to_datetime(df['date'])
+        keys = list(zip(*(df[col].to_numpy() for col in self.group_cols)))
+        if not keys:
+            return self._empty_anomalies()
+
+        series = self._series_positions(keys)
+        date_ns = dates.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+        new = date_ns > self.last_date[series]
+        if not new.any():
+            return self._empty_anomalies()
+
+        rows = pd.DataFrame({
+            'series': series[new],
+            'date_ns': date_ns[new],
+            'season': self._season_index(dates)[new]
+        })
+        values = df[self.metrics].to_numpy(dtype=float)[new]
+        order = np.lexsort((rows['date_ns'].to_numpy(), rows['series'].to_numpy()))
+        rows = rows.iloc[order].reset_index(drop=True)
+        values = values[order]
+        # Ronda r = r-ésima fila nueva de cada serie; cada ronda se procesa vectorizada
+        rounds = rows.groupby('series', sort=False).cumcount().to_numpy()
+
+        results = []
+        for current in range(rounds.max() + 1):
+            batch = np.flatnonzero(rounds == current)
+            results.append(self._step(
+                rows['series'].to_numpy()[batch],
+                rows['season'].to_numpy()[batch],
+                values[batch],
+                batch
+            ))
+
+        scores = {name: np.empty(values.shape) for name in ('expected', 'z', 'robust_z')}
+        flagged = np.zeros(values.shape, dtype=bool)
+        for batch, expected, z, robust_z, anomaly in results:
+            scores['expected'][batch] = expected
+            scores['z'][batch] = z
+            scores['robust_z'][batch] = robust_z
+            flagged[batch] = anomaly
+
+        np.maximum.at(self.last_date, rows['series'].to_numpy(), rows['date_ns'].to_numpy())
+        return self._anomaly_frame(rows, values, scores, flagged)
+
+    def _step(self, idx, season, x, batch):
+        """Score then update one observation of each series in idx (vectorized)"""
+        p = self.params
+        metric = np.arange(len(self.metrics))[None, :]
+        season = season[:, None]
+        valid = ~np.isnan(x)
+        count = self.count[idx]
+        offset = self.seasonal[idx[:, None], metric, season]
+        seasonal_seen = self.seasonal_count[idx[:, None], metric, season] > 0
+
+        # Puntuar contra el estado anterior
+        expected = self.level[idx] + np.where(seasonal_seen, offset, 0.0)
+        residual = x - expected
+        mad = self.mad[idx]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = np.where(self.resid_var[idx] > 0, residual / np.sqrt(self.resid_var[idx]), np.nan)
+            robust_z = np.where(mad > 0, 0.6745 * (residual - self.median[idx]) / mad, np.nan)
+        warm = count >= p['min_periods']
+        # Se exige que ambas puntuaciones superen su umbral (menos falsos positivos)
+        anomaly = valid & warm & (
+            (np.abs(np.nan_to_num(z)) > p['z_threshold'])
+            & (np.abs(np.nan_to_num(robust_z)) > p['robust_threshold'])
+        )
+
+        # Actualizar el estado (las series nuevas se inicializan con la observación).
+        # Con el estado ya estable, el residuo se recorta a z_threshold desviaciones
+        # para que un valor atípico no contamine el nivel ni la varianza
+        first = valid & (count == 0)
+        learn = valid & (count > 0)
+        alpha = p['alpha']
+        limit = p['z_threshold'] * np.sqrt(self.resid_var[idx])
+        clipped = np.where(warm & (limit > 0), np.clip(residual, -limit, limit), residual)
+        x = np.where(learn, expected + clipped, x)
+        level = np.where(first, x, self.level[idx])
+        level = np.where(learn, level + alpha * (x - np.where(seasonal_seen, offset, 0.0) - level), level)
+
+        if self.n_seasons > 1:
+            new_offset = np.where(
+                seasonal_seen, offset + p['seasonal_alpha'] * (x - level - offset), x - level
+            )
+            self.seasonal[idx[:, None], metric, season] = np.where(valid, new_offset, offset)
+            self.seasonal_count[idx[:, None], metric, season] += valid
+
+        residual = np.where(learn, clipped, 0.0)
+        resid_var = np.where(
+            learn,
+            (1 - p['variance_alpha']) * self.resid_var[idx] + p['variance_alpha'] * residual ** 2,
+            self.resid_var[idx]
+        )
+
+        # Mediana y MAD por aproximación estocástica, con paso proporcional a la escala
+        # (la MAD se inicializa con el primer residuo absoluto)
+        median = self.median[idx]
+        step = p['robust_rate'] * mad
+        median = np.where(learn, median + step * np.sign(residual - median), median)
+        mad = np.where(
+            learn,
+            np.where(mad > 0, mad + step * np.sign(np.abs(residual - median) - mad), np.abs(residual - median)),
+            mad
+        )
+
+        self.level[idx] = level
+        self.resid_var[idx] = resid_var
+        self.median[idx] = median
+        self.mad[idx] = mad
+        self.count[idx] = count + valid
+        return batch, expected, z, robust_z, anomaly
+
+    def _empty_anomalies(self):
+        return pd.DataFrame(columns=self.group_cols + ['date', 'metric', 'value', 'expected', 'z', 'robust_z'])
+
+    def _anomaly_frame(self, rows, values, scores, flagged):
+        row_idx, metric_idx = np.nonzero(flagged)
+        if len(row_idx) == 0:
+            return self._empty_anomalies()
+        series = rows['series'].to_numpy()[row_idx]
+        anomalies = pd.DataFrame({
+            self.group_cols[0]: [self.keys[i][0] for i in series],
+            self.group_cols[1]: [self.keys[i][1] for i in series],
+            'date': pd.to_datetime(rows['date_ns'].to_numpy()[row_idx]),
+            'metric': np.asarray(self.metrics, dtype=object)[metric_idx],
+            'value': values[row_idx, metric_idx],
+            'expected': scores['expected'][row_idx, metric_idx],
+            'z': scores['z'][row_idx, metric_idx],
+            'robust_z': scores['robust_z'][row_idx, metric_idx]
+        })
+        return anomalies.sort_values(['date'] + self.group_cols, ignore_index=True)
+
+    def save(self, path):
+        """Persist the state as <path>.npz (arrays) and <path>.json (series keys and settings)"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(f"{path}.npz.tmp", 'wb') as file:
+            np.savez(file, **{name: getattr(self, name) for name in STATE_ARRAYS})
+        with open(f"{path}.json.tmp", 'w') as file:
+            json.dump({
+                'frequency': self.frequency,
+                'metrics': self.metrics,
+                'keys': [list(key) for key in self.keys]
+            }, file)
+        os.replace(f"{path}.npz.tmp", f"{path}.npz")
+        os.replace(f"{path}.json.tmp", f"{path}.json")
+
+    @classmethod
+    def load(cls, config, path, frequency='annual'):
+        """Saved detector, or a fresh one if there is no compatible saved state"""
+        detector = cls(config, frequency)
+        try:
+            with open(f"{path}.json") as file:
+                meta = json.load(file)
+            arrays = np.load(f"{path}.npz")
+        except FileNotFoundError:
+            return detector
+
+        if meta['frequency'] != frequency or meta['metrics'] != detector.metrics:
+            print("Anomaly detector state does not match the data frequency/metrics; starting fresh")
+            return detector
+
+        for name in STATE_ARRAYS:
+            setattr(detector, name, arrays[name])
+        detector.keys = [tuple(key) for key in meta['keys']]
+        detector._positions = {key: pos for pos, key in enumerate(detector.keys)}
+        return detector
+
+def append_anomalies(anomalies, path):
+    """Add newly detected anomalies to the parquet log (one row per series, date and metric)"""
+    if os.path.exists(path):
+        anomalies = pd.concat([pd.read_parquet(path), anomalies], ignore_index=True)
+    anomalies = anomalies.drop_duplicates(
+        subset=[col for col in anomalies.columns if col not in ('value', 'expected', 'z', 'robust_z')],
+        keep='last'
+    )
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    anomalies.to_parquet(f"{path}.tmp", index=False)
+    os.replace(f"{path}.tmp", path)
+    return anomalies
@@ -5,7 +5,6 @@ import os
 import sys
 import warnings
 from dotenv import load_dotenv
-from generative_ai_chatbot import CoffeeAnalyticsChatbot
 
 warnings.filterwarnings('ignore')
 
@@ -15,7 +14,10 @@ load_dotenv()
 # Directorio src al path para importaciones
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import metrics
 from utils import load_config
+from chart_rendering import prepare_line_data
+from shared_dataset import publish_dataset, load_shared_dataset, has_shared_dataset, current_version
 
 # Configuración de la página
 st.set_page_config(
@@ -25,29 +27,92 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Función para cargar datos con caching
-@st.cache_data
+@st.cache_resource
+def start_metrics():
+    """Endpoint /metrics y snapshots JSON, iniciados una vez por proceso del servidor"""
+    return metrics.MetricsExporter(load_config('config/parameters.yaml')).start()
+
+# Función para cargar datos compartidos entre sesiones
+@metrics.timed('data_load_seconds')
 def load_data():
-    """Cargar datos procesados con caching"""
+    """Cargar el dataset compartido (Arrow IPC mapeado en memoria, sólo lectura)"""
     try:
         # Cargar configuración
         config = load_config('config/parameters.yaml')
+        shared_dir = config['data']['shared_dir']
         
-        # Cargar datos procesados
-        processed_path = config['data']['processed_path']
-        if os.path.exists(processed_path):
-            df = pd.read_parquet(processed_path)
-            return df
-        else:
-            # Si no existen datos procesados, procesarlos
-            from data_processing import CoffeeDataProcessor
-            processor = CoffeeDataProcessor(config)
-            df = processor.process()
-            return df
+        if not has_shared_dataset(shared_dir):
+            processed_path = config['data']['processed_path']
+            if os.path.exists(processed_path):
+                # Publicar una vez los datos procesados existentes
+                publish_dataset(pd.read_parquet(processed_path), shared_dir)
+            else:
+                # Si no existen datos procesados, procesarlos (el procesador los publica)
+                from data_processing import CoffeeDataProcessor
+                processor = CoffeeDataProcessor(config)
+                processor.process()
+        
+        return load_shared_dataset(shared_dir)
     except Exception as e:
         st.error(f"Error al cargar datos: {e}")
         return None
 
+def data_version():
+    """Versión publicada del dataset; invalida las estructuras derivadas al refrescar"""
+    return current_version(load_config('config/parameters.yaml')['data']['shared_dir'])
+
+@metrics.cached('cube', st.cache_resource)
+def load_cube(version):
+    """Cubo año x país x tipo precalculado una vez por versión del dataset"""
+    from aggregate_cube import AggregateCube
+    config = load_config('config/parameters.yaml')
+    return AggregateCube(config).build(load_data())
+
+@metrics.cached('filter_index', st.cache_resource)
+def load_filter_index(version):
+    """Bitsets por país, tipo de café y año para los filtros de la barra lateral"""
+    from filter_index import BitmapFilterIndex
+    config = load_config('config/parameters.yaml')
+    return BitmapFilterIndex(config).build(load_data())
+
+@metrics.cached('similarity_index', st.cache_resource)
+def load_similarity_index(version):
+    """Índice de mercados similares construido una vez por versión del dataset"""
+    from similarity_index import MarketSimilarityIndex
+    config = load_config('config/parameters.yaml')
+    return MarketSimilarityIndex(config).build(load_data())
+
+@metrics.cached('anomalies', st.cache_data)
+def load_anomalies(path, modified):
+    """Anomalías registradas por el pipeline (se recarga cuando cambia el archivo)"""
+    return pd.read_parquet(path)
+
+@st.cache_resource
+def get_response_cache():
+    """Caché de respuestas del chatbot compartida por todas las sesiones"""
+    from response_cache import ResponseCache
+    chatbot_config = load_config('config/parameters.yaml')['chatbot']
+    return ResponseCache(
+        db_path=chatbot_config['cache_path'],
+        max_entries=chatbot_config['cache_max_entries'],
+        ttl_seconds=chatbot_config['cache_ttl_seconds'],
+        memory_entries=chatbot_config['cache_memory_entries']
+    )
+
+@st.cache_resource
+def get_llm_client(api_key):
+    """Cliente asíncrono del LLM (conexiones y concurrencia compartidas entre sesiones)"""
+    from llm_client import AsyncLLMClient
+    chatbot_config = load_config('config/parameters.yaml')['chatbot']
+    return AsyncLLMClient(
+        api_key,
+        base_url=chatbot_config['base_url'],
+        max_concurrency=chatbot_config['max_concurrency'],
+        timeout=chatbot_config['timeout_seconds'],
+        first_token_timeout=chatbot_config['first_token_timeout_seconds'],
+        max_retries=chatbot_config['max_retries']
+    )
+
 def main():
     st.title("☕ High Garden Coffee - Dashboard Analítico")
     
@@ -58,14 +123,16 @@ def main():
     if df is None:
         st.error("No se pudieron cargar los datos. Verifica la configuración.")
         return
+    version = data_version()
     
     # Sidebar con filtros
     st.sidebar.header("Filtros")
     
-    # Obtener opciones únicas para los filtros
-    countries = df['country'].unique().tolist()
-    coffee_types = df['coffee_type'].unique().tolist()
-    years = df['year'].unique().tolist()
+    # Opciones de los filtros desde el cubo precalculado
+    cube = load_cube(version)
+    countries = list(cube.countries)
+    coffee_types = list(cube.coffee_types)
+    years = cube.years.tolist()
     
     selected_countries = st.sidebar.multiselect(
         "Seleccionar Países",
@@ -93,12 +160,16 @@ def main():
     if not selected_types:
         selected_types = coffee_types
     
-    filtered_df = df[
-        (df['country'].isin(selected_countries)) &
-        (df['coffee_type'].isin(selected_types)) &
-        (df['year'] >= year_range[0]) &
-        (df['year'] <= year_range[1])
-    ]
+    filter_index = load_filter_index(version)
+    with metrics.timed('filter_query_seconds', query='filter_index'):
+        filtered_df = filter_index.take(
+            df, filter_index.query(selected_countries, selected_types, year_range)
+        )
+    
+    # Todas las métricas y gráficos agregados se responden desde el cubo
+    with metrics.timed('filter_query_seconds', query='cube'):
+        selection = cube.select(selected_countries, selected_types, year_range)
+        kpis = cube.kpis(selection)
     
     # Sección del Chatbot Analítico
     st.sidebar.header("🤖 Chatbot Analítico")
@@ -123,11 +194,19 @@ def main():
     
     if api_key and question:
         try:
-            chatbot = CoffeeAnalyticsChatbot(filtered_df, api_key)
-            answer = chatbot.ask_question(question)
+            from generative_ai_chatbot import CoffeeAnalyticsChatbot
+            cache = get_response_cache()
+            # La versión publicada y los filtros identifican los datos sin recorrerlos
+            fingerprint = f"{version}|{sorted(selected_countries)}|{sorted(selected_types)}|{year_range}"
+            chatbot = CoffeeAnalyticsChatbot(
+                filtered_df, api_key, load_similarity_index(version),
+                cache=cache, llm=get_llm_client(api_key), data_fingerprint=fingerprint
+            )
             
             st.sidebar.success("Respuesta del chatbot:")
-            st.sidebar.info(answer)
+            # El texto se muestra a medida que llegan los tokens
+            st.sidebar.write_stream(chatbot.ask_question_stream(question))
+            st.sidebar.caption(f"Tasa de aciertos de caché: {cache.stats()['hit_rate']:.0%}")
             
         except Exception as e:
             st.sidebar.error(f"Error: {str(e)}")
@@ -136,7 +215,7 @@ def main():
     
     # Mostrar información básica
     st.header("Resumen del Dataset")
-    st.write(f"**Total de registros:** {len(filtered_df)}")
+    st.write(f"**Total de registros:** {kpis['records']}")
     st.write(f"**Países seleccionados:** {', '.join(selected_countries)}")
     st.write(f"**Tipos de café seleccionados:** {', '.join(selected_types)}")
     st.write(f"**Rango de años:** {year_range[0]} - {year_range[1]}")
@@ -146,31 +225,34 @@ def main():
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        total_consumption = filtered_df['consumption_cups'].sum()
-        st.metric("Consumo Total", f"{total_consumption:,.0f} tazas")
+        st.metric("Consumo Total", f"{kpis['total_consumption']:,.0f} tazas")
     
     with col2:
-        avg_consumption = filtered_df['consumption_cups'].mean()
-        st.metric("Consumo Promedio", f"{avg_consumption:,.1f} tazas/año")
+        st.metric("Consumo Promedio", f"{kpis['avg_consumption']:,.1f} tazas/año")
     
     with col3:
-        # Calcular precio promedio ponderado por consumo
-        total_consumption_val = filtered_df['consumption_cups'].sum()
-        if total_consumption_val > 0:
-            weighted_price = (filtered_df['price_per_cup'] * filtered_df['consumption_cups']).sum() / total_consumption_val
-            st.metric("Precio Promedio", f"${weighted_price:.2f}")
+        # Precio promedio ponderado por consumo
+        if kpis['total_consumption'] > 0:
+            st.metric("Precio Promedio", f"${kpis['weighted_price']:.2f}")
         else:
             st.metric("Precio Promedio", "N/A")
     
     with col4:
-        countries_count = filtered_df['country'].nunique()
-        st.metric("Países", countries_count)
+        st.metric("Países", kpis['countries'])
     
     # Gráfico de tendencias
     st.header("Tendencias de Consumo")
     
     # Preparar datos para el gráfico
-    trend_data = filtered_df.groupby(['year', 'country', 'coffee_type'])['consumption_cups'].sum().reset_index()
+    trend_data = cube.trend(selection)
+    rendering = load_config('config/parameters.yaml')['rendering']
+    trend_data = prepare_line_data(
+        trend_data, x='year', y='consumption_cups',
+        series_cols=['country', 'coffee_type'],
+        max_series=rendering['max_series'],
+        points_per_series=rendering['points_per_series'],
+        other_label='Otros'
+    )
     
     fig = px.line(trend_data, x='year', y='consumption_cups', 
                   color='country', line_dash='coffee_type',
@@ -184,7 +266,7 @@ def main():
     
     with col1:
         # Consumo por país
-        country_data = filtered_df.groupby('country')['consumption_cups'].sum().reset_index()
+        country_data = cube.by_country(selection)
         fig2 = px.bar(country_data, x='country', y='consumption_cups',
                      title='Consumo Total por País',
                      labels={'consumption_cups': 'Consumo (tazas)', 'country': 'País'})
@@ -192,17 +274,14 @@ def main():
     
     with col2:
         # Consumo por tipo de café
-        type_data = filtered_df.groupby('coffee_type')['consumption_cups'].sum().reset_index()
+        type_data = cube.by_coffee_type(selection)
         fig3 = px.pie(type_data, values='consumption_cups', names='coffee_type',
                      title='Distribución por Tipo de Café')
         st.plotly_chart(fig3, use_container_width=True)
     
     # Relación precio-consumo
     st.header("Relación Precio-Consumo")
-    price_consumption_data = filtered_df.groupby(['year', 'country']).agg({
-        'price_per_cup': 'mean', 
-        'consumption_cups': 'sum'
-    }).reset_index()
+    price_consumption_data = cube.price_consumption(selection)
     
     fig4 = px.scatter(price_consumption_data, x='price_per_cup', y='consumption_cups',
                      color='country', size='consumption_cups', hover_data=['year'],
@@ -211,9 +290,46 @@ def main():
     
     st.plotly_chart(fig4, use_container_width=True)
     
+    # Mercados similares
+    st.header("Mercados Similares")
+    similarity_index = load_similarity_index(version)
+    series_options = [f"{country} - {coffee_type}" for country, coffee_type in similarity_index.keys]
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        selected_series = st.selectbox("Serie de referencia", options=series_options)
+    with col2:
+        n_similar = st.number_input("Número de mercados", min_value=1, max_value=20, value=5)
+    
+    reference_country, reference_type = selected_series.split(" - ", 1)
+    with metrics.timed('model_inference_seconds', model='similarity_index'):
+        similar_markets = similarity_index.query(reference_country, reference_type, k=int(n_similar))
+    st.dataframe(similar_markets.rename(columns={
+        'country': 'País', 'coffee_type': 'Tipo de Café', 'distance': 'Distancia'
+    }))
+    
+    # Anomalías detectadas por el pipeline de procesamiento
+    st.header("Anomalías Detectadas")
+    anomalies_path = load_config('config/parameters.yaml')['anomaly_detection']['output_path']
+    if os.path.exists(anomalies_path):
+        anomalies = load_anomalies(anomalies_path, os.path.getmtime(anomalies_path))
+        anomalies = anomalies[
+            anomalies['country'].isin(selected_countries)
+            & anomalies['coffee_type'].isin(selected_types)
+            & anomalies['date'].dt.year.between(year_range[0], year_range[1])
+        ]
+        st.dataframe(anomalies.sort_values('date', ascending=False).rename(columns={
+            'country': 'País', 'coffee_type': 'Tipo de Café', 'date': 'Fecha', 'metric': 'Métrica',
+            'value': 'Valor', 'expected': 'Esperado', 'z': 'Z', 'robust_z': 'Z robusto'
+        }))
+    else:
+        st.info("Aún no hay anomalías registradas; ejecuta el procesamiento de datos.")
+    
     # Mostrar datos tabulares
     st.header("Datos Detallados")
     st.dataframe(filtered_df[['year', 'country', 'coffee_type', 'consumption_cups', 'price_per_cup']].sort_values(['year', 'country']))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    start_metrics()
+    # Cada rerun de Streamlit es un render completo de la página
+    with metrics.timed('page_render_seconds', page='dashboard'):
+        main()
\ No newline at end of file
@@ -0,0 +1,121 @@
+import pandas as pd
+import numpy as np
+
+def minmax_downsample(x, y, n_buckets):
+    """Keep the min and max point of each bucket (preserves peaks, ~2*n_buckets points)"""
+    n = len(x)
+    if n <= 2 * n_buckets:
+        return np.arange(n)
+
+    edges = np.linspace(0, n, n_buckets + 1).astype(int)
+    starts = edges[:-1]
+    # Argmin/argmax por bucket con reduceat sobre la serie completa
+    bucket_min = np.minimum.reduceat(y, starts)
+    bucket_max = np.maximum.reduceat(y, starts)
+    bucket_of = np.repeat(np.arange(n_buckets), np.diff(edges))
+    is_min = y == bucket_min[bucket_of]
+    is_max = y == bucket_max[bucket_of]
+
+    keep = np.zeros(n, dtype=bool)
+    # Primera ocurrencia de mínimo y máximo en cada bucket
+    keep[np.flatnonzero(is_min)[np.unique(bucket_of[is_min], return_index=True)[1]]] = True
+    keep[np.flatnonzero(is_max)[np.unique(bucket_of[is_max], return_index=True)[1]]] = True
+    keep[[0, n - 1]] = True
+    return np.flatnonzero(keep)
+
+def lttb_downsample(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: indices of n_out points that keep the visual shape"""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = x.astype(float)
+    y = y.astype(float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = np.empty(n_out, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # Promedio del siguiente bucket (o el último punto)
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        areas = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(areas.argmax())
+        selected[i + 1] = previous
+
+    return selected
+
+def downsample_series(x, y, n_points):
+    """Reduce one series to about n_points: min-max pre-pass for very long series, then LTTB"""
+    valid = ~pd.isna(y)
+    positions = np.flatnonzero(valid)
+    x, y = x[valid], y[valid]
+    if len(x) <= n_points:
+        return positions
+
+    if len(x) > 4 * n_points:
+        reduced = minmax_downsample(x, y, 2 * n_points)
+        positions, x, y = positions[reduced], x[reduced], y[reduced]
+
+    return positions[lttb_downsample(x, y, n_points)]
+
+def limit_series(df, x, y, series_cols, max_series, other_label='Other'):
+    """Keep the max_series largest series (by total y) and merge the rest into other_label
+
+    The remaining series are summed per x and per the secondary series columns,
+    so e.g. with [country, coffee_type] an 'Other' line is kept per coffee type.
+    """
+    totals = df.groupby(series_cols, sort=False)[y].sum()
+    if len(totals) <= max_series:
+        return df
+
+    top = totals.nlargest(max_series).index
+    in_top = pd.MultiIndex.from_frame(df[series_cols]).isin(top) if len(series_cols) > 1 else df[series_cols[0]].isin(top)
+
+    rest = df.loc[~in_top]
+    rest = rest.groupby(series_cols[1:] + [x], sort=False)[y].sum().reset_index()
+    rest[series_cols[0]] = other_label
+
+    return pd.concat([df.loc[in_top, series_cols + [x, y]], rest[series_cols + [x, y]]], ignore_index=True)
+
+def prepare_line_data(df, x, y, series_cols, max_series=10, points_per_series=800, other_label='Other'):
+    """Reduce a long-format frame to what a line chart can actually show
+
+    Caps the number of series drawn (top-N plus other_label), downsamples every
+    series to points_per_series (the horizontal pixel budget) and casts the plotted
+    columns to compact dtypes so Plotly serializes them as small typed arrays.
+    """
+    data = limit_series(df[series_cols + [x, y]], x, y, series_cols, max_series, other_label)
+    data = data.sort_values(series_cols + [x], kind='stable')
+
+    x_values = data[x].to_numpy()
+    y_values = data[y].to_numpy(dtype=float)
+    # Inicio de cada serie en el frame ordenado
+    codes = data.groupby(series_cols, sort=False).ngroup().to_numpy()
+    boundaries = np.flatnonzero(np.diff(codes)) + 1
+    starts = np.concatenate([[0], boundaries])
+    ends = np.concatenate([boundaries, [len(data)]])
+
+    keep = []
+    for start, end in zip(starts, ends):
+        if end - start > points_per_series:
+            keep.append(start + downsample_series(x_values[start:end], y_values[start:end], points_per_series))
+        else:
+            keep.append(np.arange(start, end))
+    data = data.iloc[np.concatenate(keep)] if keep else data
+
+    # Tipos compactos para la carga útil del gráfico
+    data = data.reset_index(drop=True)
+    data[y] = data[y].astype(np.float32)
+    if pd.api.types.is_integer_dtype(data[x]):
+        data[x] = data[x].astype(np.int32)
+
+    return data
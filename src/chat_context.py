@@ -0,0 +1,213 @@
+# src/chat_context.py
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+# Nombres en español que no coinciden con los del dataset
+COUNTRY_ALIASES = {
+    'brasil': 'Brazil',
+    'etiopia': 'Ethiopia',
+    'estados unidos': 'United States',
+    'alemania': 'Germany',
+    'japon': 'Japan',
+    'francia': 'France',
+    'italia': 'Italy',
+    'reino unido': 'United Kingdom',
+    'mexico': 'Mexico',
+    'peru': 'Peru',
+    'india': 'India'
+}
+
+# Nombres de países (español e inglés, normalizados) para detectar países ausentes de los datos
+COUNTRY_NAMES = (
+    'afganistan', 'afghanistan', 'albania', 'alemania', 'germany', 'andorra', 'angola',
+    'arabia saudita', 'saudi arabia', 'argelia', 'algeria', 'argentina', 'armenia', 'australia',
+    'austria', 'azerbaiyan', 'azerbaijan', 'bahamas', 'banglades', 'bangladesh', 'barbados',
+    'barein', 'bahrain', 'belgica', 'belgium', 'belice', 'belize', 'benin', 'bielorrusia',
+    'belarus', 'bolivia', 'bosnia', 'botsuana', 'botswana', 'brasil', 'brazil', 'brunei',
+    'bulgaria', 'burkina faso', 'burundi', 'butan', 'bhutan', 'cabo verde', 'cape verde',
+    'camboya', 'cambodia', 'camerun', 'cameroon', 'canada', 'catar', 'qatar', 'chad', 'chile',
+    'china', 'chipre', 'cyprus', 'colombia', 'comoras', 'comoros', 'congo', 'corea', 'korea',
+    'costa rica', 'costa de marfil', 'ivory coast', 'croacia', 'croatia', 'cuba', 'dinamarca',
+    'denmark', 'dominica', 'ecuador', 'egipto', 'egypt', 'el salvador', 'emiratos arabes',
+    'united arab emirates', 'eritrea', 'eslovaquia', 'slovakia', 'eslovenia', 'slovenia', 'espana',
+    'spain', 'estados unidos', 'united states', 'usa', 'eeuu', 'estonia', 'esuatini', 'eswatini',
+    'etiopia', 'ethiopia', 'filipinas', 'philippines', 'finlandia', 'finland', 'fiyi', 'fiji',
+    'francia', 'france', 'gabon', 'gambia', 'georgia', 'ghana', 'granada', 'grenada', 'grecia',
+    'greece', 'guatemala', 'guinea', 'guyana', 'haiti', 'honduras', 'hungria', 'hungary', 'india',
+    'indonesia', 'irak', 'iraq', 'iran', 'irlanda', 'ireland', 'islandia', 'iceland', 'israel',
+    'italia', 'italy', 'jamaica', 'japon', 'japan', 'jordania', 'jordan', 'kazajistan',
+    'kazakhstan', 'kenia', 'kenya', 'kirguistan', 'kyrgyzstan', 'kuwait', 'laos', 'lesoto',
+    'lesotho', 'letonia', 'latvia', 'libano', 'lebanon', 'liberia', 'libia', 'libya',
+    'liechtenstein', 'lituania', 'lithuania', 'luxemburgo', 'luxembourg', 'madagascar', 'malasia',
+    'malaysia', 'malaui', 'malawi', 'maldivas', 'maldives', 'mali', 'malta', 'marruecos',
+    'morocco', 'mauricio', 'mauritius', 'mauritania', 'mexico', 'moldavia', 'moldova', 'monaco',
+    'mongolia', 'montenegro', 'mozambique', 'myanmar', 'birmania', 'namibia', 'nepal', 'nicaragua',
+    'niger', 'nigeria', 'noruega', 'norway', 'nueva zelanda', 'new zealand', 'oman',
+    'paises bajos', 'netherlands', 'holanda', 'holland', 'pakistan', 'panama',
+    'papua nueva guinea', 'papua new guinea', 'paraguay', 'peru', 'polonia', 'poland', 'portugal',
+    'reino unido', 'united kingdom', 'inglaterra', 'england', 'uk', 'republica checa',
+    'czech republic', 'chequia', 'czechia', 'republica dominicana', 'dominican republic', 'ruanda',
+    'rwanda', 'rumania', 'romania', 'rusia', 'russia', 'senegal', 'serbia', 'sierra leona',
+    'sierra leone', 'singapur', 'singapore', 'siria', 'syria', 'somalia', 'sri lanka', 'sudafrica',
+    'south africa', 'sudan', 'suecia', 'sweden', 'suiza', 'switzerland', 'surinam', 'suriname',
+    'tailandia', 'thailand', 'taiwan', 'tanzania', 'tayikistan', 'tajikistan', 'timor', 'togo',
+    'trinidad', 'tobago', 'tunez', 'tunisia', 'turkmenistan', 'turquia', 'turkey', 'ucrania',
+    'ukraine', 'uganda', 'uruguay', 'uzbekistan', 'venezuela', 'vietnam', 'yemen', 'yibuti',
+    'djibouti', 'zambia', 'zimbabue', 'zimbabwe'
+)
+
+def normalize_text(text):
+    """Lowercase text without accents, for matching names in questions"""
+    text = unicodedata.normalize('NFKD', str(text))
+    return ''.join(char for char in text if not unicodedata.combining(char)).lower()
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token) used for the prompt budget"""
+    return len(text) // 4 + 1
+
+class ChatContextBuilder:
+    """Bounded chatbot context built from summary tables cached per data fingerprint"""
+
+    # Resúmenes compartidos por todas las instancias (LRU por huella de datos)
+    _summaries = OrderedDict()
+    _lock = threading.Lock()
+    max_cached_summaries = 32
+
+    def __init__(self, df, fingerprint, token_budget=600, top_n=10):
+        self.df = df
+        self.fingerprint = fingerprint
+        self.token_budget = token_budget
+        self.top_n = top_n
+
+    def summaries(self):
+        """Summary tables for this dataset, computed once per fingerprint"""
+        with self._lock:
+            if self.fingerprint in self._summaries:
+                self._summaries.move_to_end(self.fingerprint)
+                return self._summaries[self.fingerprint]
+
+        summaries = self._compute_summaries()
+        with self._lock:
+            self._summaries[self.fingerprint] = summaries
+            while len(self._summaries) > self.max_cached_summaries:
+                self._summaries.popitem(last=False)
+        return summaries
+
+    def _compute_summaries(self):
+        df = self.df
+        countries = df['country'].unique().tolist()
+        coffee_types = df['coffee_type'].unique().tolist()
+        return {
+            'countries': countries,
+            'coffee_types': coffee_types,
+            'country_lookup': self._lookup(countries, COUNTRY_ALIASES),
+            'type_lookup': self._lookup(coffee_types, {}),
+            'min_year': int(df['year'].min()),
+            'max_year': int(df['year'].max()),
+            'total_consumption': df['consumption_cups'].sum(),
+            'mean_price': df['price_per_cup'].mean(),
+            'by_country_year': df.groupby(['country', 'year'])['consumption_cups'].sum(),
+            'by_country_type_year': df.groupby(['country', 'coffee_type', 'year'])['consumption_cups'].sum(),
+            'by_type_year': df.groupby(['coffee_type', 'year'])['consumption_cups'].sum(),
+            'by_year': df.groupby('year').agg({'consumption_cups': 'sum', 'price_per_cup': 'mean'})
+        }
+
+    def _lookup(self, names, aliases):
+        """Normalized name -> dataset name, including aliases of names present in the data"""
+        lookup = {normalize_text(name): name for name in names}
+        for alias, name in aliases.items():
+            if name in names:
+                lookup[alias] = name
+        return lookup
+
+    def extract_entities(self, question):
+        """Countries, coffee types and years mentioned in a question"""
+        summaries = self.summaries()
+        text = normalize_text(question)
+
+        def find(lookup):
+            found = []
+            for key, name in lookup.items():
+                if re.search(rf'\b{re.escape(key)}\b', text) and name not in found:
+                    found.append(name)
+            return found
+
+        years = [int(year) for year in re.findall(r'\b(1[89]\d{2}|20\d{2})\b', text)]
+        return {
+            'countries': find(summaries['country_lookup']),
+            'coffee_types': find(summaries['type_lookup']),
+            'years': years
+        }
+
+    def _overview_lines(self, summaries):
+        countries = summaries['countries']
+        shown = ', '.join(countries[:self.top_n])
+        if len(countries) > self.top_n:
+            shown += f" y {len(countries) - self.top_n} más"
+        return [
+            f"Datos de consumo de café ({summaries['min_year']}-{summaries['max_year']}):",
+            f"- Países ({len(countries)}): {shown}",
+            f"- Tipos de café: {', '.join(summaries['coffee_types'])}",
+            f"- Rango temporal: {summaries['min_year']} a {summaries['max_year']}",
+            f"- Consumo total: {summaries['total_consumption']:,.0f} tazas",
+            f"- Precio promedio: ${summaries['mean_price']:.2f}"
+        ]
+
+    def _slice_lines(self, summaries, entities):
+        """Relevant summary slices for the question, most specific first"""
+        lines = []
+        years = entities['years'] or [summaries['max_year']]
+
+        for country in entities['countries']:
+            by_year = summaries['by_country_year'].loc[country]
+            for year in years:
+                if year in by_year.index:
+                    lines.append(f"- {country} en {year}: {by_year[year]:,.0f} tazas")
+                    for coffee_type in entities['coffee_types']:
+                        key = (country, coffee_type, year)
+                        if key in summaries['by_country_type_year'].index:
+                            lines.append(
+                                f"  - {coffee_type}: {summaries['by_country_type_year'][key]:,.0f} tazas"
+                            )
+            lines.append(
+                f"- {country} por año: " + ', '.join(f"{year}: {value:,.0f}" for year, value in by_year.items())
+            )
+
+        for coffee_type in entities['coffee_types']:
+            by_year = summaries['by_type_year'].loc[coffee_type]
+            lines.append(
+                f"- {coffee_type} por año: " + ', '.join(f"{year}: {value:,.0f}" for year, value in by_year.items())
+            )
+
+        # Ranking de países en los años pedidos (por defecto el último año disponible)
+        by_country_year = summaries['by_country_year']
+        for year in years:
+            try:
+                ranking = by_country_year.xs(year, level='year')
+            except KeyError:
+                continue
+            lines.append(f"Consumo por país en {year} (top {self.top_n}):")
+            for country, consumption in ranking.nlargest(self.top_n).items():
+                lines.append(f"- {country}: {consumption:,.0f} tazas")
+
+        return lines
+
+    def build(self, question=''):
+        """Context for a question, truncated to the token budget"""
+        summaries = self.summaries()
+        entities = self.extract_entities(question) if question else {
+            'countries': [], 'coffee_types': [], 'years': []
+        }
+
+        context = ''
+        used = 0
+        for line in self._overview_lines(summaries) + [''] + self._slice_lines(summaries, entities):
+            cost = estimate_tokens(line)
+            # Las líneas que no caben se omiten; las siguientes pueden ser más cortas
+            if used + cost > self.token_budget:
+                continue
+            context += line + '\n'
+            used += cost
+        return context
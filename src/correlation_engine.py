@@ -0,0 +1,218 @@
+# src/correlation_engine.py
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+class CorrelationAccumulator:
+    """Pairwise (NaN-aware) sufficient statistics for a Pearson correlation matrix
+
+    For every pair of columns (i, j) it keeps, over the rows where both are
+    present, the count, the sums of x_i and x_j, their squares and the cross
+    product. Values are shifted by a per-column constant (its mean in the first
+    chunk where it has values) so the sums stay small; correlations are shift-invariant, and
+    accumulators with different shifts are re-shifted when merged.
+    Matches DataFrame.corr() (pairwise complete observations).
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        size = len(self.columns)
+        self.shift = None
+        self.count = np.zeros((size, size))
+        # sums[i, j] = suma de x_i en las filas donde x_i y x_j están presentes
+        self.sums = np.zeros((size, size))
+        self.squares = np.zeros((size, size))
+        self.products = np.zeros((size, size))
+
+    def update(self, values):
+        """Add a chunk of rows (DataFrame with these columns, or 2-D array in column order)"""
+        if isinstance(values, pd.DataFrame):
+            values = values[self.columns].to_numpy(dtype=float, na_value=np.nan)
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return self
+
+        present = ~np.isnan(values)
+        if self.shift is None:
+            self.shift = np.full(len(self.columns), np.nan)
+        # Columnas sin datos hasta ahora: sus estadísticos son cero y el desplazamiento
+        # se fija con el primer bloque que las trae
+        counts = present.sum(axis=0)
+        unset = np.isnan(self.shift) & (counts > 0)
+        if unset.any():
+            self.shift[unset] = np.nansum(values[:, unset], axis=0) / counts[unset]
+
+        centered = np.where(present, values - self.shift, 0.0)
+        mask = present.astype(float)
+        self.count += mask.T @ mask
+        self.sums += centered.T @ mask
+        self.squares += (centered ** 2).T @ mask
+        self.products += centered.T @ centered
+        return self
+
+    def _reshift(self, shift):
+        """Express the statistics relative to a different shift vector"""
+        if self.shift is None:
+            self.shift = np.asarray(shift, dtype=float)
+            return
+        # Columnas sin datos en alguna de las partes no tienen estadísticos que ajustar
+        delta = np.nan_to_num(self.shift - shift)[:, None]
+        sums = self.sums + delta * self.count
+        self.squares = self.squares + 2 * delta * self.sums + delta ** 2 * self.count
+        self.products = (
+            self.products + delta * self.sums.T + delta.T * self.sums + delta * delta.T * self.count
+        )
+        self.sums = sums
+        self.shift = np.asarray(shift, dtype=float)
+
+    def merge(self, other):
+        """Add the statistics of another accumulator over the same columns"""
+        if other.columns != self.columns:
+            raise ValueError("Cannot merge accumulators over different columns")
+        if other.shift is None:
+            return self
+        if self.shift is None:
+            self.shift = other.shift.copy()
+        self.shift = np.where(np.isnan(self.shift), other.shift, self.shift)
+        if not np.array_equal(other.shift, self.shift, equal_nan=True):
+            other = other.copy()
+            other._reshift(self.shift)
+        self.count += other.count
+        self.sums += other.sums
+        self.squares += other.squares
+        self.products += other.products
+        return self
+
+    def copy(self):
+        clone = CorrelationAccumulator(self.columns)
+        clone.shift = None if self.shift is None else self.shift.copy()
+        clone.count = self.count.copy()
+        clone.sums = self.sums.copy()
+        clone.squares = self.squares.copy()
+        clone.products = self.products.copy()
+        return clone
+
+    def correlation(self, min_periods=1):
+        """Correlation matrix as a DataFrame (NaN where a pair has too few rows or no variance)"""
+        n = self.count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            covariance = n * self.products - self.sums * self.sums.T
+            variance = n * self.squares - self.sums ** 2
+            corr = covariance / np.sqrt(variance * variance.T)
+        corr = np.clip(corr, -1.0, 1.0)
+        corr[(n < max(min_periods, 2)) | (variance <= 0) | (variance.T <= 0)] = np.nan
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+class SegmentedCorrelation:
+    """One CorrelationAccumulator per segment (e.g. per country or coffee type)"""
+
+    def __init__(self, columns, segment_col):
+        self.columns = list(columns)
+        self.segment_col = segment_col
+        self.segments = {}
+
+    def update(self, chunk):
+        for segment, rows in chunk.groupby(self.segment_col, sort=False, observed=True):
+            if segment not in self.segments:
+                self.segments[segment] = CorrelationAccumulator(self.columns)
+            self.segments[segment].update(rows)
+        return self
+
+    def merge(self, other):
+        for segment, accumulator in other.segments.items():
+            if segment in self.segments:
+                self.segments[segment].merge(accumulator)
+            else:
+                self.segments[segment] = accumulator
+        return self
+
+    def correlation(self, min_periods=1):
+        """{segment: correlation DataFrame}"""
+        return {
+            segment: accumulator.correlation(min_periods)
+            for segment, accumulator in self.segments.items()
+        }
+
+def _new_accumulator(columns, segment_col):
+    if segment_col is None:
+        return CorrelationAccumulator(columns)
+    return SegmentedCorrelation(columns, segment_col)
+
+def correlation_from_frame(df, columns=None, segment_col=None, chunk_size=100000):
+    """Correlation matrix of an in-memory frame, accumulated chunk by chunk
+
+    Only one chunk of the selected columns is converted to float at a time.
+    Returns a DataFrame, or {segment: DataFrame} when segment_col is given.
+    """
+    if columns is None:
+        columns = [col for col in df.select_dtypes(include=[np.number]).columns if col != segment_col]
+    accumulator = _new_accumulator(columns, segment_col)
+    needed = list(columns) + ([segment_col] if segment_col is not None else [])
+    for start in range(0, len(df), chunk_size):
+        accumulator.update(df[needed].iloc[start:start + chunk_size])
+    return accumulator.correlation()
+
+def _parquet_units(path):
+    """(file, row_group) work units of a parquet file or directory of parquet files"""
+    import pyarrow.parquet as pq
+
+    if os.path.isdir(path):
+        files = sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(path)
+            for name in names if name.endswith('.parquet')
+        )
+    else:
+        files = [path]
+    units = []
+    for file in files:
+        units.extend((file, group) for group in range(pq.ParquetFile(file).num_row_groups))
+    return files, units
+
+def _numeric_columns(file):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pq.read_schema(file)
+    return [
+        field.name for field in schema
+        if (pa.types.is_integer(field.type) or pa.types.is_floating(field.type))
+        and not field.name.startswith('__index_level_')
+    ]
+
+def _accumulate_units(units, columns, segment_col, batch_size):
+    import pyarrow.parquet as pq
+
+    accumulator = _new_accumulator(columns, segment_col)
+    needed = list(columns) + ([segment_col] if segment_col is not None else [])
+    for file, group in units:
+        parquet_file = pq.ParquetFile(file)
+        for batch in parquet_file.iter_batches(batch_size=batch_size, row_groups=[group], columns=needed):
+            accumulator.update(batch.to_pandas())
+    return accumulator
+
+def correlation_from_parquet(path, columns=None, segment_col=None, batch_size=65536, n_jobs=4):
+    """Correlation matrix of a parquet store in one streaming pass
+
+    Row groups are split among n_jobs threads, each accumulating record
+    batches into its own partial statistics, which are merged at the end;
+    the store is never materialized in memory.
+    """
+    files, units = _parquet_units(path)
+    if not files:
+        raise FileNotFoundError(f"No hay archivos parquet en {path}")
+    if columns is None:
+        columns = [col for col in _numeric_columns(files[0]) if col != segment_col]
+
+    n_jobs = max(1, min(n_jobs, len(units)))
+    partitions = [units[worker::n_jobs] for worker in range(n_jobs)]
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        partials = list(executor.map(
+            lambda part: _accumulate_units(part, columns, segment_col, batch_size), partitions
+        ))
+
+    result = partials[0]
+    for partial in partials[1:]:
+        result.merge(partial)
+    return result.correlation()
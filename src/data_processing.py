@@ -3,13 +3,67 @@ import numpy as np
 from datetime import datetime
 import warnings
 import os
+from shared_dataset import publish_dataset
+from anomaly_detection import AnomalyDetector, append_anomalies
 
 warnings.filterwarnings('ignore')
 
+# Periodos por año de cada frecuencia soportada
+PERIODS_PER_YEAR = {
+    'annual': 1,
+    'quarterly': 4,
+    'monthly': 12,
+    'weekly': 52,
+    'daily': 365
+}
+
+# Unidades aceptadas en lags/ventanas expresados como texto ("3M", "1Y", "4W"...)
+UNIT_FREQUENCIES = {'Y': 'annual', 'Q': 'quarterly', 'M': 'monthly', 'W': 'weekly', 'D': 'daily'}
+
+def detect_frequency(dates, groups=None):
+    """Infer the data frequency from the median spacing between consecutive dates of each series"""
+    dates = pd.Series(pd.to_datetime(dates)).reset_index(drop=True)
+    if groups is None:
+        spacing = dates.sort_values().diff()
+    else:
+        frame = pd.DataFrame(groups).reset_index(drop=True).assign(_date=dates)
+        frame = frame.sort_values(list(frame.columns))
+        spacing = frame.groupby(list(frame.columns[:-1]), sort=False, observed=True)['_date'].diff()
+
+    days = spacing.dt.days
+    days = days[days > 0]
+    if days.empty:
+        return 'annual'
+
+    median = days.median()
+    if median >= 300:
+        return 'annual'
+    if median >= 80:
+        return 'quarterly'
+    if median >= 25:
+        return 'monthly'
+    if median >= 6:
+        return 'weekly'
+    return 'daily'
+
+def to_periods(spec, frequency):
+    """Number of periods of the given frequency for a lag/window spec (int periods or e.g. '3M')"""
+    if isinstance(spec, (int, np.integer)):
+        return int(spec)
+    spec = str(spec).strip().upper()
+    if spec.isdigit():
+        return int(spec)
+    count, unit = spec[:-1] or '1', spec[-1]
+    if unit not in UNIT_FREQUENCIES:
+        raise ValueError(f"Unidad de lag/ventana no soportada: {spec}")
+    periods = float(count) * PERIODS_PER_YEAR[frequency] / PERIODS_PER_YEAR[UNIT_FREQUENCIES[unit]]
+    return max(1, int(round(periods)))
+
 class CoffeeDataProcessor:
     def __init__(self, config):
         self.config = config
         self.df = None
+        self.frequency = None
         
     def load_data(self):
         """Load raw coffee consumption data"""
@@ -24,9 +78,7 @@ class CoffeeDataProcessor:
             raise FileNotFoundError(f"El archivo {raw_path} no existe")
         
         self.df = pd.read_csv(raw_path)
-        
-        # Convertir la columna de año a datetime (asumiendo 1 de enero de cada año)
-        self.df['date'] = pd.to_datetime(self.df[self.config['preprocessing']['date_column']].astype(str) + '-01-01')
+        self.parse_dates()
         
         # Filtrar por rango de años
         min_year = int(self.config['preprocessing']['min_date'])
@@ -40,13 +92,51 @@ class CoffeeDataProcessor:
         
         return self.df
     
+    def parse_dates(self):
+        """Build the 'date' column and resolve the data frequency
+        
+        Uses the real date column when the raw data has one; otherwise the date
+        is built from the year (and month, if present) columns.
+        """
+        year_col = self.config['preprocessing']['date_column']
+        source_col = self.config['preprocessing']['date_source_column']
+        
+        if source_col in self.df.columns:
+            self.df['date'] = pd.to_datetime(self.df[source_col])
+        else:
+            # Datos anuales: 1 de enero de cada año (o día 1 del mes si hay columna month)
+            parts = pd.DataFrame({
+                'year': self.df[year_col],
+                'month': self.df['month'] if 'month' in self.df.columns else 1,
+                'day': 1
+            })
+            self.df['date'] = pd.to_datetime(parts)
+        if year_col not in self.df.columns:
+            self.df[year_col] = self.df['date'].dt.year
+        
+        frequency = self.config['preprocessing']['frequency']
+        if frequency == 'auto':
+            frequency = detect_frequency(self.df['date'], self.df[self._group_cols()])
+        if frequency not in PERIODS_PER_YEAR:
+            raise ValueError(f"Frecuencia no soportada: {frequency}")
+        self.frequency = frequency
+        print(f"Data frequency: {self.frequency}")
+        
+        return self.df
+    
+    def _group_cols(self):
+        return [
+            self.config['preprocessing']['country_column'],
+            self.config['preprocessing']['coffee_type_column']
+        ]
+    
     def handle_missing_values(self):
         """Handle missing values in the dataset"""
         # Los datos anuales pueden tener menos valores faltantes, pero igual verificamos
         self.df = self.df.sort_values([
             self.config['preprocessing']['country_column'],
             self.config['preprocessing']['coffee_type_column'],
-            self.config['preprocessing']['date_column']
+            'date'
         ])
         
         # Group by country and coffee type for forward fill
@@ -62,49 +152,67 @@ class CoffeeDataProcessor:
         return self.df
     
     def create_temporal_features(self):
-        """Create temporal features from date column"""
-        # Para datos anuales, las características temporales son más limitadas
-        self.df['year'] = self.df[self.config['preprocessing']['date_column']]
+        """Create calendar features from the date column for the data frequency"""
+        dates = self.df['date'].dt
+        self.df['year'] = dates.year
         self.df['decade'] = (self.df['year'] // 10) * 10
         
+        # Sólo las características que varían para la frecuencia de los datos
+        periods = PERIODS_PER_YEAR[self.frequency]
+        if periods >= PERIODS_PER_YEAR['quarterly']:
+            self.df['quarter'] = dates.quarter.astype('int8')
+        if periods >= PERIODS_PER_YEAR['monthly']:
+            self.df['month'] = dates.month.astype('int8')
+        if periods >= PERIODS_PER_YEAR['weekly']:
+            self.df['week_of_year'] = dates.isocalendar().week.astype('int8').to_numpy()
+        if periods >= PERIODS_PER_YEAR['daily']:
+            self.df['day_of_week'] = dates.dayofweek.astype('int8')
+            self.df['is_weekend'] = (self.df['day_of_week'] >= 5).astype('int8')
+            self.df['day_of_year'] = dates.dayofyear.astype('int16')
+        
         return self.df
     
     def create_lag_features(self):
-        """Create lag features for time series"""
-        group_cols = [
-            self.config['preprocessing']['country_column'],
-            self.config['preprocessing']['coffee_type_column']
+        """Create lag features for time series (specs in periods or units like '3M')"""
+        grouped = self.df.groupby(self._group_cols(), sort=False, observed=True)[
+            self.config['preprocessing']['consumption_column']
         ]
         
         for lag in self.config['features']['lag_features']:
-            self.df[f'lag_{lag}'] = self.df.groupby(
-                group_cols
-            )[self.config['preprocessing']['consumption_column']].shift(lag)
+            self.df[f'lag_{lag}'] = grouped.shift(to_periods(lag, self.frequency))
         
         return self.df
     
     def create_rolling_features(self):
         """Create rolling window features"""
-        group_cols = [
-            self.config['preprocessing']['country_column'],
-            self.config['preprocessing']['coffee_type_column']
+        group_cols = self._group_cols()
+        grouped = self.df.groupby(group_cols, sort=False, observed=True)[
+            self.config['preprocessing']['consumption_column']
         ]
         
         for window in self.config['features']['rolling_windows']:
-            self.df[f'rolling_mean_{window}'] = self.df.groupby(
-                group_cols
-            )[self.config['preprocessing']['consumption_column']].transform(
-                lambda x: x.rolling(window=window, min_periods=1).mean()
-            )
-            
-            self.df[f'rolling_std_{window}'] = self.df.groupby(
-                group_cols
-            )[self.config['preprocessing']['consumption_column']].transform(
-                lambda x: x.rolling(window=window, min_periods=1).std()
-            )
+            # Rolling agrupado (sin lambda por grupo); el resultado se alinea por índice
+            rolling = grouped.rolling(window=to_periods(window, self.frequency), min_periods=1)
+            self.df[f'rolling_mean_{window}'] = rolling.mean().droplevel(list(range(len(group_cols))))
+            self.df[f'rolling_std_{window}'] = rolling.std().droplevel(list(range(len(group_cols))))
         
         return self.df
     
+    def detect_anomalies(self):
+        """Score the rows not seen in previous runs and update the persisted detector state"""
+        base_dir = os.path.dirname(os.path.dirname(__file__))
+        params = self.config['anomaly_detection']
+        state_path = os.path.join(base_dir, params['state_path'])
+        
+        detector = AnomalyDetector.load(self.config, state_path, self.frequency)
+        anomalies = detector.update(self.df)
+        detector.save(state_path)
+        
+        if len(anomalies):
+            append_anomalies(anomalies, os.path.join(base_dir, params['output_path']))
+        print(f"New anomalies detected: {len(anomalies)}")
+        return anomalies
+    
     def process(self):
         """Complete data processing pipeline"""
         print("Loading data...")
@@ -122,6 +230,9 @@ class CoffeeDataProcessor:
         print("Creating rolling features...")
         self.create_rolling_features()
         
+        print("Detecting anomalies...")
+        self.detect_anomalies()
+        
         # Create processed directory if it doesn't exist
         processed_dir = os.path.dirname(os.path.join(
             os.path.dirname(os.path.dirname(__file__)),
@@ -139,4 +250,12 @@ class CoffeeDataProcessor:
         print(f"Saving processed data to: {processed_path}")
         self.df.to_parquet(processed_path)
         
+        # Publicar la versión compartida (Arrow IPC mapeado en memoria) para los dashboards
+        shared_dir = os.path.join(
+            os.path.dirname(os.path.dirname(__file__)),
+            self.config['data']['shared_dir']
+        )
+        print(f"Publishing shared dataset to: {shared_dir}")
+        publish_dataset(self.df, shared_dir)
+        
         return self.df
\ No newline at end of file
@@ -1,10 +1,12 @@
-import pandas as pd
-import numpy as np
+import os
 import matplotlib.pyplot as plt
 import seaborn as sns
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+from series_statistics import SeriesStatistics
+from chart_rendering import prepare_line_data
+from correlation_engine import correlation_from_frame, correlation_from_parquet
 
 # Deshabilitar tsfresh debido a problemas de compatibilidad
 TSFRESH_AVAILABLE = False
@@ -16,10 +18,23 @@ class CoffeeExploratoryAnalysis:
         
     def plot_consumption_timeseries(self):
         """Plot coffee consumption time series by country and type"""
-        fig = px.line(
+        # Sólo se envían al navegador los puntos que caben en el gráfico
+        plot_data = prepare_line_data(
             self.df,
             x=self.config['preprocessing']['date_column'],
             y=self.config['preprocessing']['consumption_column'],
+            series_cols=[
+                self.config['preprocessing']['country_column'],
+                self.config['preprocessing']['coffee_type_column']
+            ],
+            max_series=self.config['rendering']['max_series'],
+            points_per_series=self.config['rendering']['points_per_series']
+        )
+        
+        fig = px.line(
+            plot_data,
+            x=self.config['preprocessing']['date_column'],
+            y=self.config['preprocessing']['consumption_column'],
             color=self.config['preprocessing']['country_column'],
             facet_row=self.config['preprocessing']['coffee_type_column'],
             title="Coffee Consumption Trends by Country and Type",
@@ -47,10 +62,12 @@ class CoffeeExploratoryAnalysis:
         )
         return fig
         
-    def plot_correlation_matrix(self):
+    def plot_correlation_matrix(self, columns=None):
         """Plot correlation matrix of features"""
-        numeric_cols = self.df.select_dtypes(include=[np.number]).columns
-        corr_matrix = self.df[numeric_cols].corr()
+        # Estadísticos suficientes acumulados por bloques, sin copiar todo el frame a float
+        corr_matrix = correlation_from_frame(
+            self.df, columns=columns, chunk_size=self.config['correlation']['chunk_size']
+        )
         
         fig = go.Figure(data=go.Heatmap(
             z=corr_matrix.values,
@@ -68,33 +85,33 @@ class CoffeeExploratoryAnalysis:
         )
         return fig
         
+    def correlation_by_segment(self, segment_col=None, columns=None, path=None):
+        """Correlation matrices per segment, streamed from the parquet store
+        
+        Returns {segment: DataFrame}; with path=None the processed parquet file
+        configured in data.processed_path (relative to the project root) is read.
+        """
+        segment_col = segment_col or self.config['preprocessing']['country_column']
+        if path is None:
+            base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            path = os.path.join(base_dir, self.config['data']['processed_path'])
+        return correlation_from_parquet(
+            path,
+            columns=columns,
+            segment_col=segment_col,
+            batch_size=self.config['correlation']['batch_size'],
+            n_jobs=self.config['correlation']['n_jobs']
+        )
+        
     def analyze_features(self):
         """Alternative feature analysis without tsfresh"""
         print("Realizando análisis de características alternativo (sin tsfresh)")
         
-        # Calcular características básicas manualmente
-        features = {}
-        
-        # Estadísticas por país y tipo de café
-        for country in self.df[self.config['preprocessing']['country_column']].unique():
-            for coffee_type in self.df[self.config['preprocessing']['coffee_type_column']].unique():
-                key = f"{country}_{coffee_type}"
-                subset = self.df[
-                    (self.df[self.config['preprocessing']['country_column']] == country) &
-                    (self.df[self.config['preprocessing']['coffee_type_column']] == coffee_type)
-                ]
-                
-                if len(subset) > 0:
-                    consumption = subset[self.config['preprocessing']['consumption_column']]
-                    features[key] = {
-                        'mean': consumption.mean(),
-                        'std': consumption.std(),
-                        'min': consumption.min(),
-                        'max': consumption.max(),
-                        'trend': np.polyfit(range(len(consumption)), consumption, 1)[0]  # Pendiente de la tendencia
-                    }
-        
-        return pd.DataFrame.from_dict(features, orient='index')
+        # Estadísticas por país y tipo de café en una sola pasada agrupada
+        features = SeriesStatistics(self.config).compute(self.df)
+        features.index = [f"{country}_{coffee_type}" for country, coffee_type in features.index]
+        
+        return features[['mean', 'std', 'min', 'max', 'trend', 'cagr', 'volatility']]
         
     def create_dashboard(self):
         """Create comprehensive exploratory dashboard"""
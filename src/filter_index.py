@@ -0,0 +1,89 @@
+import pandas as pd
+import numpy as np
+
+class BitmapFilterIndex:
+    """Precomputed bitsets per country, coffee type and year for fast multi-select filters"""
+
+    def __init__(self, config):
+        self.config = config
+        self.columns = {
+            'country': config['preprocessing']['country_column'],
+            'coffee_type': config['preprocessing']['coffee_type_column'],
+            'year': config['preprocessing']['date_column']
+        }
+        self.n_rows = 0
+        self.values = {}
+        self.positions = {}
+        self.bitsets = {}
+
+    def _build_bitsets(self, codes, cardinality):
+        """One packed bitset (big-endian bit order, as np.packbits) per distinct value"""
+        n_bytes = (self.n_rows + 7) // 8
+        bitsets = np.zeros((cardinality, n_bytes), dtype=np.uint8)
+        rows = np.arange(self.n_rows)
+        valid = codes >= 0
+        np.bitwise_or.at(
+            bitsets,
+            (codes[valid], rows[valid] >> 3),
+            (np.uint8(0x80) >> (rows[valid] & 7)).astype(np.uint8)
+        )
+        return bitsets
+
+    def build(self, df):
+        """Build the bitsets for the filter columns of df"""
+        self.n_rows = len(df)
+        for name, column in self.columns.items():
+            # Los años se ordenan para que un rango sea un bloque contiguo de bitsets
+            codes, values = pd.factorize(df[column], sort=(name == 'year'))
+            self.values[name] = np.asarray(values)
+            self.positions[name] = {value: pos for pos, value in enumerate(values)}
+            self.bitsets[name] = self._build_bitsets(codes, len(values))
+        return self
+
+    def _union(self, name, values):
+        """OR of the bitsets of the selected values, or None when nothing is filtered out"""
+        if values is None:
+            return None
+        codes = [self.positions[name][value] for value in values if value in self.positions[name]]
+        if len(set(codes)) == len(self.values[name]):
+            return None
+        if not codes:
+            return np.zeros(self.bitsets[name].shape[1], dtype=np.uint8)
+        return np.bitwise_or.reduce(self.bitsets[name][codes], axis=0)
+
+    def _year_union(self, year_range):
+        if year_range is None:
+            return None
+        years = self.values['year']
+        start = np.searchsorted(years, year_range[0], side='left')
+        stop = np.searchsorted(years, year_range[1], side='right')
+        if start == 0 and stop == len(years):
+            return None
+        if start >= stop:
+            return np.zeros(self.bitsets['year'].shape[1], dtype=np.uint8)
+        return np.bitwise_or.reduce(self.bitsets['year'][start:stop], axis=0)
+
+    def query(self, countries=None, coffee_types=None, year_range=None):
+        """Row positions matching the selection (AND across filters, OR within one)"""
+        masks = [
+            self._union('country', countries),
+            self._union('coffee_type', coffee_types),
+            self._year_union(year_range)
+        ]
+        masks = [mask for mask in masks if mask is not None]
+        if not masks:
+            return np.arange(self.n_rows)
+
+        combined = masks[0].copy()
+        for mask in masks[1:]:
+            np.bitwise_and(combined, mask, out=combined)
+        return np.flatnonzero(np.unpackbits(combined, count=self.n_rows))
+
+    def take(self, df, positions, columns=None):
+        """Rows of df at positions; a contiguous run is returned as a slice without copying"""
+        data = df if columns is None else df[columns]
+        if len(positions) == len(df):
+            return data
+        if len(positions) and positions[-1] - positions[0] + 1 == len(positions):
+            return data.iloc[positions[0]:positions[-1] + 1]
+        return data.iloc[positions]
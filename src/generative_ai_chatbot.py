@@ -1,49 +1,143 @@
 # src/generative_ai_chatbot.py
-from openai import OpenAI
-import pandas as pd
+import time
+import metrics
+from utils import dataframe_fingerprint
+from chat_context import ChatContextBuilder
+from local_query import LocalQueryEngine
+from llm_client import shared_client
 
 class CoffeeAnalyticsChatbot:
-    def __init__(self, df, api_key):
+    def __init__(self, df, api_key, similarity_index=None, cache=None, llm=None, data_fingerprint=None):
         self.df = df
-        self.client = OpenAI(api_key=api_key)
-    
-    def generate_context(self):
-        """Generar contexto basado en los datos disponibles"""
-        context = f"""
-        Datos de consumo de café (1990-2020):
-        - Países: {', '.join(self.df['country'].unique())}
-        - Tipos de café: {', '.join(self.df['coffee_type'].unique())}
-        - Rango temporal: {self.df['year'].min()} a {self.df['year'].max()}
-        - Consumo total: {self.df['consumption_cups'].sum():,} tazas
-        - Precio promedio: ${self.df['price_per_cup'].mean():.2f}
+        # Cliente asíncrono compartido por todas las instancias (y sesiones) del proceso
+        self.llm = llm if llm is not None else shared_client(api_key)
+        self.similarity_index = similarity_index
+        self.cache = cache
         
-        Datos específicos para 2020:
-        """
+        # Parámetros del modelo (forman parte de la clave de caché)
+        self.model = "gpt-3.5-turbo"
+        self.max_tokens = 500
+        self.temperature = 0.7
+        self.context_token_budget = 600
+        # Preguntas numéricas sencillas se responden localmente sin llamar al LLM
+        self.local_queries = True
+        # Huella de los datos; quien conoce la versión y los filtros puede pasarla
+        # directamente y evitar el hash del DataFrame
+        self._data_fingerprint = data_fingerprint
+    
+    def data_fingerprint(self):
+        """Huella del DataFrame de contexto, calculada una sola vez"""
+        if self._data_fingerprint is None:
+            self._data_fingerprint = dataframe_fingerprint(self.df)
+        return self._data_fingerprint
+    
+    def context_builder(self):
+        return ChatContextBuilder(self.df, self.data_fingerprint(), token_budget=self.context_token_budget)
+    
+    def local_answer(self, question):
+        """Respuesta determinista desde los agregados, o None si hace falta el LLM"""
+        if not self.local_queries:
+            return None
+        builder = self.context_builder()
+        return LocalQueryEngine(self.df, builder.fingerprint, builder).answer(question)
+    
+    def cache_key(self, question):
+        return self.cache.make_key(question, self.data_fingerprint(), {
+            'model': self.model,
+            'max_tokens': self.max_tokens,
+            'temperature': self.temperature,
+            'similarity': self.similarity_index is not None
+        })
+    
+    def find_similar_markets(self, country, coffee_type, k=5):
+        """Mercados con trayectoria de consumo más parecida a (country, coffee_type)"""
+        if self.similarity_index is None:
+            return None
+        return self.similarity_index.query(country, coffee_type, k=k)
+    
+    def similarity_context(self, question):
+        """Contexto de mercados similares cuando la pregunta los menciona"""
+        text = question.lower()
+        if self.similarity_index is None or not any(word in text for word in ('similar', 'parecid')):
+            return ""
         
-        # Agregar datos específicos de 2020
-        data_2020 = self.df[self.df['year'] == 2020]
-        if not data_2020.empty:
-            consumption_by_country = data_2020.groupby('country')['consumption_cups'].sum()
-            context += f"\nConsumo por país en 2020:\n"
-            for country, consumption in consumption_by_country.items():
-                context += f"- {country}: {consumption} tazas\n"
+        entities = self.context_builder().extract_entities(question)
+        countries, coffee_types = entities['countries'], entities['coffee_types']
+        if not countries or not coffee_types:
+            return ""
         
+        try:
+            neighbours = self.find_similar_markets(countries[0], coffee_types[0])
+        except KeyError:
+            return ""
+        
+        context = f"\nMercados más similares a {countries[0]} - {coffee_types[0]}:\n"
+        for row in neighbours.itertuples(index=False):
+            context += f"- {row.country} - {row.coffee_type} (distancia {row.distance:.2f})\n"
         return context
     
-    def ask_question(self, question):
-        """Responder pregunta basada en los datos"""
-        context = self.generate_context()
+    def generate_context(self, question=''):
+        """Generar contexto acotado con los resúmenes relevantes para la pregunta"""
+        return self.context_builder().build(question)
+    
+    def messages(self, question):
+        context = self.generate_context(question) + self.similarity_context(question)
+        return [
+            {"role": "system", "content": "Eres un analista de datos especializado en café. Responde preguntas basándote en los datos proporcionados. Sé conciso y preciso."},
+            {"role": "user", "content": f"{context}\n\nPregunta: {question}\nRespuesta:"}
+        ]
+    
+    def ask_question_stream(self, question):
+        """Responder pregunta emitiendo el texto a medida que llega
         
+        Las respuestas locales y las de caché se emiten completas de una vez.
+        """
+        start = time.perf_counter()
+        source = 'llm'
+        try:
+            answer = self.local_answer(question)
+            if answer is not None:
+                source = 'local'
+                yield answer
+                return
+            
+            key = None
+            if self.cache is not None:
+                key = self.cache_key(question)
+                cached = self.cache.get(key)
+                if cached is not None:
+                    source = 'cache'
+                    yield cached
+                    return
+            
+            source = yield from self._stream_llm(question, key)
+        finally:
+            # Tiempo hasta la respuesta completa (o hasta que la sesión dejó de leer)
+            metrics.inc('chatbot_requests_total', source=source)
+            metrics.observe('chatbot_response_seconds', time.perf_counter() - start, source=source)
+    
+    def _stream_llm(self, question, key):
+        """Emitir la respuesta del LLM y guardarla en caché; devuelve 'llm' o 'error'"""
+        tokens = []
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "Eres un analista de datos especializado en café. Responde preguntas basándote en los datos proporcionados. Sé conciso y preciso."},
-                    {"role": "user", "content": f"{context}\n\nPregunta: {question}\nRespuesta:"}
-                ],
-                max_tokens=500,
-                temperature=0.7
-            )
-            return response.choices[0].message.content
+            for token in self.llm.stream_chat(
+                self.messages(question),
+                model=self.model,
+                max_tokens=self.max_tokens,
+                temperature=self.temperature
+            ):
+                tokens.append(token)
+                yield token
         except Exception as e:
-            return f"Error al procesar la pregunta: {str(e)}"
\ No newline at end of file
+            prefix = "\n\n" if tokens else ""
+            yield f"{prefix}Error al procesar la pregunta: {str(e)}"
+            return 'error'
+        
+        # Los errores y las respuestas interrumpidas no se guardan en caché
+        if key is not None:
+            self.cache.set(key, ''.join(tokens))
+        return 'llm'
+    
+    def ask_question(self, question):
+        """Responder pregunta basada en los datos"""
+        return ''.join(self.ask_question_stream(question))
@@ -0,0 +1,284 @@
+# src/job_runner.py
+import os
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import threading
+import joblib
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (COMPLETED, FAILED, CANCELLED)
+
+class JobCancelled(Exception):
+    """Raised inside a job when its cancellation has been requested"""
+
+class JobContext:
+    """Handle passed to every job to report progress and observe cancellation"""
+
+    def __init__(self, runner, job_id, cancel_event):
+        self.runner = runner
+        self.job_id = job_id
+        self._cancel_event = cancel_event
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def report(self, done, total, message=''):
+        """Record progress; raises JobCancelled if the job was cancelled"""
+        if self.cancelled:
+            raise JobCancelled(self.job_id)
+        self.runner._update(self.job_id, progress=done, total=total, message=message)
+
+class JobRunner:
+    """Local background jobs: worker pool plus a persistent SQLite job table
+
+    Several runners (server processes, or a runner re-created after a code
+    reload) can share the table. Every job records the runner that owns it and
+    every runner refreshes a heartbeat; unfinished jobs are only marked failed
+    once their owner has stopped beating. Finished jobs and their result files
+    are deleted after retention_seconds.
+    """
+
+    def __init__(self, db_path, results_dir, max_workers=2, heartbeat_seconds=10.0,
+                 retention_seconds=7 * 86400):
+        self.db_path = db_path
+        self.results_dir = results_dir
+        self.heartbeat_seconds = heartbeat_seconds
+        self.retention_seconds = retention_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        os.makedirs(results_dir, exist_ok=True)
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._futures = {}
+        self._cancel_events = {}
+        # Resultados que no se pudieron serializar quedan sólo en memoria
+        self._results = {}
+        self._stop = threading.Event()
+        self._init_db()
+        self._beat()
+        self.recover_orphans()
+        self.cleanup()
+        self._heartbeat_thread = threading.Thread(
+            target=self._heartbeat_loop, name='job-heartbeat', daemon=True
+        )
+        self._heartbeat_thread.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def _execute(self, query, params=(), fetch=None):
+        connection = self._connect()
+        try:
+            with connection:
+                cursor = connection.execute(query, params)
+                if fetch == 'one':
+                    return cursor.fetchone()
+                if fetch == 'all':
+                    return cursor.fetchall()
+        finally:
+            connection.close()
+
+    def _init_db(self):
+        self._execute("PRAGMA journal_mode=WAL")
+        self._execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                progress INTEGER DEFAULT 0,
+                total INTEGER DEFAULT 0,
+                message TEXT DEFAULT '',
+                error TEXT,
+                result_path TEXT,
+                created_at REAL,
+                updated_at REAL
+            )
+        """)
+        columns = {row['name'] for row in self._execute("PRAGMA table_info(jobs)", fetch='all')}
+        if 'owner' not in columns:
+            # Tablas creadas antes de registrar el dueño de cada trabajo
+            self._execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        self._execute("""
+            CREATE TABLE IF NOT EXISTS runners (
+                owner TEXT PRIMARY KEY,
+                heartbeat_at REAL
+            )
+        """)
+
+    def _beat(self):
+        self._execute(
+            "INSERT OR REPLACE INTO runners (owner, heartbeat_at) VALUES (?, ?)",
+            (self.owner, time.time())
+        )
+
+    def _heartbeat_loop(self):
+        last_cleanup = time.time()
+        while not self._stop.wait(self.heartbeat_seconds):
+            try:
+                self._beat()
+                self.recover_orphans()
+                if time.time() - last_cleanup > min(self.retention_seconds, 3600):
+                    self.cleanup()
+                    last_cleanup = time.time()
+            except (sqlite3.Error, OSError) as e:
+                logger.warning("Job runner heartbeat failed: %s", e)
+
+    def recover_orphans(self):
+        """Mark failed the unfinished jobs whose runner stopped beating (its process is gone)"""
+        now = time.time()
+        stale_before = now - 3 * self.heartbeat_seconds
+        self._execute("""
+            UPDATE jobs SET status = ?, error = ?, updated_at = ?
+            WHERE status IN (?, ?)
+              AND (owner IS NULL OR owner NOT IN (
+                  SELECT owner FROM runners WHERE heartbeat_at >= ?
+              ))
+        """, (FAILED, 'Interrupted by a server restart', now, PENDING, RUNNING, stale_before))
+
+    def cleanup(self):
+        """Delete finished jobs older than the retention period, their result files and dead runners"""
+        cutoff = time.time() - self.retention_seconds
+        placeholders = ', '.join('?' for _ in FINISHED)
+        expired = self._execute(
+            f"SELECT job_id, result_path FROM jobs WHERE status IN ({placeholders}) AND updated_at < ?",
+            (*FINISHED, cutoff), fetch='all'
+        )
+        for row in expired:
+            if row['result_path']:
+                try:
+                    os.remove(row['result_path'])
+                except FileNotFoundError:
+                    pass
+            with self._lock:
+                self._results.pop(row['job_id'], None)
+        self._execute(
+            f"DELETE FROM jobs WHERE status IN ({placeholders}) AND updated_at < ?", (*FINISHED, cutoff)
+        )
+        self._execute("DELETE FROM runners WHERE heartbeat_at < ?", (cutoff,))
+
+        # Resultados sin fila en la tabla (p. ej. filas borradas a mano)
+        referenced = {
+            os.path.basename(row['result_path'])
+            for row in self._execute("SELECT result_path FROM jobs WHERE result_path IS NOT NULL", fetch='all')
+        }
+        for name in os.listdir(self.results_dir):
+            path = os.path.join(self.results_dir, name)
+            if name.endswith('.joblib') and name not in referenced and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        return len(expired)
+
+    def close(self):
+        """Stop the heartbeat and the workers (running jobs finish first)"""
+        self._stop.set()
+        self.executor.shutdown(wait=True)
+        self._execute("DELETE FROM runners WHERE owner = ?", (self.owner,))
+
+    def _update(self, job_id, **fields):
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        self._execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def submit(self, kind, func, *args, **kwargs):
+        """Queue func(context, *args, **kwargs) and return its job id"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._execute(
+            "INSERT INTO jobs (job_id, kind, status, owner, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, kind, PENDING, self.owner, now, now)
+        )
+
+        cancel_event = threading.Event()
+        with self._lock:
+            self._cancel_events[job_id] = cancel_event
+            self._futures[job_id] = self.executor.submit(
+                self._run, job_id, cancel_event, func, args, kwargs
+            )
+        return job_id
+
+    def _run(self, job_id, cancel_event, func, args, kwargs):
+        if cancel_event.is_set():
+            self._update(job_id, status=CANCELLED)
+            return
+
+        self._update(job_id, status=RUNNING)
+        context = JobContext(self, job_id, cancel_event)
+        try:
+            result = func(context, *args, **kwargs)
+        except JobCancelled:
+            self._update(job_id, status=CANCELLED, message='Cancelled')
+            return
+        except Exception as e:
+            logger.exception("Job %s failed", job_id)
+            self._update(job_id, status=FAILED, error=str(e))
+            return
+        finally:
+            with self._lock:
+                self._futures.pop(job_id, None)
+                self._cancel_events.pop(job_id, None)
+
+        result_path = os.path.join(self.results_dir, f"{job_id}.joblib")
+        try:
+            joblib.dump(result, result_path)
+        except Exception as e:
+            logger.warning("Result of job %s could not be persisted: %s", job_id, e)
+            result_path = None
+            with self._lock:
+                self._results[job_id] = result
+        self._update(job_id, status=COMPLETED, result_path=result_path)
+
+    def cancel(self, job_id):
+        """Request cancellation; pending jobs never start, running jobs stop at their next report"""
+        with self._lock:
+            cancel_event = self._cancel_events.get(job_id)
+            future = self._futures.get(job_id)
+        if cancel_event is None:
+            return False
+
+        cancel_event.set()
+        if future is not None and future.cancel():
+            with self._lock:
+                self._futures.pop(job_id, None)
+                self._cancel_events.pop(job_id, None)
+            self._update(job_id, status=CANCELLED, message='Cancelled')
+        return True
+
+    def get_job(self, job_id):
+        """Current row of the job table as a dict (None if unknown)"""
+        row = self._execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,), fetch='one')
+        return dict(row) if row else None
+
+    def list_jobs(self, kind=None, limit=20):
+        query = "SELECT * FROM jobs"
+        params = ()
+        if kind is not None:
+            query += " WHERE kind = ?"
+            params = (kind,)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        rows = self._execute(query, (*params, limit), fetch='all')
+        return [dict(row) for row in rows]
+
+    def get_result(self, job_id):
+        """Result of a completed job"""
+        with self._lock:
+            if job_id in self._results:
+                return self._results[job_id]
+        job = self.get_job(job_id)
+        if job is None or job['status'] != COMPLETED:
+            raise ValueError(f"Job {job_id} has no result")
+        if job['result_path'] is None:
+            raise ValueError(f"Result of job {job_id} was not persisted and is no longer in memory")
+        return joblib.load(job['result_path'])
@@ -0,0 +1,147 @@
+# src/llm_client.py
+import queue
+import asyncio
+import logging
+import threading
+import time
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Marca de fin de stream en la cola
+_DONE = object()
+
+# Clientes compartidos por proceso, uno por configuración
+_clients = {}
+_clients_lock = threading.Lock()
+
+def shared_client(api_key, base_url=None, **options):
+    """Process-wide AsyncLLMClient for an API key and endpoint"""
+    key = (api_key, base_url, tuple(sorted(options.items())))
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = AsyncLLMClient(api_key, base_url=base_url, **options)
+        return _clients[key]
+
+class AsyncLLMClient:
+    """Long-lived AsyncOpenAI client running on a background event loop
+
+    One instance is meant to be shared by every session: the HTTP connection
+    pool is reused, at most max_concurrency completions run at once, and the
+    streamed tokens are handed to synchronous callers through a queue.
+    """
+
+    def __init__(self, api_key, base_url=None, max_concurrency=4, timeout=30.0,
+                 first_token_timeout=10.0, max_retries=2, client=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.first_token_timeout = first_token_timeout
+        self.max_retries = max_retries
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='llm-client', daemon=True)
+        self._thread.start()
+        # Cliente y semáforo se crean dentro del bucle, que es donde se usan
+        self._client = client
+        self._semaphore = None
+        asyncio.run_coroutine_threadsafe(self._setup(), self._loop).result()
+
+    async def _setup(self):
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self._client is None:
+            from openai import AsyncOpenAI
+            # base_url=None deja que el SDK use OPENAI_BASE_URL (p. ej. un servidor mock local)
+            self._client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                timeout=self.timeout,
+                # Los reintentos los hace _produce; los del SDK se multiplicarían con ellos
+                max_retries=0
+            )
+
+    async def _produce(self, messages, params, output):
+        """Stream one completion into output, retrying failures that happen before the first token"""
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                started = False
+                stream = None
+                try:
+                    stream = await self._client.chat.completions.create(
+                        messages=messages, stream=True, **params
+                    )
+                    chunks = stream.__aiter__()
+                    while True:
+                        timeout = self.timeout if started else self.first_token_timeout
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+                        except StopAsyncIteration:
+                            break
+                        if not chunk.choices:
+                            continue
+                        token = chunk.choices[0].delta.content
+                        if token:
+                            started = True
+                            output.put(token)
+                    output.put(_DONE)
+                    return
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # Una vez emitidos tokens no se reintenta: el texto quedaría duplicado
+                    if started or attempt == self.max_retries:
+                        output.put(e)
+                        return
+                    logger.warning("LLM request failed (attempt %d), retrying: %s", attempt + 1, e)
+                    metrics.inc('llm_retries_total')
+                finally:
+                    # Liberar la conexión del pool también tras timeout, error o cancelación
+                    if stream is not None:
+                        await self._close_stream(stream)
+                await asyncio.sleep(0.5 * 2 ** attempt)
+
+    async def _close_stream(self, stream):
+        try:
+            await stream.close()
+        except Exception as e:
+            logger.debug("Error closing LLM stream: %s", e)
+
+    def stream_chat(self, messages, **params):
+        """Yield completion tokens as they arrive; errors are raised in the caller"""
+        output = queue.Queue()
+        start = time.perf_counter()
+        first = True
+        future = asyncio.run_coroutine_threadsafe(self._produce(messages, params, output), self._loop)
+        # Fallos inesperados del productor no deben dejar al consumidor esperando
+        future.add_done_callback(
+            lambda f: output.put(f.exception()) if not f.cancelled() and f.exception() else None
+        )
+        try:
+            while True:
+                item = output.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, Exception):
+                    metrics.inc('llm_errors_total', error=type(item).__name__)
+                    raise item
+                if first:
+                    # Incluye la espera por el semáforo de concurrencia
+                    metrics.observe('llm_first_token_seconds', time.perf_counter() - start)
+                    first = False
+                yield item
+        finally:
+            # El consumidor dejó de leer (p. ej. la sesión se recargó)
+            if not future.done():
+                future.cancel()
+
+    def complete(self, messages, **params):
+        """Full completion text (blocking)"""
+        return ''.join(self.stream_chat(messages, **params))
+
+    def close(self):
+        async def _close():
+            if hasattr(self._client, 'close'):
+                await self._client.close()
+        asyncio.run_coroutine_threadsafe(_close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
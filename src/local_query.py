@@ -0,0 +1,256 @@
+# src/local_query.py
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from aggregate_cube import AggregateCube
+from chat_context import COUNTRY_ALIASES, COUNTRY_NAMES, normalize_text
+
+# Columnas del dataset que usa el chatbot
+CHAT_COLUMNS = {
+    'preprocessing': {
+        'date_column': 'year',
+        'country_column': 'country',
+        'coffee_type_column': 'coffee_type',
+        'consumption_column': 'consumption_cups',
+        'price_column': 'price_per_cup'
+    }
+}
+
+# Preguntas abiertas: siempre van al LLM
+OPEN_ENDED = (
+    'por que', 'porque', 'why', 'explica', 'recomienda', 'estrategia', 'predic', 'pronostic',
+    'forecast', 'futuro', 'deberia', 'similar', 'parecid', 'compara', 'tendencia', 'opina'
+)
+# Palabras (o raíces con \w*) que marcan la intención; se comparan como palabras completas
+GROWTH_WORDS = ('crecimiento', 'crecio', 'crece', 'growth', 'variacion', 'cambio', 'aumento', r'disminu\w*')
+AVERAGE_WORDS = ('promedio', 'media', 'average', 'mean')
+TOTAL_WORDS = ('total', 'suma', 'sum', r'cuant[oa]s?')
+TOP_WORDS = (
+    'top', 'mayor', 'menor', 'mayores', 'menores', 'principales', 'ranking', r'lider(?:es)?',
+    r'mas consum\w*', r'menos consum\w*', 'highest', 'lowest'
+)
+LOOKUP_WORDS = ('consumo', 'consumption', r'consumi\w*', r'precios?', r'prices?')
+
+def _matches(words, text):
+    return re.search(rf"\b(?:{'|'.join(words)})\b", text) is not None
+
+# Nombre propio tras una preposición ("consumo en Colombia", "price of Kenya")
+PLACE_PATTERN = re.compile(
+    r'\b(?:en|de|del|para|in|of|for)\s+([A-ZÁÉÍÓÚÑ][\wáéíóúüñ]*(?:\s+[A-ZÁÉÍÓÚÑ][\wáéíóúüñ]*)*)'
+)
+
+class LocalQueryEngine:
+    """Answers lookup, sum, average, top-N and growth questions from indexed aggregates
+
+    Questions the parser does not recognise (or open-ended ones) return None so
+    the caller can fall back to the LLM.
+    """
+
+    # Cubos compartidos por huella de datos
+    _cubes = OrderedDict()
+    _lock = threading.Lock()
+    max_cached_cubes = 32
+
+    def __init__(self, df, fingerprint, context_builder):
+        self.df = df
+        self.fingerprint = fingerprint
+        self.context_builder = context_builder
+
+    def cube(self):
+        with self._lock:
+            if self.fingerprint in self._cubes:
+                self._cubes.move_to_end(self.fingerprint)
+                return self._cubes[self.fingerprint]
+
+        cube = AggregateCube(CHAT_COLUMNS).build(self.df)
+        with self._lock:
+            self._cubes[self.fingerprint] = cube
+            while len(self._cubes) > self.max_cached_cubes:
+                self._cubes.popitem(last=False)
+        return cube
+
+    def parse(self, question):
+        """Intent and entities of a question, or None if it is not a data lookup"""
+        text = normalize_text(question)
+        if any(word in text for word in OPEN_ENDED):
+            return None
+
+        entities = self.context_builder.extract_entities(question)
+        # Países o lugares que no están en los datos: mejor que responda el LLM
+        if self._unknown_place(question, text):
+            return None
+        metric = 'price' if re.search(r'\b(precio|price)', text) else 'consumption'
+        by_type = bool(re.search(r'\btipos?\b|\btypes?\b', text))
+
+        if _matches(GROWTH_WORDS, text):
+            intent = 'growth'
+        elif _matches(TOP_WORDS, text) or ('consum' in text and re.search(r'\b(mas|menos)\b', text)):
+            intent = 'top'
+        elif _matches(AVERAGE_WORDS, text):
+            intent = 'average'
+        elif _matches(TOTAL_WORDS, text):
+            intent = 'total'
+        elif _matches(LOOKUP_WORDS, text) and (
+            entities['countries'] or entities['coffee_types'] or entities['years']
+        ):
+            intent = 'lookup'
+        else:
+            return None
+
+        top_n = re.search(r'\btop\s*(\d+)\b|\b(\d+)\s+(?:paises|mercados|tipos|principales|countries|markets)\b', text)
+        if top_n:
+            n = int(top_n.group(1) or top_n.group(2))
+        elif re.search(r'\b(el|que|cual) (pais|tipo|mercado)\b', text):
+            n = 1
+        else:
+            n = 5
+
+        return {
+            'intent': intent,
+            'metric': metric,
+            'by_type': by_type,
+            'n': n,
+            'ascending': bool(re.search(r'\b(menor|menos|lowest|bottom)\b', text)),
+            **entities
+        }
+
+    def _unknown_place(self, question, text):
+        """Whether the question names a country or place that is not in the data"""
+        summaries = self.context_builder.summaries()
+        known = set(summaries['country_lookup']) | set(summaries['type_lookup'])
+        for name in COUNTRY_NAMES + tuple(COUNTRY_ALIASES):
+            if name not in known and re.search(rf'\b{re.escape(name)}\b', text):
+                return True
+        known_words = {word for name in known for word in name.split()}
+        for phrase in PLACE_PATTERN.findall(question):
+            if any(word not in known_words for word in normalize_text(phrase).split()):
+                return True
+        return False
+
+    def _scope(self, query):
+        parts = query['countries'] + query['coffee_types']
+        return ' - '.join(parts) if parts else 'todos los mercados'
+
+    def _period(self, years):
+        return str(years[0]) if years[0] == years[1] else f"{years[0]}-{years[1]}"
+
+    def answer(self, question):
+        """Deterministic answer for a data question, or None to defer to the LLM"""
+        query = self.parse(question)
+        if query is None:
+            return None
+
+        cube = self.cube()
+        years = sorted(query['years'])
+        if any(year not in cube.years for year in years):
+            return None
+        if not years:
+            # Sin año explícito: último año para rankings y búsquedas; rango completo para
+            # totales, promedios y crecimiento
+            last = int(cube.years[-1])
+            full_range = query['intent'] in ('growth', 'total', 'average')
+            years = [int(cube.years[0]), last] if full_range else [last]
+        year_range = (years[0], years[-1])
+
+        selection = cube.select(
+            query['countries'] or None,
+            query['coffee_types'] or None,
+            year_range
+        )
+        if selection['rows'].sum() == 0:
+            return None
+
+        handler = getattr(self, f"_answer_{query['intent']}")
+        return handler(cube, selection, query, year_range)
+
+    def _mean_price(self, selection):
+        count = selection['price_count'].sum()
+        return selection['price_sum'].sum() / count if count else np.nan
+
+    def _answer_lookup(self, cube, selection, query, year_range):
+        scope, period = self._scope(query), self._period(year_range)
+        if query['metric'] == 'price':
+            return f"El precio promedio por taza de {scope} en {period} fue de ${self._mean_price(selection):.2f}."
+        total = cube.kpis(selection)['total_consumption']
+        return f"El consumo de {scope} en {period} fue de {total:,.0f} tazas."
+
+    def _answer_total(self, cube, selection, query, year_range):
+        return self._answer_lookup(cube, selection, query, year_range)
+
+    def _answer_average(self, cube, selection, query, year_range):
+        scope, period = self._scope(query), self._period(year_range)
+        if query['metric'] == 'price':
+            return f"El precio promedio por taza de {scope} en {period} fue de ${self._mean_price(selection):.2f}."
+        average = cube.kpis(selection)['avg_consumption']
+        return (
+            f"El consumo promedio de {scope} en {period} fue de {average:,.1f} tazas "
+            f"por registro (país, tipo de café y año)."
+        )
+
+    def _ranking(self, selection, query):
+        """Name, value and unit label per country (or coffee type) for the query metric"""
+        if query['by_type']:
+            names, axes, label = selection['coffee_types'], (0, 1), 'tipos de café'
+        else:
+            names, axes, label = selection['countries'], (0, 2), 'países'
+        present = selection['rows'].sum(axis=axes) > 0
+        if query['metric'] == 'price':
+            count = selection['price_count'].sum(axis=axes)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values = selection['price_sum'].sum(axis=axes) / count
+            present &= count > 0
+        else:
+            values = selection['consumption_sum'].sum(axis=axes)
+        ranking = pd.DataFrame({
+            'name': np.asarray(names, dtype=object)[present],
+            'value': values[present]
+        })
+        return ranking, label
+
+    def _format_value(self, value, metric):
+        return f"${value:.2f} por taza" if metric == 'price' else f"{value:,.0f} tazas"
+
+    def _answer_top(self, cube, selection, query, year_range):
+        ranking, label = self._ranking(selection, query)
+        ranking = ranking.sort_values('value', ascending=query['ascending'], kind='stable').head(query['n'])
+
+        order = 'menor' if query['ascending'] else 'mayor'
+        measure = 'precio promedio' if query['metric'] == 'price' else 'consumo'
+        period = self._period(year_range)
+        if len(ranking) == 1:
+            row = ranking.iloc[0]
+            return (
+                f"{row['name']} tuvo el {order} {measure} en {period}: "
+                f"{self._format_value(row['value'], query['metric'])}."
+            )
+
+        lines = [f"Top {len(ranking)} {label} por {order} {measure} en {period}:"]
+        for position, row in enumerate(ranking.itertuples(index=False), start=1):
+            lines.append(f"{position}. {row.name}: {self._format_value(row.value, query['metric'])}")
+        return '\n'.join(lines)
+
+    def _answer_growth(self, cube, selection, query, year_range):
+        if year_range[0] == year_range[1]:
+            return None
+        if query['metric'] == 'price':
+            count = selection['price_count'].sum(axis=(1, 2))
+            if count[0] == 0 or count[-1] == 0:
+                return None
+            yearly = selection['price_sum'].sum(axis=(1, 2)) / np.where(count > 0, count, 1)
+        else:
+            yearly = selection['consumption_sum'].sum(axis=(1, 2))
+        start, end = yearly[0], yearly[-1]
+        if start <= 0:
+            return None
+
+        periods = year_range[1] - year_range[0]
+        change = (end / start - 1) * 100
+        cagr = (end / start) ** (1 / periods) - 1
+        measure = 'El precio promedio por taza' if query['metric'] == 'price' else 'El consumo'
+        return (
+            f"{measure} de {self._scope(query)} pasó de {self._format_value(start, query['metric'])} "
+            f"en {year_range[0]} a {self._format_value(end, query['metric'])} en {year_range[1]} "
+            f"({change:+.1f}%, crecimiento anual compuesto de {cagr:.2%})."
+        )
@@ -1,13 +1,7 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-from data_processing import CoffeeDataProcessor
-from exploratory_analysis import ExploratoryAnalysis
-from src.time_series_model import TimeSeriesModel
-from src.predictive_modeling import PredictiveModeling
-from src.market_segmentation import MarketSegmentation
-from src.generative_ai_chatbot import CoffeeAnalyticsChatbot
-from src.utils import load_config, setup_logging
+from shared_dataset import load_shared_dataset, has_shared_dataset
+from utils import load_config, setup_logging
+import metrics
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -35,16 +29,33 @@ def main():
     }
     
     page = st.sidebar.selectbox("Select Page", list(pages.keys()))
-    pages[page]()
+    with metrics.timed('page_render_seconds', page=page):
+        pages[page]()
+    
+@st.cache_resource
+def start_metrics():
+    """Metrics endpoint and JSON snapshots, started once per server process"""
+    return metrics.MetricsExporter(config).start()
+    
+@metrics.timed('data_load_seconds')
+def get_data():
+    """Processed dataset shared by every session (None until it has been published)"""
+    shared_dir = config['data']['shared_dir']
+    if not has_shared_dataset(shared_dir):
+        return None
+    return load_shared_dataset(shared_dir)
     
 def data_overview():
     st.header("Data Overview")
     
     if st.button("Load and Process Data"):
         with st.spinner("Processing data..."):
+            # Los back ends se importan en el primer uso para acelerar el arranque
+            from data_processing import CoffeeDataProcessor
             processor = CoffeeDataProcessor(config)
-            df = processor.process()
-            st.session_state.df = df
+            processor.process()
+            # Cada sesión usa la copia compartida en lugar de guardar su propio DataFrame
+            df = get_data()
         
         st.success("Data processed successfully!")
         st.dataframe(df.head())
@@ -60,11 +71,12 @@ def data_overview():
 def exploratory_analysis():
     st.header("Exploratory Analysis")
     
-    if 'df' not in st.session_state:
+    df = get_data()
+    if df is None:
         st.warning("Please load data first from the Data Overview page")
         return
     
-    df = st.session_state.df
+    from exploratory_analysis import CoffeeExploratoryAnalysis
     analyzer = CoffeeExploratoryAnalysis(df, config)
     
     if st.button("Generate Analysis"):
@@ -79,64 +91,138 @@ def exploratory_analysis():
             
             st.plotly_chart(analyzer.create_dashboard(), use_container_width=True)
 
+@st.cache_resource
+def get_job_runner():
+    """Background job runner shared by every session of this server process"""
+    from job_runner import JobRunner
+    return JobRunner(
+        config['jobs']['db_path'],
+        config['jobs']['results_dir'],
+        max_workers=config['jobs']['max_workers'],
+        heartbeat_seconds=config['jobs']['heartbeat_seconds'],
+        retention_seconds=config['jobs']['retention_days'] * 86400
+    )
+
+def train_prophet_job(context, df):
+    """Background job: train one Prophet model per series, reporting progress"""
+    from time_series_model import TimeSeriesModel
+    ts_model = TimeSeriesModel(config)
+    models = ts_model.train_all_models(df, progress_callback=context.report)
+    return {'models': models}
+
+def segmentation_job(context, df, mode):
+    """Background job: cluster the markets and build the result views"""
+    from market_segmentation import MarketSegmentation
+    segmenter = MarketSegmentation(config)
+    
+    context.report(0, 3, "Preparing data")
+    clustered_data = segmenter.prepare_clustering_data(df)
+    
+    context.report(1, 3, "Clustering")
+    diagnostics = None
+    if mode == "K-Means":
+        clusters, model = segmenter.perform_kmeans_clustering(clustered_data)
+    else:
+        clusters, model, diagnostics = segmenter.perform_minibatch_clustering(clustered_data)
+    
+    context.report(2, 3, "Building views")
+    figure = segmenter.visualize_clusters(clustered_data, clusters)
+    growth_markets = segmenter.identify_growth_markets(clustered_data, clusters)
+    context.report(3, 3, "Done")
+    
+    return {'figure': figure, 'growth_markets': growth_markets, 'diagnostics': diagnostics}
+
+def show_job(state_key, render_result):
+    """Show status, progress and controls of the job stored in st.session_state[state_key]"""
+    job_id = st.session_state.get(state_key)
+    if job_id is None:
+        return
+    
+    runner = get_job_runner()
+    job = runner.get_job(job_id)
+    if job is None:
+        del st.session_state[state_key]
+        return
+    
+    if job['status'] in ('pending', 'running'):
+        progress = job['progress'] / job['total'] if job['total'] else 0.0
+        st.progress(progress, text=f"{job['status'].capitalize()}: {job['message'] or ''}")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.button("Refresh Status", key=f"{state_key}_refresh")
+        with col2:
+            if st.button("Cancel Job", key=f"{state_key}_cancel"):
+                runner.cancel(job_id)
+                st.rerun()
+    elif job['status'] == 'completed':
+        render_result(runner.get_result(job_id))
+    elif job['status'] == 'failed':
+        st.error(f"Job failed: {job['error']}")
+    else:
+        st.warning("Job cancelled")
+
 def forecasting():
     st.header("Forecasting Models")
     
-    if 'df' not in st.session_state:
+    df = get_data()
+    if df is None:
         st.warning("Please load data first from the Data Overview page")
         return
     
-    df = st.session_state.df
-    
     # Model selection
     model_type = st.selectbox("Select Model", ["Prophet", "Random Forest", "XGBoost"])
     
     if st.button("Train Models"):
-        with st.spinner("Training models..."):
-            if model_type == "Prophet":
-                ts_model = TimeSeriesModel(config)
-                models = ts_model.train_all_models(df)
-                st.success("Prophet models trained successfully!")
-                
-            # Add other model types...
+        if model_type == "Prophet":
+            # El entrenamiento corre en segundo plano; la página sólo consulta su estado
+            st.session_state.forecast_job = get_job_runner().submit('forecasting', train_prophet_job, df)
+            
+        # Add other model types...
+    
+    def render(result):
+        st.success(f"Prophet models trained successfully! ({len(result['models'])} models)")
+    
+    show_job('forecast_job', render)
 
 def market_segmentation():
     st.header("Market Segmentation")
     
-    if 'df' not in st.session_state:
+    df = get_data()
+    if df is None:
         st.warning("Please load data first from the Data Overview page")
         return
     
-    df = st.session_state.df
-    segmenter = MarketSegmentation(config)
+    mode = st.selectbox("Clustering Mode", ["K-Means", "MiniBatch K-Means (auto k)"])
     
     if st.button("Analyze Markets"):
-        with st.spinner("Performing segmentation..."):
-            clustered_data = segmenter.prepare_clustering_data(df)
-            clusters, model = segmenter.perform_kmeans_clustering(clustered_data)
-            
-            st.plotly_chart(
-                segmenter.visualize_clusters(clustered_data, clusters),
-                use_container_width=True
-            )
-            
-            growth_markets = segmenter.identify_growth_markets(clustered_data, clusters)
-            st.dataframe(growth_markets)
+        st.session_state.segmentation_job = get_job_runner().submit('segmentation', segmentation_job, df, mode)
+    
+    def render(result):
+        if result['diagnostics'] is not None:
+            st.subheader("Cluster Selection Diagnostics")
+            st.dataframe(result['diagnostics'])
+        
+        st.plotly_chart(result['figure'], use_container_width=True)
+        st.dataframe(result['growth_markets'])
+    
+    show_job('segmentation_job', render)
 
 def ai_assistant():
     st.header("AI Analytics Assistant")
     
-    if 'df' not in st.session_state:
+    df = get_data()
+    if df is None:
         st.warning("Please load data first from the Data Overview page")
         return
     
     # Initialize chatbot
     if 'chatbot' not in st.session_state:
+        from generative_ai_chatbot import CoffeeAnalyticsChatbot
         analytics_data = {
-            "total_records": len(st.session_state.df),
-            "countries": st.session_state.df[config['preprocessing']['country_column']].unique().tolist(),
-            "coffee_types": st.session_state.df[config['preprocessing']['coffee_type_column']].unique().tolist(),
-            "time_range": f"{st.session_state.df[config['preprocessing']['date_column']].min()} to {st.session_state.df[config['preprocessing']['date_column']].max()}"
+            "total_records": len(df),
+            "countries": df[config['preprocessing']['country_column']].unique().tolist(),
+            "coffee_types": df[config['preprocessing']['coffee_type_column']].unique().tolist(),
+            "time_range": f"{df[config['preprocessing']['date_column']].min()} to {df[config['preprocessing']['date_column']].max()}"
         }
         
         st.session_state.chatbot = CoffeeAnalyticsChatbot(config, analytics_data)
@@ -161,4 +247,5 @@ def ai_assistant():
         st.session_state.messages.append({"role": "assistant", "content": response})
 
 if __name__ == "__main__":
+    start_metrics()
     main()
\ No newline at end of file
@@ -1,29 +1,42 @@
-from sklearn.cluster import KMeans, DBSCAN
+from sklearn.cluster import KMeans, MiniBatchKMeans, DBSCAN
 from sklearn.preprocessing import StandardScaler
 from sklearn.decomposition import PCA
-import umap
+from sklearn.metrics import silhouette_score
+from scipy.optimize import linear_sum_assignment
+from scipy.spatial.distance import cdist
+from joblib import Parallel, delayed
+import joblib
 import pandas as pd
 import numpy as np
 import plotly.express as px
+import hashlib
+import os
+from series_statistics import SeriesStatistics
 
 class MarketSegmentation:
     def __init__(self, config):
         self.config = config
         self.scaler = StandardScaler()
+        # Escalado y embeddings ya calculados, indexados por huella de los datos
+        self._scaler_key = None
+        self._scaled_data = None
+        self.embedding_cache = {}
+        self.cache_dir = config['segmentation'].get('cache_dir')
+        # Modelo persistido para asignación incremental de segmentos
+        self.segment_model = None
         
     def prepare_clustering_data(self, df):
         """Prepare data for clustering analysis"""
-        # Aggregate data by country and coffee type
-        aggregated = df.groupby([
-            self.config['preprocessing']['country_column'],
-            self.config['preprocessing']['coffee_type_column']
-        ]).agg({
-            self.config['preprocessing']['consumption_column']: ['mean', 'std', 'sum'],
-            'year': 'count'
-        }).reset_index()
+        # Aggregate data by country and coffee type (single grouped pass)
+        consumption_col = self.config['preprocessing']['consumption_column']
+        stats = SeriesStatistics(self.config).compute(df)
         
-        # Flatten column names
-        aggregated.columns = ['_'.join(col).strip('_') for col in aggregated.columns]
+        aggregated = stats[['mean', 'std', 'sum', 'count']].rename(columns={
+            'mean': f'{consumption_col}_mean',
+            'std': f'{consumption_col}_std',
+            'sum': f'{consumption_col}_sum',
+            'count': 'year_count'
+        }).reset_index()
         
         return aggregated
     
@@ -33,7 +46,7 @@ class MarketSegmentation:
             n_clusters = self.config['segmentation']['n_clusters']
         
         # Scale data
-        scaled_data = self.scaler.fit_transform(data)
+        scaled_data = self._fit_scaler(data)
         
         # Apply K-Means
         kmeans = KMeans(n_clusters=n_clusters, random_state=42)
@@ -41,24 +54,335 @@ class MarketSegmentation:
         
         return clusters, kmeans
     
+    def _feature_matrix(self, data):
+        """Return the numeric feature matrix used for clustering"""
+        if isinstance(data, pd.DataFrame):
+            data = data.select_dtypes(include=[np.number]).drop(columns=['cluster'], errors='ignore')
+        return np.asarray(data, dtype=float)
+    
+    def _fingerprint(self, features):
+        """Hash of the feature matrix used as cache key"""
+        features = np.ascontiguousarray(features)
+        digest = hashlib.sha1(str(features.shape).encode())
+        digest.update(features.tobytes())
+        return digest.hexdigest()
+    
+    def _fit_scaler(self, data):
+        """Scale data, reusing the fitted scaler when the input has not changed"""
+        features = self._feature_matrix(data)
+        key = self._fingerprint(features)
+        if key != self._scaler_key:
+            self.scaler = StandardScaler()
+            self._scaled_data = self.scaler.fit_transform(features)
+            self._scaler_key = key
+        return self._scaled_data
+    
+    def _embedding_path(self, key):
+        return os.path.join(self.cache_dir, f"embedding_{key}.joblib")
+    
+    def get_embedding(self, data, reduction_method='pca', **params):
+        """Return a cached 2-D embedding of data, fitting the reducer only on a cache miss
+        
+        Entries are keyed on the data hash, the reduction method and its parameters,
+        kept in memory and persisted under segmentation.cache_dir.
+        """
+        features = self._feature_matrix(data)
+        data_key = self._fingerprint(features)
+        param_key = ','.join(f"{name}={params[name]}" for name in sorted(params))
+        key = hashlib.sha1(f"{data_key}|{reduction_method}|{param_key}".encode()).hexdigest()
+        
+        entry = self.embedding_cache.get(key)
+        if entry is None and self.cache_dir and os.path.exists(self._embedding_path(key)):
+            entry = joblib.load(self._embedding_path(key))
+            self.embedding_cache[key] = entry
+        
+        if entry is None:
+            scaled_data = self._fit_scaler(features)
+            if reduction_method == 'pca':
+                reducer = PCA(n_components=2, **params)
+            elif reduction_method == 'umap':
+                # umap (numba) tarda varios segundos en importarse: sólo bajo demanda
+                import umap
+                reducer = umap.UMAP(random_state=42, **params)
+            else:
+                raise ValueError(f"Unknown reduction method: {reduction_method}")
+            
+            entry = {
+                'scaler': self.scaler,
+                'reducer': reducer,
+                'embedding': reducer.fit_transform(scaled_data)
+            }
+            self.embedding_cache[key] = entry
+            
+            if self.cache_dir:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                # Escritura atómica para que otro proceso nunca lea un archivo a medias
+                tmp_path = f"{self._embedding_path(key)}.{os.getpid()}.tmp"
+                joblib.dump(entry, tmp_path)
+                os.replace(tmp_path, self._embedding_path(key))
+        
+        # El scaler ajustado acompaña al embedding y evita reajustarlo
+        if self._scaler_key != data_key:
+            self.scaler = entry['scaler']
+            self._scaled_data = self.scaler.transform(features)
+            self._scaler_key = data_key
+        
+        return entry['embedding']
+    
+    def _iter_chunks(self, data, batch_size):
+        """Yield consecutive row chunks of at most batch_size rows"""
+        for start in range(0, len(data), batch_size):
+            yield data[start:start + batch_size]
+    
+    def _evaluate_minibatch(self, scaled_data, sample, n_clusters, batch_size, n_epochs, random_state):
+        """Fit MiniBatchKMeans for one k by streaming chunks and score it"""
+        model = MiniBatchKMeans(
+            n_clusters=n_clusters,
+            batch_size=batch_size,
+            random_state=random_state,
+            n_init=3
+        )
+        # Los bloques se recorren en orden aleatorio: los datos suelen venir
+        # ordenados por país y bloques homogéneos sesgan los centroides
+        rng = np.random.RandomState(random_state)
+        for _ in range(n_epochs):
+            for chunk_idx in self._iter_chunks(rng.permutation(len(scaled_data)), batch_size):
+                chunk = scaled_data[chunk_idx]
+                # partial_fit necesita al menos k filas en el primer bloque
+                if len(chunk) >= n_clusters or hasattr(model, 'cluster_centers_'):
+                    model.partial_fit(chunk)
+        
+        # Inercia total acumulada por bloques (score devuelve la inercia negativa)
+        inertia = -sum(model.score(chunk) for chunk in self._iter_chunks(scaled_data, batch_size))
+        
+        sample_labels = model.predict(sample)
+        if len(np.unique(sample_labels)) > 1:
+            silhouette = silhouette_score(sample, sample_labels)
+        else:
+            silhouette = np.nan
+        
+        return model, {'n_clusters': n_clusters, 'inertia': inertia, 'silhouette': silhouette}
+    
+    def perform_minibatch_clustering(self, data, k_range=None, batch_size=None):
+        """Stream data through MiniBatchKMeans and select k over a range in parallel
+        
+        Returns the cluster labels, the chosen model and a diagnostics table with
+        inertia and sampled silhouette score per evaluated k.
+        """
+        params = self.config['segmentation']
+        if k_range is None:
+            k_range = range(params['k_range'][0], params['k_range'][1] + 1)
+        if batch_size is None:
+            batch_size = params['batch_size']
+        n_epochs = params.get('n_epochs', 5)
+        random_state = params.get('random_state', 42)
+        
+        features = self._feature_matrix(data)
+        k_range = [k for k in k_range if 1 < k < len(features)]
+        if not k_range:
+            raise ValueError("Not enough series to evaluate the requested k range")
+        batch_size = max(batch_size, max(k_range))
+        
+        # Escalado en streaming: el scaler se ajusta bloque a bloque
+        self.scaler = StandardScaler()
+        for chunk in self._iter_chunks(features, batch_size):
+            self.scaler.partial_fit(chunk)
+        scaled_data = np.vstack([
+            self.scaler.transform(chunk) for chunk in self._iter_chunks(features, batch_size)
+        ])
+        self._scaler_key = self._fingerprint(features)
+        self._scaled_data = scaled_data
+        
+        # Muestra fija para la silueta, compartida por todos los k
+        sample_size = min(params.get('silhouette_sample_size', 10000), len(scaled_data))
+        rng = np.random.RandomState(random_state)
+        sample = scaled_data[rng.choice(len(scaled_data), sample_size, replace=False)]
+        
+        results = Parallel(n_jobs=params.get('n_jobs', -1), prefer='threads')(
+            delayed(self._evaluate_minibatch)(scaled_data, sample, k, batch_size, n_epochs, random_state)
+            for k in k_range
+        )
+        
+        diagnostics = pd.DataFrame([scores for _, scores in results])
+        # Se elige el k con mejor silueta; ante empate se queda el menor k
+        best = diagnostics['silhouette'].fillna(-1).idxmax()
+        diagnostics['selected'] = diagnostics.index == best
+        model = results[best][0]
+        
+        clusters = np.concatenate([
+            model.predict(chunk) for chunk in self._iter_chunks(scaled_data, batch_size)
+        ])
+        
+        return clusters, model, diagnostics
+    
     def perform_umap_clustering(self, data, n_neighbors=15, min_dist=0.1):
         """Perform UMAP for dimensionality reduction and clustering"""
-        scaled_data = self.scaler.fit_transform(data)
+        return self.get_embedding(data, 'umap', n_neighbors=n_neighbors, min_dist=min_dist)
+    
+    def _series_keys(self):
+        return [
+            self.config['preprocessing']['country_column'],
+            self.config['preprocessing']['coffee_type_column']
+        ]
+    
+    def _stable_labels(self, centroids, scaler, previous):
+        """Map new centroid indices to persisted segment labels
+        
+        New centroids (scaled) are matched to the previous ones (Hungarian
+        assignment on centroid distance in the current scaled space) and inherit
+        their labels; unmatched centroids get labels above every previous one.
+        Without a previous model, segments are numbered by ascending mean
+        consumption.
+        """
+        if previous is None:
+            return np.argsort(np.argsort(centroids[:, 0]))
+        
+        # Centroides previos llevados a la escala actual: en unidades originales
+        # la columna de suma domina la distancia
+        previous_centroids = scaler.transform(previous['centroids_original'])
+        labels = np.full(len(centroids), -1)
+        new_idx, old_idx = linear_sum_assignment(cdist(centroids, previous_centroids))
+        labels[new_idx] = previous['segment_labels'][old_idx]
+        next_label = int(previous['segment_labels'].max()) + 1
+        for idx in np.where(labels < 0)[0]:
+            labels[idx] = next_label
+            next_label += 1
+        return labels
+    
+    def _scale_segment_features(self, aggregated, model):
+        """Scale features with the persisted scaler (missing stats map to the mean)"""
+        features = aggregated[model['feature_columns']].to_numpy(dtype=float)
+        return np.nan_to_num(model['scaler'].transform(features))
+    
+    def fit_segment_model(self, df, n_clusters=None):
+        """Fit and persist the segmentation model used by assign_segments
+        
+        Labels stay stable across refits by matching against the previously
+        persisted centroids.
+        """
+        if n_clusters is None:
+            n_clusters = self.config['segmentation']['n_clusters']
+        previous = self.segment_model or self.load_segment_model()
+        
+        aggregated = self.prepare_clustering_data(df)
+        feature_columns = [
+            col for col in aggregated.select_dtypes(include=[np.number]).columns if col != 'cluster'
+        ]
+        scaler = StandardScaler().fit(aggregated[feature_columns].to_numpy(dtype=float))
+        model = {'feature_columns': feature_columns, 'scaler': scaler}
+        scaled_data = self._scale_segment_features(aggregated, model)
+        
+        kmeans = KMeans(n_clusters=n_clusters, random_state=42).fit(scaled_data)
+        centroids_original = scaler.inverse_transform(kmeans.cluster_centers_)
+        if previous is not None and previous['feature_columns'] != feature_columns:
+            previous = None
+        labels = self._stable_labels(kmeans.cluster_centers_, scaler, previous)
+        
+        # Centroides reordenados para que la fila i corresponda al segmento i
+        order = np.argsort(labels)
+        model['segment_labels'] = labels[order]
+        model['centroids'] = kmeans.cluster_centers_[order]
+        model['centroids_original'] = centroids_original[order]
+        
+        distances = cdist(scaled_data, model['centroids'])
+        nearest = distances.argmin(axis=1)
+        nearest_distance = distances[np.arange(len(distances)), nearest]
+        # Umbral de distancia para la detección de deriva
+        model['distance_threshold'] = np.quantile(
+            nearest_distance, self.config['segmentation'].get('drift_quantile', 0.95)
+        )
         
-        # Apply UMAP
-        reducer = umap.UMAP(n_neighbors=n_neighbors, min_dist=min_dist, random_state=42)
-        embedding = reducer.fit_transform(scaled_data)
+        assignments = aggregated[self._series_keys()].copy()
+        assignments['segment'] = model['segment_labels'][nearest]
+        assignments['distance'] = nearest_distance
+        model['assignments'] = assignments
         
-        return embedding
+        self.segment_model = model
+        self.save_segment_model()
+        return assignments
+    
+    def save_segment_model(self, path=None):
+        """Persist the segmentation model (scaler, centroids, labels, assignments)"""
+        path = path or self.config['segmentation']['model_path']
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        joblib.dump(self.segment_model, tmp_path)
+        os.replace(tmp_path, path)
+    
+    def load_segment_model(self, path=None):
+        """Load the persisted segmentation model if available"""
+        path = path or self.config['segmentation']['model_path']
+        if os.path.exists(path):
+            self.segment_model = joblib.load(path)
+        return self.segment_model
+    
+    def assign_segments(self, df):
+        """Assign new or updated series to the existing segments
+        
+        Only the series present in df are aggregated and scored, so the cost
+        grows with the number of updated series, not with the catalogue.
+        """
+        model = self.segment_model or self.load_segment_model()
+        if model is None:
+            raise ValueError("No segmentation model available; call fit_segment_model first")
+        
+        aggregated = self.prepare_clustering_data(df)
+        distances = cdist(self._scale_segment_features(aggregated, model), model['centroids'])
+        nearest = distances.argmin(axis=1)
+        
+        assignments = aggregated[self._series_keys()].copy()
+        assignments['segment'] = model['segment_labels'][nearest]
+        assignments['distance'] = distances[np.arange(len(distances)), nearest]
+        assignments['is_outlier'] = assignments['distance'] > model['distance_threshold']
+        
+        # Reemplazar las asignaciones previas de las series actualizadas
+        keys = self._series_keys()
+        stored = model['assignments'].set_index(keys)
+        updated = assignments.set_index(keys)[['segment', 'distance']]
+        stored = pd.concat([stored[~stored.index.isin(updated.index)], updated])
+        model['assignments'] = stored.reset_index()
+        
+        return assignments
+    
+    def check_drift(self, assignments):
+        """Return True when too many assigned series fall outside the fitted segments"""
+        if len(assignments) == 0:
+            return False
+        outlier_rate = assignments['is_outlier'].mean()
+        return outlier_rate > self.config['segmentation'].get('drift_tolerance', 0.2)
+    
+    def update_segments(self, updated_df, full_df=None):
+        """Assign updated series incrementally, refitting only when drift is detected
+        
+        Returns the assignments for the updated series and whether a full refit ran.
+        """
+        if (self.segment_model or self.load_segment_model()) is None:
+            if full_df is None:
+                raise ValueError("No segmentation model available; full data is required for the first fit")
+            self.fit_segment_model(full_df)
+        
+        assignments = self.assign_segments(updated_df)
+        refitted = False
+        
+        if self.check_drift(assignments) and full_df is not None:
+            self.fit_segment_model(full_df)
+            keys = self._series_keys()
+            assignments = assignments[keys].merge(self.segment_model['assignments'], on=keys, how='left')
+            refitted = True
+        else:
+            self.save_segment_model()
+        
+        return assignments, refitted
     
     def analyze_clusters(self, df, clusters):
         """Analyze cluster characteristics"""
+        consumption_col = self.config['preprocessing']['consumption_column']
         df['cluster'] = clusters
         
         cluster_analysis = df.groupby('cluster').agg({
-            'consumption_mean': ['mean', 'std'],
-            'consumption_std': 'mean',
-            'consumption_sum': 'mean',
+            f'{consumption_col}_mean': ['mean', 'std'],
+            f'{consumption_col}_std': 'mean',
+            f'{consumption_col}_sum': 'mean',
             'year_count': 'mean'
         }).round(2)
         
@@ -66,22 +390,16 @@ class MarketSegmentation:
     
     def visualize_clusters(self, df, clusters, reduction_method='pca'):
         """Visualize clusters using dimensionality reduction"""
-        scaled_data = self.scaler.fit_transform(df)
-        
-        if reduction_method == 'pca':
-            reducer = PCA(n_components=2)
-            reduced_data = reducer.fit_transform(scaled_data)
-        elif reduction_method == 'umap':
-            reducer = umap.UMAP(random_state=42)
-            reduced_data = reducer.fit_transform(scaled_data)
+        reduced_data = self.get_embedding(df, reduction_method)
         
         # Create visualization
         viz_df = pd.DataFrame({
             'x': reduced_data[:, 0],
             'y': reduced_data[:, 1],
             'cluster': clusters,
-            'country': df.index.get_level_values(0),
-            'coffee_type': df.index.get_level_values(1)
+            # prepare_clustering_data devuelve país y tipo como columnas
+            'country': df[self.config['preprocessing']['country_column']].to_numpy(),
+            'coffee_type': df[self.config['preprocessing']['coffee_type_column']].to_numpy()
         })
         
         fig = px.scatter(
@@ -94,17 +412,18 @@ class MarketSegmentation:
     
     def identify_growth_markets(self, df, clusters):
         """Identify high-growth potential markets"""
+        consumption_col = self.config['preprocessing']['consumption_column']
         df['cluster'] = clusters
         
         # Calculate growth metrics (simplified)
         growth_metrics = df.groupby('cluster').agg({
-            'consumption_mean': 'mean',
-            'consumption_std': 'mean'
+            f'{consumption_col}_mean': 'mean',
+            f'{consumption_col}_std': 'mean'
         })
         
         # Identify clusters with high mean and low volatility (stable growth)
         growth_metrics['growth_score'] = (
-            growth_metrics['consumption_mean'] / growth_metrics['consumption_std']
+            growth_metrics[f'{consumption_col}_mean'] / growth_metrics[f'{consumption_col}_std']
         )
         
         return growth_metrics.sort_values('growth_score', ascending=False)
\ No newline at end of file
@@ -0,0 +1,352 @@
+# src/metrics.py
+import os
+import json
+import time
+import bisect
+import logging
+import functools
+import threading
+from contextlib import ContextDecorator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Límites (segundos) de los histogramas de latencia
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Catálogo de métricas de la aplicación: nombre -> (tipo, descripción)
+CATALOG = {
+    'page_render_seconds': ('histogram', "Time to render a page (one Streamlit rerun)"),
+    'data_load_seconds': ('histogram', "Time to load the shared dataset"),
+    'cache_requests_total': ('counter', "Cache lookups by cache and result (hit/miss)"),
+    'cache_lookup_seconds': ('histogram', "Cache lookup time, including the build on a miss"),
+    'filter_query_seconds': ('histogram', "Filter and cube selection query time"),
+    'model_inference_seconds': ('histogram', "Model prediction time"),
+    'chatbot_requests_total': ('counter', "Chatbot questions by answer source"),
+    'chatbot_response_seconds': ('histogram', "Time to answer a chatbot question"),
+    'llm_first_token_seconds': ('histogram', "Time until the first streamed LLM token"),
+    'llm_errors_total': ('counter', "Failed LLM requests"),
+    'llm_retries_total': ('counter', "LLM requests retried before the first token"),
+    'pipeline_stage_seconds': ('histogram', "Batch pipeline stage duration")
+}
+
+class _Counter:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+class _Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q, counts, count):
+        """Quantile estimated by linear interpolation inside its bucket (as Prometheus does)"""
+        if count == 0:
+            return None
+        rank = q * count
+        cumulative = 0
+        for index, bucket_count in enumerate(counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+class Metric:
+    """A named metric with one child per label set"""
+
+    def __init__(self, name, kind, help_text='', buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        key = tuple(sorted(labels.items()))
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = _Counter() if self.kind == 'counter' else _Histogram(self.buckets)
+                    self._children[key] = child
+        return child
+
+    def samples(self):
+        with self._lock:
+            return list(self._children.items())
+
+class MetricsRegistry:
+    """Thread-safe counters and latency histograms, exportable as Prometheus text or JSON"""
+
+    def __init__(self, catalog=None):
+        self.catalog = CATALOG if catalog is None else catalog
+        self.enabled = True
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def metric(self, name, kind=None):
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(name)
+                if metric is None:
+                    catalog_kind, help_text = self.catalog.get(name, (kind, ''))
+                    metric = Metric(name, catalog_kind, help_text)
+                    self._metrics[name] = metric
+        if kind is not None and metric.kind != kind:
+            raise ValueError(f"La métrica {name} es de tipo {metric.kind}, no {kind}")
+        return metric
+
+    def inc(self, name, amount=1, **labels):
+        if self.enabled:
+            self.metric(name, 'counter').labels(**labels).inc(amount)
+
+    def observe(self, name, value, **labels):
+        if self.enabled:
+            self.metric(name, 'histogram').labels(**labels).observe(value)
+
+    def timed(self, name, **labels):
+        """Context manager / decorator observing the elapsed seconds into histogram name"""
+        return _Timer(self, name, labels)
+
+    def _sorted_metrics(self):
+        with self._lock:
+            return sorted(self._metrics.items())
+
+    def reset(self):
+        with self._lock:
+            self._metrics = {}
+
+    def prometheus_text(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for name, metric in self._sorted_metrics():
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for key, child in metric.samples():
+                if metric.kind == 'counter':
+                    lines.append(f"{name}{_format_labels(key)} {_format_value(child.value)}")
+                    continue
+                with child._lock:
+                    counts, total, count = list(child.counts), child.sum, child.count
+                cumulative = 0
+                for bound, bucket_count in zip(metric.buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    le = (('le', _format_value(bound)),)
+                    lines.append(f"{name}_bucket{_format_labels(key + le)} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(key)} {_format_value(total)}")
+                lines.append(f"{name}_count{_format_labels(key)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """JSON-serializable view: counter values and histogram count/sum/mean/p50/p95/p99"""
+        metrics = {}
+        for name, metric in self._sorted_metrics():
+            series = []
+            for key, child in metric.samples():
+                entry = {'labels': dict(key)}
+                if metric.kind == 'counter':
+                    entry['value'] = child.value
+                else:
+                    with child._lock:
+                        counts, total, count = list(child.counts), child.sum, child.count
+                    entry.update({
+                        'count': count,
+                        'sum': total,
+                        'mean': total / count if count else None,
+                        'p50': child.quantile(0.5, counts, count),
+                        'p95': child.quantile(0.95, counts, count),
+                        'p99': child.quantile(0.99, counts, count)
+                    })
+                series.append(entry)
+            metrics[name] = {'type': metric.kind, 'help': metric.help, 'series': series}
+        return {'timestamp': time.time(), 'pid': os.getpid(), 'metrics': metrics}
+
+    def write_snapshot(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump(self.snapshot(), file, indent=2)
+        os.replace(tmp_path, path)
+
+class _Timer(ContextDecorator):
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def _recreate_cm(self):
+        # Como decorador, cada llamada (concurrente o recursiva) usa su propio timer
+        return _Timer(self.registry, self.name, self.labels)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+def _format_labels(key):
+    if not key:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in key
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+# Registro del proceso, compartido por todas las sesiones y módulos
+REGISTRY = MetricsRegistry()
+
+def inc(name, amount=1, **labels):
+    REGISTRY.inc(name, amount, **labels)
+
+def observe(name, value, **labels):
+    REGISTRY.observe(name, value, **labels)
+
+def timed(name, **labels):
+    return REGISTRY.timed(name, **labels)
+
+_cache_state = threading.local()
+
+def cached(name, cache_decorator):
+    """Wrap a function with a cache decorator (e.g. st.cache_resource), counting hits and misses
+
+    The undecorated function only runs on a miss, so it flags the miss for the
+    lookup that triggered it.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def build(*args, **kwargs):
+            _cache_state.miss = True
+            return func(*args, **kwargs)
+
+        cached_func = cache_decorator(build)
+
+        @functools.wraps(func)
+        def lookup(*args, **kwargs):
+            outer = getattr(_cache_state, 'miss', False)
+            _cache_state.miss = False
+            start = time.perf_counter()
+            try:
+                return cached_func(*args, **kwargs)
+            finally:
+                result = 'miss' if _cache_state.miss else 'hit'
+                _cache_state.miss = outer
+                REGISTRY.observe('cache_lookup_seconds', time.perf_counter() - start, cache=name)
+                REGISTRY.inc('cache_requests_total', cache=name, result=result)
+
+        lookup.clear = getattr(cached_func, 'clear', None)
+        return lookup
+    return decorator
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/metrics':
+            body = self.registry.prometheus_text().encode()
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        elif path == '/metrics.json':
+            body = json.dumps(self.registry.snapshot()).encode()
+            content_type = 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Los scrapes periódicos no se escriben en stderr
+        pass
+
+class MetricsExporter:
+    """Local /metrics (Prometheus) and /metrics.json endpoint plus periodic JSON snapshots"""
+
+    def __init__(self, config, registry=None):
+        self.config = config
+        self.params = config['metrics']
+        self.registry = registry or REGISTRY
+        self.server = None
+        self.snapshot_path = None
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self.registry.enabled = self.params['enabled']
+        if not self.params['enabled']:
+            return self
+
+        if self.params['port'] is not None:
+            handler = type('MetricsHandler', (_MetricsHandler,), {'registry': self.registry})
+            try:
+                self.server = ThreadingHTTPServer((self.params['host'], self.params['port']), handler)
+                self.server.daemon_threads = True
+            except OSError as e:
+                # Otro proceso (p. ej. un segundo dashboard) ya usa el puerto
+                logger.warning(f"Metrics endpoint not started on port {self.params['port']}: {e}")
+            else:
+                self._start_thread(self.server.serve_forever, 'metrics-http')
+
+        if self.params['snapshot_path']:
+            self.snapshot_path = self.params['snapshot_path'].format(pid=os.getpid())
+            self._start_thread(self._snapshot_loop, 'metrics-snapshot')
+        return self
+
+    def _start_thread(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _snapshot_loop(self):
+        while not self._stop.wait(self.params['snapshot_interval_seconds']):
+            self.write_snapshot()
+
+    def write_snapshot(self):
+        if self.snapshot_path is None:
+            return
+        try:
+            self.registry.write_snapshot(self.snapshot_path)
+        except OSError as e:
+            logger.warning(f"Could not write metrics snapshot: {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        self.write_snapshot()
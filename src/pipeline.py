@@ -0,0 +1,287 @@
+# src/pipeline.py
+"""Batch refresh as a dependency graph of stages
+
+    python src/pipeline.py                      # todas las etapas
+    python src/pipeline.py --resume             # continuar una ejecución fallida
+    python src/pipeline.py --stages forecast ml # sólo algunas etapas
+
+The processed data is loaded once and shared in memory by every stage;
+stages whose dependencies are done run concurrently in a thread pool.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from shared_dataset import load_shared_dataset, has_shared_dataset, current_version
+from utils import load_config, setup_logging
+import metrics
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMPLETED = 'completed'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+def _path(relative):
+    return os.path.join(BASE_DIR, relative)
+
+def process_stage(context):
+    """Load the raw data, build the features and publish the shared dataset"""
+    from data_processing import CoffeeDataProcessor
+    processor = CoffeeDataProcessor(context['config'])
+    context['df'] = processor.process()
+    return {'rows': len(context['df']), 'columns': context['df'].shape[1]}
+
+def forecast_stage(context):
+    """Reconciled hierarchical forecasts (total, countries, coffee types, series)"""
+    from time_series_model import TimeSeriesModel
+    params = context['config']['pipeline']
+    reconciled, base = TimeSeriesModel(context['config']).forecast_hierarchy(
+        context['df'], params['forecast_periods'], method=params['forecast_method']
+    )
+    output_path = _path(params['forecast_path'])
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    frame = reconciled.copy()
+    frame.columns = [str(column) for column in frame.columns]
+    frame.reset_index().to_parquet(output_path, index=False)
+    return {'nodes': len(reconciled), 'periods': reconciled.shape[1]}
+
+def ml_stage(context):
+    """Train the tree models on a year split: train / calibration / test"""
+    from predictive_modeling import PredictiveModeling
+    config = context['config']
+    params = config['pipeline']
+    year_col = config['preprocessing']['date_column']
+    group_cols = [
+        config['preprocessing']['country_column'],
+        config['preprocessing']['coffee_type_column']
+    ]
+
+    modeling = PredictiveModeling(config)
+    X, y, _ = modeling.prepare_ml_data(context['df'])
+    # Las primeras filas de cada serie no tienen lags completos
+    valid = X.notna().all(axis=1) & y.notna()
+    X, y = X[valid], y[valid]
+    groups = context['df'].loc[X.index, group_cols]
+    years = context['df'].loc[X.index, year_col]
+
+    last_year = years.max()
+    test = years > last_year - params['test_years']
+    cal = ~test & (years > last_year - params['test_years'] - params['calibration_years'])
+    train = ~test & ~cal
+
+    results = modeling.train_models(
+        X[train], y[train], X[test], y[test],
+        X_cal=X[cal], y_cal=y[cal], groups_cal=groups[cal], groups_test=groups[test]
+    )
+    ml_metrics = {
+        name: {
+            **{key: float(value) for key, value in result['metrics'].items()},
+            'cv_mae': float(result['cv_score'])
+        }
+        for name, result in results.items()
+    }
+    output_path = _path(params['ml_metrics_path'])
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, 'w') as file:
+        json.dump(ml_metrics, file, indent=2)
+    return {'train_rows': int(train.sum()), 'test_rows': int(test.sum())}
+
+def segmentation_stage(context):
+    """Refit the persisted segmentation model and save the segment of every series"""
+    from market_segmentation import MarketSegmentation
+    assignments = MarketSegmentation(context['config']).fit_segment_model(context['df'])
+    output_path = _path(context['config']['pipeline']['segments_path'])
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    assignments.to_parquet(output_path, index=False)
+    return {'series': len(assignments), 'segments': int(assignments['segment'].nunique())}
+
+def reports_stage(context):
+    """Presentation reports (only those whose data changed are rewritten)"""
+    from visualization import create_presentation_visualizations
+    config = context['config']
+    countries = context['df'][config['preprocessing']['country_column']].unique()
+    status = create_presentation_visualizations(
+        context['df'], _path(config['pipeline']['reports_dir']), countries=countries
+    )
+    return {
+        'written': sum(value == 'written' for value in status.values()),
+        'skipped': sum(value == 'skipped' for value in status.values())
+    }
+
+# Etapa -> (función, dependencias)
+STAGES = {
+    'process': (process_stage, ()),
+    'forecast': (forecast_stage, ('process',)),
+    'ml': (ml_stage, ('process',)),
+    'segmentation': (segmentation_stage, ('process',)),
+    'reports': (reports_stage, ('process',))
+}
+
+class Pipeline:
+    """Run the stages as a dependency graph, timing each one and persisting its status
+
+    The state file records, per stage, its status, duration, error and the
+    published dataset version it used. With resume=True completed stages are
+    skipped unless something they depend on runs again or the dataset changed.
+    """
+
+    def __init__(self, config, stages=None, state_path=None, max_workers=None):
+        self.config = config
+        self.params = config['pipeline']
+        self.stages = self._ordered(stages or list(STAGES))
+        self.state_path = state_path or _path(self.params['state_path'])
+        self.max_workers = max_workers or self.params['max_workers']
+        self.logger = setup_logging()
+        self._lock = threading.Lock()
+        self.state = {'stages': {}}
+
+    def _ordered(self, stages):
+        """Requested stages in graph order; dependencies left out read the published data"""
+        unknown = [stage for stage in stages if stage not in STAGES]
+        if unknown:
+            raise ValueError(f"Etapas desconocidas: {', '.join(unknown)}")
+        return [stage for stage in STAGES if stage in stages]
+
+    def load_state(self):
+        try:
+            with open(self.state_path) as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {'stages': {}}
+
+    def save_state(self):
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump(self.state, file, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def _shared_dir(self):
+        return _path(self.config['data']['shared_dir'])
+
+    def plan(self, resume=False):
+        """Stages to run: every requested stage, minus those already done when resuming"""
+        self.state = self.load_state()
+        version = current_version(self._shared_dir())
+        to_run = []
+        for stage in self.stages:
+            _, dependencies = STAGES[stage]
+            entry = self.state['stages'].get(stage, {})
+            done = resume and entry.get('status') == COMPLETED and entry.get('data_version') == version
+            if not done or any(dependency in to_run for dependency in dependencies):
+                to_run.append(stage)
+        return to_run
+
+    def _shared_data(self):
+        """The published processed dataset, loaded once for every stage"""
+        if not has_shared_dataset(self._shared_dir()):
+            raise FileNotFoundError(
+                "No hay dataset publicado; ejecute primero la etapa 'process'"
+            )
+        return load_shared_dataset(self._shared_dir())
+
+    def _record(self, stage, **fields):
+        with self._lock:
+            entry = self.state['stages'].setdefault(stage, {})
+            entry.update(fields)
+            entry['updated_at'] = datetime.now().isoformat(timespec='seconds')
+            self.save_state()
+
+    def _run_stage(self, stage, context):
+        func, _ = STAGES[stage]
+        self._record(stage, status='running', error=None)
+        print(f"[{stage}] started")
+        start = time.perf_counter()
+        try:
+            summary = func(context)
+        except Exception as e:
+            seconds = time.perf_counter() - start
+            self.logger.error(f"Stage {stage} failed: {traceback.format_exc()}")
+            self._record(stage, status=FAILED, seconds=round(seconds, 3), error=str(e))
+            print(f"[{stage}] FAILED after {seconds:.1f}s: {e}")
+            raise
+        seconds = time.perf_counter() - start
+        metrics.observe('pipeline_stage_seconds', seconds, stage=stage)
+        self._record(
+            stage, status=COMPLETED, seconds=round(seconds, 3), summary=summary,
+            data_version=current_version(self._shared_dir())
+        )
+        print(f"[{stage}] done in {seconds:.1f}s {summary}")
+        return summary
+
+    def run(self, resume=False):
+        """Run the plan; returns {stage: status}"""
+        to_run = self.plan(resume)
+        statuses = {stage: COMPLETED for stage in self.stages if stage not in to_run}
+        for stage in statuses:
+            print(f"[{stage}] already completed, skipping")
+
+        context = {'config': self.config}
+        if 'process' not in to_run and to_run:
+            context['df'] = self._shared_data()
+
+        start = time.perf_counter()
+        pending = set(to_run)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='stage') as executor:
+            while pending or running:
+                for stage in [s for s in self.stages if s in pending]:
+                    dependencies = STAGES[stage][1]
+                    if any(statuses.get(d) in (FAILED, SKIPPED) for d in dependencies):
+                        # Una dependencia falló: la etapa no se ejecuta en esta corrida
+                        pending.discard(stage)
+                        statuses[stage] = SKIPPED
+                        self._record(stage, status=SKIPPED, error='dependency failed')
+                    elif all(statuses.get(d) == COMPLETED or d not in self.stages for d in dependencies):
+                        pending.discard(stage)
+                        running[executor.submit(self._run_stage, stage, context)] = stage
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage = running.pop(future)
+                    statuses[stage] = FAILED if future.exception() else COMPLETED
+
+        self.state['finished_at'] = datetime.now().isoformat(timespec='seconds')
+        self.state['last_run'] = {stage: statuses[stage] for stage in self.stages}
+        self.state['seconds'] = round(time.perf_counter() - start, 3)
+        self.save_state()
+        if self.config['metrics']['enabled']:
+            # Latencias de modelos y etapas de esta ejecución
+            metrics.REGISTRY.write_snapshot(_path(self.config['metrics']['pipeline_snapshot_path']))
+        self.print_summary(statuses)
+        return statuses
+
+    def print_summary(self, statuses):
+        print("\nStage            Status      Seconds")
+        for stage in self.stages:
+            seconds = self.state['stages'].get(stage, {}).get('seconds')
+            seconds = f"{seconds:8.1f}" if seconds is not None and statuses[stage] != SKIPPED else "       -"
+            print(f"{stage:<16} {statuses[stage]:<10} {seconds}")
+        print(f"Total wall time: {self.state['seconds']:.1f}s")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="High Garden Coffee - batch refresh")
+    parser.add_argument('--config', default=_path('config/parameters.yaml'))
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES),
+                        help="Etapas a ejecutar (por defecto todas)")
+    parser.add_argument('--resume', action='store_true',
+                        help="Omitir las etapas completadas en la última ejecución")
+    parser.add_argument('--max-workers', type=int, default=None)
+    parser.add_argument('--state-file', default=None)
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    pipeline = Pipeline(config, args.stages, args.state_file, args.max_workers)
+    statuses = pipeline.run(resume=args.resume)
+    return 1 if any(status in (FAILED, SKIPPED) for status in statuses.values()) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,7 +4,9 @@ from sklearn.metrics import mean_absolute_error, mean_squared_error
 from xgboost import XGBRegressor
 from lightgbm import LGBMRegressor
 import numpy as np
+import pandas as pd
 import mlflow
+from metrics import timed
 
 class PredictiveModeling:
     def __init__(self, config):
@@ -63,7 +65,8 @@ class PredictiveModeling:
     
     def evaluate_model(self, model, X_test, y_test):
         """Evaluate model performance"""
-        y_pred = model.predict(X_test)
+        with timed('model_inference_seconds', model=type(model).__name__):
+            y_pred = model.predict(X_test)
         
         mae = mean_absolute_error(y_test, y_pred)
         mse = mean_squared_error(y_test, y_pred)
@@ -79,6 +82,90 @@ class PredictiveModeling:
         
         return metrics, y_pred
     
+    def tree_quantile_intervals(self, model, X, alpha=None):
+        """Prediction interval from the quantiles of the individual trees of a RandomForest
+        
+        Every tree predicts the whole matrix at once; the (n_trees, n_rows) stack
+        is reduced with one np.quantile call. These bands reflect model spread
+        only and tend to under-cover; prefer conformal intervals when a
+        calibration set is available.
+        """
+        alpha = self.config['prediction_intervals']['alpha'] if alpha is None else alpha
+        X_array = np.asarray(X, dtype=np.float32)
+        with timed('model_inference_seconds', model=f"{type(model).__name__}_per_tree"):
+            per_tree = np.stack([tree.predict(X_array, check_input=False) for tree in model.estimators_])
+        lower, upper = np.quantile(per_tree, [alpha / 2, 1 - alpha / 2], axis=0)
+        return lower, upper
+    
+    def _group_labels(self, groups):
+        if isinstance(groups, pd.DataFrame):
+            return pd.MultiIndex.from_frame(groups)
+        return pd.Index(groups)
+    
+    def conformal_quantiles(self, residuals, groups=None, alpha=None):
+        """Split-conformal quantile of |residual| per group, plus the global quantile
+        
+        The per-group order statistic ceil((n_g + 1)(1 - alpha)) is taken from one
+        lexsort over (group, residual); groups with fewer than min_group_size
+        calibration rows use the global quantile. Returns (group_labels, q_group, q_global).
+        """
+        params = self.config['prediction_intervals']
+        alpha = params['alpha'] if alpha is None else alpha
+        scores = np.abs(np.asarray(residuals, dtype=float))
+        
+        def order_statistic(sorted_scores, counts, starts):
+            rank = np.ceil((counts + 1) * (1 - alpha)).astype(int) - 1
+            # Con muy pocas filas el cuantil exacto no existe: se usa el máximo
+            return sorted_scores[starts + np.clip(rank, 0, counts - 1)]
+        
+        q_global = order_statistic(np.sort(scores), np.array([len(scores)]), np.array([0]))[0]
+        if groups is None:
+            return None, np.array([]), q_global
+        
+        codes, labels = pd.factorize(self._group_labels(groups))
+        order = np.lexsort((scores, codes))
+        counts = np.bincount(codes, minlength=len(labels))
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        q_group = order_statistic(scores[order], counts, starts)
+        q_group = np.where(counts >= params['min_group_size'], q_group, q_global)
+        return labels, q_group, q_global
+    
+    def conformal_intervals(self, model, X_cal, y_cal, X, groups_cal=None, groups=None, alpha=None):
+        """Split-conformal prediction interval: prediction +/- calibrated |residual| quantile of its group"""
+        y_pred = model.predict(X)
+        residuals = np.asarray(y_cal, dtype=float) - model.predict(X_cal)
+        labels, q_group, q_global = self.conformal_quantiles(residuals, groups_cal, alpha)
+        
+        if labels is None or groups is None:
+            width = np.full(len(y_pred), q_global)
+        else:
+            positions = pd.Index(labels).get_indexer(self._group_labels(groups))
+            # Grupos sin calibración usan el cuantil global
+            width = np.where(positions >= 0, q_group[np.maximum(positions, 0)], q_global)
+        return y_pred - width, y_pred + width
+    
+    def interval_metrics(self, y_true, lower, upper, alpha=None):
+        """Empirical coverage, mean width and interval (Winkler) score"""
+        alpha = self.config['prediction_intervals']['alpha'] if alpha is None else alpha
+        y_true = np.asarray(y_true, dtype=float)
+        below = np.maximum(lower - y_true, 0)
+        above = np.maximum(y_true - upper, 0)
+        return {
+            'interval_coverage': float(np.mean((y_true >= lower) & (y_true <= upper))),
+            'interval_width': float(np.mean(upper - lower)),
+            'interval_score': float(np.mean((upper - lower) + 2 / alpha * (below + above)))
+        }
+    
+    def prediction_intervals(self, model, X_test, X_cal=None, y_cal=None, groups_cal=None, groups_test=None):
+        """Intervals for any model: split-conformal when a calibration set is given,
+        otherwise per-tree quantiles for RandomForest; (None, None) if neither applies
+        """
+        if X_cal is not None and y_cal is not None:
+            return self.conformal_intervals(model, X_cal, y_cal, X_test, groups_cal, groups_test)
+        if isinstance(model, RandomForestRegressor):
+            return self.tree_quantile_intervals(model, X_test)
+        return None, None
+    
     def cross_validate(self, model, X, y):
         """Perform time series cross-validation"""
         tscv = TimeSeriesSplit(n_splits=self.config['training']['cv_folds'])
@@ -89,8 +176,15 @@ class PredictiveModeling:
         )
         return -scores.mean()
     
-    def train_models(self, X_train, y_train, X_test, y_test):
-        """Train and compare multiple models"""
+    def train_models(self, X_train, y_train, X_test, y_test,
+                     X_cal=None, y_cal=None, groups_cal=None, groups_test=None):
+        """Train and compare multiple models
+        
+        With a calibration set (held out from training) every model gets
+        split-conformal intervals, per group when groups_cal/groups_test (e.g. the
+        country and coffee_type columns) are given; without one, only the
+        RandomForest gets intervals, from its per-tree quantiles.
+        """
         models = {
             'random_forest': self.train_random_forest(X_train, y_train),
             'xgboost': self.train_xgboost(X_train, y_train)
@@ -104,6 +198,11 @@ class PredictiveModeling:
                 
                 # Test evaluation
                 metrics, y_pred = self.evaluate_model(model, X_test, y_test)
+                lower, upper = self.prediction_intervals(
+                    model, X_test, X_cal, y_cal, groups_cal, groups_test
+                )
+                if lower is not None:
+                    metrics.update(self.interval_metrics(y_test, lower, upper))
                 
                 # Log metrics
                 mlflow.log_metrics(metrics)
@@ -122,7 +221,9 @@ class PredictiveModeling:
                     'model': model,
                     'metrics': metrics,
                     'cv_score': cv_score,
-                    'predictions': y_pred
+                    'predictions': y_pred,
+                    'lower': lower,
+                    'upper': upper
                 }
         
         return results
\ No newline at end of file
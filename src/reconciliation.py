@@ -0,0 +1,156 @@
+# src/reconciliation.py
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.linalg import spsolve
+
+# Etiqueta de los niveles agregados en el índice de nodos
+TOTAL = 'Total'
+METHODS = ('bottom_up', 'top_down', 'ols', 'wls_struct', 'wls_var')
+
+class HierarchyReconciler:
+    """Coherent forecasts for the total / country / coffee_type / (country, coffee_type) hierarchy
+
+    The hierarchy is a sparse summing matrix S (nodes x bottom series). Nodes
+    are indexed by (country, coffee_type) with TOTAL in the aggregated
+    dimension, ordered total, countries, coffee types, bottom series.
+
+    MinT-style methods use a diagonal W and the equivalent projection
+    y~ = y^ - W C' (C W C')^-1 C y^, where C = [I | -A] holds the aggregation
+    constraints; only a sparse (aggregates x aggregates) system is solved, so
+    the cost grows with the number of aggregate nodes, not bottom series squared.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.country_col = config['preprocessing']['country_column']
+        self.coffee_type_col = config['preprocessing']['coffee_type_column']
+        self.value_col = config['preprocessing']['consumption_column']
+
+        self.S = None
+        self.A = None
+        self.nodes = None
+        self.index = None
+        self.bottom_index = None
+        self.history = None
+
+    def build(self, df, time_col=None):
+        """Build the summing matrix and the aggregated history of every node from the bottom rows"""
+        if time_col is None:
+            time_col = 'date' if 'date' in df.columns else self.config['preprocessing']['date_column']
+
+        bottom = df.pivot_table(
+            index=[self.country_col, self.coffee_type_col],
+            columns=time_col,
+            values=self.value_col,
+            aggfunc='sum',
+            observed=True
+        ).sort_index().fillna(0.0)
+        self.bottom_index = bottom.index
+
+        country_codes, countries = pd.factorize(bottom.index.get_level_values(0), sort=True)
+        type_codes, coffee_types = pd.factorize(bottom.index.get_level_values(1), sort=True)
+        n_bottom = len(bottom)
+        columns = np.arange(n_bottom)
+        ones = np.ones(n_bottom)
+
+        self.A = sp.vstack([
+            sp.csr_matrix(ones[None, :]),
+            sp.csr_matrix((ones, (country_codes, columns)), shape=(len(countries), n_bottom)),
+            sp.csr_matrix((ones, (type_codes, columns)), shape=(len(coffee_types), n_bottom))
+        ]).tocsr()
+        self.S = sp.vstack([self.A, sp.identity(n_bottom, format='csr')]).tocsr()
+
+        self.nodes = pd.DataFrame({
+            'level': (
+                ['total'] + ['country'] * len(countries) + ['coffee_type'] * len(coffee_types)
+                + ['bottom'] * n_bottom
+            ),
+            self.country_col: [TOTAL] + list(countries) + [TOTAL] * len(coffee_types)
+                + list(bottom.index.get_level_values(0)),
+            self.coffee_type_col: [TOTAL] + [TOTAL] * len(countries) + list(coffee_types)
+                + list(bottom.index.get_level_values(1))
+        })
+        self.index = pd.MultiIndex.from_frame(self.nodes[[self.country_col, self.coffee_type_col]])
+        self.history = self.aggregate(bottom)
+        return self
+
+    @property
+    def n_aggregates(self):
+        return self.A.shape[0]
+
+    def aggregate(self, bottom):
+        """Sum bottom-level values (DataFrame indexed by (country, coffee_type)) up the hierarchy"""
+        values = bottom.reindex(self.bottom_index).to_numpy(dtype=float)
+        return pd.DataFrame(self.S @ values, index=self.index, columns=bottom.columns)
+
+    def _constraints(self):
+        """C = [I | -A]: aggregate nodes minus the sum of their bottom series"""
+        return sp.hstack([sp.identity(self.n_aggregates, format='csr'), -self.A]).tocsr()
+
+    def coherence_error(self, values):
+        """Largest absolute violation of the aggregation constraints"""
+        values = values.reindex(self.index).to_numpy(dtype=float)
+        return float(np.abs(self._constraints() @ values).max())
+
+    def _weights(self, method, residuals):
+        if method == 'ols':
+            return np.ones(len(self.index))
+        if method == 'wls_struct':
+            # Número de series de base bajo cada nodo
+            return np.asarray(self.S.sum(axis=1)).ravel()
+        if residuals is None:
+            raise ValueError("wls_var requiere los residuos en muestra de cada nodo")
+        residuals = residuals.reindex(self.index).to_numpy(dtype=float)
+        variance = np.nanmean(residuals ** 2, axis=1)
+        # Nodos sin residuos o con varianza nula reciben la menor varianza observada
+        positive = variance[np.isfinite(variance) & (variance > 0)]
+        floor = positive.min() if len(positive) else 1.0
+        return np.where(np.isfinite(variance) & (variance > 0), variance, floor)
+
+    def _top_down_proportions(self):
+        """Average historical share of every bottom series in the total"""
+        bottom = self.history.iloc[self.n_aggregates:].to_numpy()
+        total = self.history.iloc[0].to_numpy()
+        valid = total > 0
+        if not valid.any():
+            raise ValueError("El total histórico es cero; no se pueden calcular proporciones")
+        return (bottom[:, valid] / total[valid]).mean(axis=1)
+
+    def reconcile(self, base, method='wls_struct', residuals=None):
+        """Coherent forecasts for every node
+
+        base: DataFrame of base forecasts indexed like self.index (one column per
+        horizon step). bottom_up only needs the bottom rows and top_down only the
+        total row; MinT methods (ols, wls_struct, wls_var) need every node.
+        residuals: in-sample residuals per node (same index), for wls_var.
+        """
+        if method not in METHODS:
+            raise ValueError(f"Método de reconciliación no soportado: {method}")
+
+        base = base.reindex(self.index)
+        columns = base.columns
+
+        if method == 'bottom_up':
+            bottom = base.iloc[self.n_aggregates:].to_numpy(dtype=float)
+            return pd.DataFrame(self.S @ bottom, index=self.index, columns=columns)
+
+        if method == 'top_down':
+            total = base.iloc[0].to_numpy(dtype=float)
+            bottom = np.outer(self._top_down_proportions(), total)
+            return pd.DataFrame(self.S @ bottom, index=self.index, columns=columns)
+
+        values = base.to_numpy(dtype=float)
+        missing = np.isnan(values).any(axis=1)
+        if missing.any():
+            raise ValueError(f"Faltan pronósticos base para {int(missing.sum())} nodos")
+
+        weights = self._weights(method, residuals)
+        C = self._constraints()
+        W = sp.diags(weights)
+        system = (C @ W @ C.T).tocsc()
+        correction = spsolve(system, C @ values)
+        if correction.ndim == 1:
+            correction = correction[:, None]
+        reconciled = values - W @ (C.T @ correction)
+        return pd.DataFrame(reconciled, index=self.index, columns=columns)
@@ -0,0 +1,139 @@
+# src/response_cache.py
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+import metrics
+
+class ResponseCache:
+    """Two-tier cache for chatbot answers: in-memory LRU in front of a SQLite table
+
+    Entries expire after ttl_seconds; the memory tier keeps at most memory_entries
+    answers and the disk tier at most max_entries (least recently used evicted).
+    """
+
+    def __init__(self, db_path=None, max_entries=10000, ttl_seconds=86400, memory_entries=256):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.memory_entries = memory_entries
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.db_path:
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+            self._execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+
+    def _execute(self, query, params=(), fetch=None):
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with connection:
+                cursor = connection.execute(query, params)
+                if fetch == 'one':
+                    return cursor.fetchone()
+        finally:
+            connection.close()
+
+    @staticmethod
+    def normalize_question(question):
+        """Case, accent-width, punctuation and whitespace insensitive form of a question"""
+        text = unicodedata.normalize('NFKC', question).lower().strip()
+        text = text.strip('¿?¡!.,;: ')
+        return re.sub(r'\s+', ' ', text)
+
+    def make_key(self, question, data_fingerprint, settings):
+        """Cache key for a question asked against a data context with given model settings"""
+        payload = json.dumps({
+            'question': self.normalize_question(question),
+            'data': data_fingerprint,
+            'settings': settings
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _expired(self, created_at, now):
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def get(self, key):
+        """Cached answer for key, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[1], now):
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    metrics.inc('cache_requests_total', cache='chatbot', result='memory_hit')
+                    return entry[0]
+                del self._memory[key]
+
+        if self.db_path:
+            row = self._execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,), fetch='one'
+            )
+            if row is not None:
+                if not self._expired(row[1], now):
+                    self._execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                    with self._lock:
+                        self._remember(key, row[0], row[1])
+                        self.disk_hits += 1
+                    metrics.inc('cache_requests_total', cache='chatbot', result='disk_hit')
+                    return row[0]
+                self._execute("DELETE FROM responses WHERE key = ?", (key,))
+
+        with self._lock:
+            self.misses += 1
+        metrics.inc('cache_requests_total', cache='chatbot', result='miss')
+        return None
+
+    def _remember(self, key, value, created_at):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def set(self, key, value):
+        """Store an answer in both tiers, evicting expired and least recently used entries"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+
+        if self.db_path:
+            self._execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            if self.ttl_seconds is not None:
+                self._execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._execute("""
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def stats(self):
+        """Hit/miss counters and hit rate since this cache was created"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                'memory_entries': len(self._memory)
+            }
@@ -0,0 +1,92 @@
+import pandas as pd
+import numpy as np
+
+class SeriesStatistics:
+    """Vectorized per-series statistics computed in a single grouped pass"""
+
+    def __init__(self, config):
+        self.config = config
+        self.group_cols = [
+            config['preprocessing']['country_column'],
+            config['preprocessing']['coffee_type_column']
+        ]
+
+    def _time_axis(self, df):
+        """Numeric time axis used for trend and CAGR, in years
+
+        With a real 'date' column (sub-annual data) the axis is the fractional
+        year, so trend stays per year and CAGR annual; annual dates map to
+        whole years exactly.
+        """
+        if 'date' in df.columns and pd.api.types.is_datetime64_any_dtype(df['date']):
+            dates = df['date'].dt
+            days_in_year = np.where(dates.is_leap_year, 366.0, 365.0)
+            return dates.year.to_numpy(dtype=float) + (dates.dayofyear.to_numpy(dtype=float) - 1) / days_in_year
+        time = df[self.config['preprocessing']['date_column']]
+        return time.to_numpy(dtype=float)
+
+    def compute(self, df):
+        """Compute mean, std, min, max, sum, count, trend, CAGR and volatility per series
+
+        The OLS trend slope is obtained in closed form from grouped sums:
+        slope = (n*Sxy - Sx*Sy) / (n*Sxx - Sx^2)
+        """
+        consumption_col = self.config['preprocessing']['consumption_column']
+
+        # Sólo cuentan las observaciones presentes, igual que en np.polyfit
+        observed = df[consumption_col].notna().to_numpy()
+        x = self._time_axis(df)[observed]
+        y = df[consumption_col].to_numpy(dtype=float)[observed]
+        # Centrar el eje temporal evita pérdida de precisión en las sumas de cuadrados
+        if len(x):
+            x = x - x.min()
+
+        work = pd.DataFrame({
+            'x': x,
+            'y': y,
+            'xy': x * y,
+            'xx': x * x
+        })
+        for col in self.group_cols:
+            work[col] = df[col].to_numpy()[observed]
+
+        stats = work.groupby(self.group_cols, sort=True).agg(
+            mean=('y', 'mean'),
+            std=('y', 'std'),
+            min=('y', 'min'),
+            max=('y', 'max'),
+            sum=('y', 'sum'),
+            count=('y', 'count'),
+            sum_x=('x', 'sum'),
+            sum_xy=('xy', 'sum'),
+            sum_xx=('xx', 'sum'),
+            first_pos=('x', 'idxmin'),
+            last_pos=('x', 'idxmax')
+        )
+
+        n = stats['count']
+        denominator = n * stats['sum_xx'] - stats['sum_x'] ** 2
+        stats['trend'] = (
+            (n * stats['sum_xy'] - stats['sum_x'] * stats['sum']) / denominator.where(denominator != 0)
+        )
+
+        # CAGR entre la primera y la última observación de cada serie
+        first_pos = stats['first_pos'].to_numpy()
+        last_pos = stats['last_pos'].to_numpy()
+        first_value = y[first_pos]
+        last_value = y[last_pos]
+        periods = x[last_pos] - x[first_pos]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cagr = np.where(
+                (first_value > 0) & (last_value > 0) & (periods > 0),
+                (last_value / first_value) ** (1 / periods) - 1,
+                np.nan
+            )
+        stats['cagr'] = cagr
+
+        # Volatilidad como coeficiente de variación
+        stats['volatility'] = stats['std'] / stats['mean'].where(stats['mean'] != 0)
+
+        return stats[[
+            'mean', 'std', 'min', 'max', 'sum', 'count', 'trend', 'cagr', 'volatility'
+        ]]
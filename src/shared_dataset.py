@@ -0,0 +1,113 @@
+# src/shared_dataset.py
+import os
+import time
+import threading
+import pandas as pd
+import pyarrow as pa
+
+POINTER_FILE = "CURRENT"
+# Versiones conservadas al publicar: la vigente y la anterior, que un lector
+# puede estar a punto de abrir tras leer el puntero viejo
+KEEP_VERSIONS = 2
+# Reintentos de lectura si la versión del puntero se borró antes de abrirla
+LOAD_ATTEMPTS = 3
+
+# Un único DataFrame por versión y proceso, compartido por todas las sesiones
+_lock = threading.Lock()
+_loaded = {}
+
+def _to_arrow(df):
+    """Convert df to an Arrow table keeping float NaN as values (no validity bitmap)
+
+    Columns without validity bitmaps can be converted back to pandas without
+    copying, so readers get views onto the memory-mapped file.
+    """
+    arrays = []
+    for column in df.columns:
+        values = df[column]
+        if pd.api.types.is_float_dtype(values.dtype):
+            arrays.append(pa.array(values.to_numpy()))
+        else:
+            arrays.append(pa.Array.from_pandas(values))
+    return pa.Table.from_arrays(arrays, names=[str(column) for column in df.columns])
+
+def publish_dataset(df, shared_dir, keep_versions=KEEP_VERSIONS):
+    """Publish df as a new Arrow IPC file and atomically switch readers to it
+
+    Each version is written to its own file and the CURRENT pointer is swapped
+    with os.replace, so viewers holding the previous mapping keep working
+    (a mapped file cannot be replaced in place on Windows). Only the newest
+    keep_versions files are kept.
+    """
+    os.makedirs(shared_dir, exist_ok=True)
+    version = f"dataset-{time.time_ns()}.arrow"
+    data_path = os.path.join(shared_dir, version)
+
+    table = _to_arrow(df)
+    tmp_path = f"{data_path}.tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, data_path)
+
+    pointer_path = os.path.join(shared_dir, POINTER_FILE)
+    tmp_pointer = f"{pointer_path}.{os.getpid()}.tmp"
+    with open(tmp_pointer, 'w') as file:
+        file.write(version)
+    os.replace(tmp_pointer, pointer_path)
+
+    _cleanup(shared_dir, version, keep_versions)
+    return data_path
+
+def _cleanup(shared_dir, current, keep_versions):
+    """Best-effort removal of all but the newest versions (files still mapped are skipped)"""
+    # Los nombres llevan time_ns: el orden alfabético es el de publicación
+    versions = sorted(name for name in os.listdir(shared_dir) if name.endswith('.arrow'))
+    keep = set(versions[-max(keep_versions, 1):]) | {current}
+    for name in versions:
+        if name not in keep:
+            try:
+                os.remove(os.path.join(shared_dir, name))
+            except OSError:
+                pass
+
+def current_version(shared_dir):
+    """Name of the currently published version, or None if nothing was published"""
+    try:
+        with open(os.path.join(shared_dir, POINTER_FILE)) as file:
+            return file.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def has_shared_dataset(shared_dir):
+    return current_version(shared_dir) is not None
+
+def load_shared_dataset(shared_dir):
+    """Return the published dataset, memory-mapped read-only and shared in-process
+
+    Numeric columns are zero-copy views onto the mapping, so every session of
+    every server process reads the same physical pages from the OS page cache.
+    If the version named by the pointer was removed before it could be mapped
+    (another process published twice in between), the pointer is read again.
+    """
+    for attempt in range(LOAD_ATTEMPTS):
+        version = current_version(shared_dir)
+        if version is None:
+            raise FileNotFoundError(f"No hay dataset publicado en {shared_dir}")
+        try:
+            return _load_version(shared_dir, version)
+        except FileNotFoundError:
+            if attempt == LOAD_ATTEMPTS - 1:
+                raise
+
+def _load_version(shared_dir, version):
+    key = (os.path.abspath(shared_dir), version)
+    with _lock:
+        if key not in _loaded:
+            source = pa.memory_map(os.path.join(shared_dir, version), 'r')
+            table = pa.ipc.open_file(source).read_all()
+            # Sólo se conserva la versión vigente de este directorio
+            for old_key in [k for k in _loaded if k[0] == key[0]]:
+                del _loaded[old_key]
+            _loaded[key] = table.to_pandas(split_blocks=True)
+        return _loaded[key]
@@ -0,0 +1,109 @@
+import numpy as np
+from sklearn.decomposition import PCA
+from sklearn.neighbors import KDTree
+from series_statistics import SeriesStatistics
+
+class MarketSimilarityIndex:
+    """Nearest-neighbour index over per-series consumption trajectories"""
+
+    def __init__(self, config):
+        self.config = config
+        self.params = config['similarity']
+        self.keys = None
+        self.vectors = None
+        self.squared_norms = None
+        self.positions = {}
+        # Sólo se usan en catálogos grandes
+        self.projection = None
+        self.tree = None
+
+    def _group_cols(self):
+        return [
+            self.config['preprocessing']['country_column'],
+            self.config['preprocessing']['coffee_type_column']
+        ]
+
+    def _zscore(self, values, axis):
+        """Standardize along axis, mapping constant rows/columns and gaps to 0"""
+        mean = np.nanmean(values, axis=axis, keepdims=True)
+        std = np.nanstd(values, axis=axis, keepdims=True)
+        std[std == 0] = np.nan
+        return np.nan_to_num((values - mean) / std)
+
+    def _trajectories(self, df):
+        """Series x period matrix of consumption shapes (z-normalized per series)"""
+        trajectories = df.pivot_table(
+            index=self._group_cols(),
+            columns=self.config['preprocessing']['date_column'],
+            values=self.config['preprocessing']['consumption_column'],
+            aggfunc='sum'
+        ).sort_index()
+        # Huecos rellenados con el valor vecino dentro de cada serie
+        trajectories = trajectories.ffill(axis=1).bfill(axis=1)
+        return trajectories.index, self._zscore(trajectories.to_numpy(dtype=float), axis=1)
+
+    def build(self, df):
+        """Build the index from the processed data"""
+        keys, trajectories = self._trajectories(df)
+        stats = SeriesStatistics(self.config).compute(df).reindex(keys)
+        features = self._zscore(
+            stats[['mean', 'std', 'trend', 'cagr', 'volatility']].to_numpy(dtype=float), axis=0
+        )
+
+        # Cada bloque pesa lo mismo independientemente de su dimensión
+        self.vectors = np.hstack([
+            trajectories * self.params['trajectory_weight'] / np.sqrt(trajectories.shape[1]),
+            features * self.params['feature_weight'] / np.sqrt(features.shape[1])
+        ])
+        self.squared_norms = np.einsum('ij,ij->i', self.vectors, self.vectors)
+        self.keys = keys
+        self.positions = {key: pos for pos, key in enumerate(keys)}
+
+        # Catálogos grandes: KD-tree sobre una proyección PCA y re-ranking exacto
+        self.projection = None
+        self.tree = None
+        if len(self.vectors) > self.params['exact_search_max']:
+            n_components = min(self.params['index_dimensions'], *self.vectors.shape)
+            self.projection = PCA(n_components=n_components, random_state=42).fit(self.vectors)
+            self.tree = KDTree(self.projection.transform(self.vectors), leaf_size=self.params['leaf_size'])
+
+        return self
+
+    def _candidates(self, vector, n_candidates):
+        """Positions of the rows closest to vector (exact or via the tree)"""
+        if self.tree is None:
+            return np.arange(len(self.vectors))
+        _, candidates = self.tree.query(self.projection.transform(vector[None, :]), k=n_candidates)
+        return candidates[0]
+
+    def query(self, country, coffee_type, k=None):
+        """Return the k series most similar to (country, coffee_type)"""
+        if self.vectors is None:
+            raise ValueError("Index not built; call build first")
+        if k is None:
+            k = self.params['top_k']
+
+        key = (country, coffee_type)
+        if key not in self.positions:
+            raise KeyError(f"Unknown series: {country} - {coffee_type}")
+        position = self.positions[key]
+        vector = self.vectors[position]
+
+        n_candidates = min(len(self.vectors), (k + 1) * self.params['candidate_factor'])
+        candidates = self._candidates(vector, n_candidates)
+
+        # Distancia euclídea exacta: ||a||^2 - 2 a.b + ||b||^2
+        distances = (
+            self.squared_norms[candidates] - 2 * self.vectors[candidates] @ vector + self.squared_norms[position]
+        )
+        distances = np.sqrt(np.maximum(distances, 0))
+        keep = candidates != position
+        candidates, distances = candidates[keep], distances[keep]
+
+        k = min(k, len(candidates))
+        top = np.argpartition(distances, k - 1)[:k] if k else np.array([], dtype=int)
+        top = top[np.argsort(distances[top])]
+
+        neighbours = self.keys[candidates[top]].to_frame(index=False)
+        neighbours['distance'] = distances[top]
+        return neighbours
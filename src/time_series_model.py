@@ -3,6 +3,8 @@ from sklearn.metrics import mean_absolute_error, mean_squared_error, mean_absolu
 import numpy as np
 import pandas as pd
 import mlflow
+from reconciliation import HierarchyReconciler
+from metrics import timed
 
 class TimeSeriesModel:
     def __init__(self, config):
@@ -27,18 +29,20 @@ class TimeSeriesModel:
         
         return prophet_df
     
-    def train_prophet(self, train_df, country, coffee_type):
-        """Train Prophet model for specific country and coffee type"""
-        prophet_df = self.prepare_prophet_data(train_df, country, coffee_type)
-        
-        model = Prophet(
+    def _new_prophet(self):
+        return Prophet(
             growth=self.config['models']['prophet']['growth'],
             seasonality_mode=self.config['models']['prophet']['seasonality_mode'],
             yearly_seasonality=self.config['models']['prophet']['yearly_seasonality'],
             weekly_seasonality=self.config['models']['prophet']['weekly_seasonality'],
             daily_seasonality=self.config['models']['prophet']['daily_seasonality']
         )
+    
+    def train_prophet(self, train_df, country, coffee_type):
+        """Train Prophet model for specific country and coffee type"""
+        prophet_df = self.prepare_prophet_data(train_df, country, coffee_type)
         
+        model = self._new_prophet()
         model.fit(prophet_df)
         return model
     
@@ -51,7 +55,8 @@ class TimeSeriesModel:
             freq=self.config['forecasting']['frequency']
         )
         
-        forecast = model.predict(future)
+        with timed('model_inference_seconds', model='prophet'):
+            forecast = model.predict(future)
         
         # Merge actual and predicted values
         comparison = forecast.set_index('ds')[['yhat', 'yhat_lower', 'yhat_upper']].join(
@@ -73,14 +78,22 @@ class TimeSeriesModel:
         
         return metrics, comparison, forecast
     
-    def train_all_models(self, train_df):
-        """Train models for all country and coffee type combinations"""
+    def train_all_models(self, train_df, progress_callback=None):
+        """Train models for all country and coffee type combinations
+        
+        progress_callback(done, total, message) is called before each series and
+        once at the end; it may raise to abort training (e.g. job cancellation).
+        """
         countries = train_df[self.config['preprocessing']['country_column']].unique()
         coffee_types = train_df[self.config['preprocessing']['coffee_type_column']].unique()
+        total = len(countries) * len(coffee_types)
+        done = 0
         
         for country in countries:
             for coffee_type in coffee_types:
                 print(f"Training model for {country} - {coffee_type}")
+                if progress_callback is not None:
+                    progress_callback(done, total, f"{country} - {coffee_type}")
                 
                 with mlflow.start_run():
                     model = self.train_prophet(train_df, country, coffee_type)
@@ -89,13 +102,51 @@ class TimeSeriesModel:
                     # Log parameters and model
                     mlflow.log_params(self.config['models']['prophet'])
                     mlflow.prophet.log_model(model, f"prophet_{country}_{coffee_type}")
+                done += 1
+        
+        if progress_callback is not None:
+            progress_callback(done, total, "Done")
         
         return self.models
     
+    def forecast_hierarchy(self, train_df, periods, method='wls_struct'):
+        """Coherent forecasts for the total, every country, every coffee type and every series
+        
+        A Prophet model is fitted on the aggregated history of each node and the
+        base forecasts are reconciled (see HierarchyReconciler), so country and
+        global totals equal the sum of their series. Returns (reconciled, base),
+        both indexed by (country, coffee_type) node with one column per period.
+        """
+        reconciler = HierarchyReconciler(self.config).build(train_df)
+        history = reconciler.history
+        dates = history.columns
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            dates = pd.to_datetime(dates.astype(str), format='%Y')
+        
+        base, residuals = [], []
+        for node, series in history.iterrows():
+            model = self._new_prophet()
+            model.fit(pd.DataFrame({'ds': dates, 'y': series.to_numpy()}))
+            future = model.make_future_dataframe(
+                periods=periods,
+                freq=self.config['forecasting']['frequency']
+            )
+            with timed('model_inference_seconds', model='prophet'):
+                yhat = model.predict(future)['yhat'].to_numpy()
+            base.append(yhat[-periods:])
+            residuals.append(series.to_numpy() - yhat[:len(series)])
+        
+        horizon = future['ds'].iloc[-periods:]
+        base = pd.DataFrame(np.vstack(base), index=history.index, columns=horizon)
+        residuals = pd.DataFrame(np.vstack(residuals), index=history.index, columns=history.columns)
+        reconciled = reconciler.reconcile(base, method=method, residuals=residuals)
+        return reconciled, base
+    
     def forecast_future(self, model, periods):
         """Generate future forecasts"""
         future = model.make_future_dataframe(periods=periods)
-        forecast = model.predict(future)
+        with timed('model_inference_seconds', model='prophet'):
+            forecast = model.predict(future)
         return forecast
     
     def calculate_smape(self, actual, predicted):
@@ -2,6 +2,7 @@
 import yaml
 import os
 import logging
+import hashlib
 
 def load_config(config_path):
     """Load configuration from YAML file"""
@@ -20,4 +21,11 @@ def setup_logging(log_file="coffee_analysis.log"):
         level=logging.INFO,
         format='%(asctime)s - %(levelname)s - %(message)s'
     )
-    return logging.getLogger(__name__)
\ No newline at end of file
+    return logging.getLogger(__name__)
+
+def dataframe_fingerprint(df):
+    """Content hash of a DataFrame (values, columns and dtypes)"""
+    import pandas as pd
+    digest = hashlib.sha256(repr(list(zip(df.columns, df.dtypes.astype(str)))).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
\ No newline at end of file
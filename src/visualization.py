@@ -1,59 +1,210 @@
 # src/visualization.py
 import pandas as pd
+import plotly
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+from plotly.offline import get_plotlyjs
+from functools import lru_cache, partial
+import hashlib
+import inspect
+import json
 import os
 
-def create_presentation_visualizations(df, output_dir='reports'):
-    """Create key visualizations for the presentation"""
-    
-    # Crear directorio de reportes si no existe
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # 1. Tendencia de consumo global a lo largo del tiempo
-    global_consumption = df.groupby('year')['consumption_cups'].sum().reset_index()
-    fig1 = px.line(global_consumption, x='year', y='consumption_cups', 
+MANIFEST_FILE = 'manifest.json'
+PLOTLYJS_FILE = 'plotly.min.js'
+
+def aggregate_report_data(df):
+    """Single pass over the rows: consumption and price sums per (year, country, coffee_type)
+
+    Every report is derived from this small table, and the price mean is kept
+    as sum/count so it can be re-aggregated at any level.
+    """
+    grouped = df.groupby(['year', 'country', 'coffee_type'], observed=True, sort=True)
+    return grouped.agg(
+        consumption_cups=('consumption_cups', 'sum'),
+        price_sum=('price_per_cup', 'sum'),
+        price_count=('price_per_cup', 'count')
+    ).reset_index()
+
+def _by(cube, keys):
+    data = cube.groupby(keys, sort=True)[['consumption_cups', 'price_sum', 'price_count']].sum()
+    data['price_per_cup'] = data['price_sum'] / data['price_count']
+    return data.drop(columns=['price_sum', 'price_count']).reset_index()
+
+# 1. Tendencia de consumo global a lo largo del tiempo
+def _global_trend(cube):
+    return _by(cube, 'year')[['year', 'consumption_cups']]
+
+def _plot_global_trend(data):
+    return px.line(data, x='year', y='consumption_cups',
                    title='Tendencia Global de Consumo de Café (1990-2020)',
                    labels={'consumption_cups': 'Consumo (tazas)', 'year': 'Año'})
-    fig1.write_html(f'{output_dir}/global_trend.html')
-    
-    # 2. Consumo por país (top 5)
-    country_consumption = df.groupby('country')['consumption_cups'].sum().reset_index()
-    country_consumption = country_consumption.sort_values('consumption_cups', ascending=False).head(5)
-    fig2 = px.bar(country_consumption, x='country', y='consumption_cups',
+
+# 2. Consumo por país (top 5)
+def _country_consumption(cube):
+    data = _by(cube, 'country')[['country', 'consumption_cups']]
+    return data.sort_values('consumption_cups', ascending=False).head(5)
+
+def _plot_country_consumption(data):
+    return px.bar(data, x='country', y='consumption_cups',
                   title='Consumo Total por País (Top 5)',
                   labels={'consumption_cups': 'Consumo (tazas)', 'country': 'País'})
-    fig2.write_html(f'{output_dir}/country_consumption.html')
-    
-    # 3. Consumo por tipo de café
-    type_consumption = df.groupby('coffee_type')['consumption_cups'].sum().reset_index()
-    fig3 = px.pie(type_consumption, values='consumption_cups', names='coffee_type',
+
+# 3. Consumo por tipo de café
+def _type_consumption(cube):
+    return _by(cube, 'coffee_type')[['coffee_type', 'consumption_cups']]
+
+def _plot_type_consumption(data):
+    return px.pie(data, values='consumption_cups', names='coffee_type',
                   title='Distribución del Consumo por Tipo de Café')
-    fig3.write_html(f'{output_dir}/coffee_type_distribution.html')
-    
-    # 4. Precio promedio a lo largo del tiempo
-    price_trend = df.groupby('year')['price_per_cup'].mean().reset_index()
-    fig4 = px.line(price_trend, x='year', y='price_per_cup',
+
+# 4. Precio promedio a lo largo del tiempo
+def _price_trend(cube):
+    return _by(cube, 'year')[['year', 'price_per_cup']]
+
+def _plot_price_trend(data):
+    return px.line(data, x='year', y='price_per_cup',
                    title='Evolución del Precio Promedio por Taza (1990-2020)',
                    labels={'price_per_cup': 'Precio (USD)', 'year': 'Año'})
-    fig4.write_html(f'{output_dir}/price_trend.html')
-    
-    # 5. Relación entre precio y consumo
-    price_consumption = df.groupby('year').agg({'price_per_cup': 'mean', 'consumption_cups': 'sum'}).reset_index()
-    fig5 = px.scatter(price_consumption, x='price_per_cup', y='consumption_cups', 
+
+# 5. Relación entre precio y consumo
+def _price_consumption(cube):
+    return _by(cube, 'year')[['year', 'price_per_cup', 'consumption_cups']]
+
+def _plot_price_consumption(data):
+    return px.scatter(data, x='price_per_cup', y='consumption_cups',
                       trendline='ols', title='Relación entre Precio y Consumo',
                       labels={'price_per_cup': 'Precio Promedio (USD)', 'consumption_cups': 'Consumo Total'})
-    fig5.write_html(f'{output_dir}/price_consumption_relationship.html')
-    
-    print(f'Visualizaciones guardadas en el directorio: {output_dir}')
+
+# Nombre de archivo -> (agregado, figura)
+REPORTS = {
+    'global_trend.html': (_global_trend, _plot_global_trend),
+    'country_consumption.html': (_country_consumption, _plot_country_consumption),
+    'coffee_type_distribution.html': (_type_consumption, _plot_type_consumption),
+    'price_trend.html': (_price_trend, _plot_price_trend),
+    'price_consumption_relationship.html': (_price_consumption, _plot_price_consumption)
+}
+
+def _country_report(cube, country):
+    return _by(cube[cube['country'] == country], ['year', 'coffee_type'])
+
+def _plot_country_report(data, country):
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True,
+                        subplot_titles=('Consumo por Tipo de Café', 'Precio Promedio por Taza'))
+    for coffee_type, series in data.groupby('coffee_type', sort=True):
+        fig.add_trace(go.Scatter(x=series['year'], y=series['consumption_cups'], name=coffee_type,
+                                 mode='lines', legendgroup=coffee_type), row=1, col=1)
+        fig.add_trace(go.Scatter(x=series['year'], y=series['price_per_cup'], name=coffee_type,
+                                 mode='lines', legendgroup=coffee_type, showlegend=False), row=2, col=1)
+    fig.update_layout(title=f'Reporte de Mercado: {country}')
+    fig.update_yaxes(title_text='Consumo (tazas)', row=1, col=1)
+    fig.update_yaxes(title_text='Precio (USD)', row=2, col=1)
+    fig.update_xaxes(title_text='Año', row=2, col=1)
+    return fig
+
+def _country_file(country):
+    slug = ''.join(char if char.isalnum() else '_' for char in str(country).lower())
+    return f'country_{slug}.html'
+
+def _data_hash(data):
+    """Hash of a report's input aggregate (values and column names)"""
+    digest = hashlib.sha1(pd.util.hash_pandas_object(data, index=False).values.tobytes())
+    digest.update('|'.join(map(str, data.columns)).encode())
+    return digest.hexdigest()
+
+@lru_cache(maxsize=None)
+def _code_hash(function):
+    """Hash of a function's source code"""
+    return hashlib.sha1(inspect.getsource(function).encode()).hexdigest()
+
+def _report_key(plot, data):
+    """Manifest entry of a report: changes with its data, its plotting code or the plotly version"""
+    # Los reportes por país usan partial sobre la misma función
+    code = _code_hash(getattr(plot, 'func', plot))
+    return f'{plotly.__version__}:{code}:{_code_hash(_render)}:{_data_hash(data)}'
+
+def _load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE)) as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    with open(f'{path}.tmp', 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(f'{path}.tmp', path)
+
+def _ensure_plotlyjs(output_dir, manifest):
+    """Write the shared plotly.js bundle every report references
+
+    The bundle is rewritten when the installed plotly version differs from
+    the one recorded in the manifest, so regenerated reports never load an
+    older plotly.js.
+    """
+    path = os.path.join(output_dir, PLOTLYJS_FILE)
+    if manifest.get(PLOTLYJS_FILE) != plotly.__version__ or not os.path.exists(path):
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as file:
+            file.write(get_plotlyjs())
+        os.replace(f'{path}.tmp', path)
+        manifest[PLOTLYJS_FILE] = plotly.__version__
+
+def _render(output_dir, filename, plot, data):
+    plot(data).write_html(os.path.join(output_dir, filename), include_plotlyjs='directory')
+    return filename
+
+def create_presentation_visualizations(df, output_dir='reports', countries=None, force=False):
+    """Create key visualizations for the presentation
+
+    Reports whose input aggregate, plotting code and plotly version are
+    unchanged since the last run are skipped (force=True regenerates
+    everything). Pass countries to also build one report per market.
+    Returns {filename: 'written' | 'skipped'}.
+    """
+
+    # Crear directorio de reportes si no existe
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = _load_manifest(output_dir)
+    _ensure_plotlyjs(output_dir, manifest)
+
+    cube = aggregate_report_data(df)
+    jobs = {filename: (plot, aggregate(cube)) for filename, (aggregate, plot) in REPORTS.items()}
+    for country in ([] if countries is None else countries):
+        jobs[_country_file(country)] = (
+            partial(_plot_country_report, country=country),
+            _country_report(cube, country)
+        )
+
+    hashes = {filename: _report_key(plot, data) for filename, (plot, data) in jobs.items()}
+    pending = [
+        filename for filename in jobs
+        if force
+        or manifest.get(filename) != hashes[filename]
+        or not os.path.exists(os.path.join(output_dir, filename))
+    ]
+
+    # Construir figuras es trabajo de CPU bajo el GIL: hilos no lo acelerarían
+    try:
+        for filename in pending:
+            _render(output_dir, filename, *jobs[filename])
+            manifest[filename] = hashes[filename]
+    finally:
+        # Los reportes que sí se escribieron quedan registrados aunque otro falle
+        _save_manifest(output_dir, manifest)
+
+    status = {filename: 'written' if filename in pending else 'skipped' for filename in jobs}
+    print(f'Visualizaciones guardadas en el directorio: {output_dir} '
+          f'({len(pending)} generadas, {len(jobs) - len(pending)} sin cambios)')
+    return status
 
 if __name__ == "__main__":
     from data_processing import CoffeeDataProcessor
     from utils import load_config
-    
+
     config = load_config('../config/parameters.yaml')
     processor = CoffeeDataProcessor(config)
     df = processor.process()
-    
-    create_presentation_visualizations(df)
\ No newline at end of file
+
+    create_presentation_visualizations(df, countries=df['country'].unique())
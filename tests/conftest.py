@@ -0,0 +1,43 @@
+# tests/conftest.py
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# Los módulos de src se importan de forma plana, como en la aplicación
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+class StubLLM:
+    """Offline stand-in for AsyncLLMClient that records the prompts it receives"""
+
+    def __init__(self, tokens=('respuesta ', 'del ', 'LLM'), error=None):
+        self.tokens = tokens
+        self.error = error
+        self.calls = []
+
+    def stream_chat(self, messages, **params):
+        self.calls.append(messages)
+        if self.error is not None:
+            raise self.error
+        yield from self.tokens
+
+@pytest.fixture
+def coffee_df():
+    """Small annual dataset: 3 countries x 2 coffee types x 2018-2020"""
+    rows = []
+    for c, country in enumerate(['Brazil', 'Vietnam', 'Ethiopia']):
+        for t, coffee_type in enumerate(['Arabica', 'Robusta']):
+            for year in (2018, 2019, 2020):
+                rows.append({
+                    'country': country,
+                    'coffee_type': coffee_type,
+                    'year': year,
+                    'consumption_cups': 100.0 * (c + 1) + 10.0 * t + (year - 2018),
+                    'price_per_cup': 2.0 + 0.5 * t
+                })
+    return pd.DataFrame(rows)
+
+@pytest.fixture
+def stub_llm():
+    return StubLLM()
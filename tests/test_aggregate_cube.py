@@ -0,0 +1,107 @@
+# tests/test_aggregate_cube.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregate_cube import AggregateCube
+
+CONFIG = {
+    'preprocessing': {
+        'date_column': 'year',
+        'country_column': 'country',
+        'coffee_type_column': 'coffee_type',
+        'consumption_column': 'consumption_cups',
+        'price_column': 'price_per_cup'
+    }
+}
+
+@pytest.fixture(scope='module')
+def df():
+    """Several rows per cell, missing values and a (country, type) pair absent from the data"""
+    rng = np.random.default_rng(0)
+    rows = []
+    for country in ('Vietnam', 'Brazil', 'Kenya', 'Colombia'):
+        for coffee_type in ('Robusta', 'Arabica', 'Blend'):
+            if (country, coffee_type) == ('Kenya', 'Robusta'):
+                continue
+            for year in range(2010, 2021):
+                for _ in range(rng.integers(1, 4)):
+                    rows.append({
+                        'year': year, 'country': country, 'coffee_type': coffee_type,
+                        'consumption_cups': rng.uniform(10, 1000), 'price_per_cup': rng.uniform(1, 5)
+                    })
+    df = pd.DataFrame(rows).sample(frac=1, random_state=0, ignore_index=True)
+    df.loc[rng.random(len(df)) < 0.1, 'consumption_cups'] = np.nan
+    df.loc[rng.random(len(df)) < 0.1, 'price_per_cup'] = np.nan
+    return df
+
+@pytest.fixture(scope='module')
+def cube(df):
+    return AggregateCube(CONFIG).build(df)
+
+def filter_rows(df, countries, coffee_types, year_range):
+    """Filter of the dashboard before the cube (isin and year range)"""
+    mask = pd.Series(True, index=df.index)
+    if countries is not None:
+        mask &= df['country'].isin(countries)
+    if coffee_types is not None:
+        mask &= df['coffee_type'].isin(coffee_types)
+    if year_range is not None:
+        mask &= df['year'].between(*year_range)
+    return df[mask]
+
+SELECTIONS = [
+    (None, None, None),
+    (['Brazil', 'Kenya'], None, (2012, 2018)),
+    (['Kenya'], ['Robusta'], None),
+    (None, ['Arabica', 'Blend'], (2020, 2020)),
+    (['Vietnam', 'Unknown'], ['Blend'], (2005, 2013)),
+    ([], None, None),
+    (None, None, (2030, 2040))
+]
+
+@pytest.mark.parametrize('countries, coffee_types, year_range', SELECTIONS)
+def test_kpis_match_pandas(df, cube, countries, coffee_types, year_range):
+    filtered = filter_rows(df, countries, coffee_types, year_range)
+    kpis = cube.kpis(cube.select(countries, coffee_types, year_range))
+
+    assert kpis['records'] == len(filtered)
+    assert kpis['total_consumption'] == pytest.approx(filtered['consumption_cups'].sum())
+    assert kpis['countries'] == filtered['country'].nunique()
+    if filtered['consumption_cups'].notna().any():
+        assert kpis['avg_consumption'] == pytest.approx(filtered['consumption_cups'].mean())
+        weighted = (filtered['price_per_cup'] * filtered['consumption_cups']).sum() / filtered['consumption_cups'].sum()
+        assert kpis['weighted_price'] == pytest.approx(weighted)
+    else:
+        assert np.isnan(kpis['avg_consumption']) and np.isnan(kpis['weighted_price'])
+
+@pytest.mark.parametrize('countries, coffee_types, year_range', SELECTIONS)
+def test_breakdowns_match_pandas_groupby(df, cube, countries, coffee_types, year_range):
+    filtered = filter_rows(df, countries, coffee_types, year_range)
+    selection = cube.select(countries, coffee_types, year_range)
+
+    by_country = filtered.groupby('country')['consumption_cups'].sum().reset_index()
+    pd.testing.assert_frame_equal(cube.by_country(selection), by_country, check_dtype=False)
+
+    by_type = filtered.groupby('coffee_type')['consumption_cups'].sum().reset_index()
+    pd.testing.assert_frame_equal(cube.by_coffee_type(selection), by_type, check_dtype=False)
+
+    trend = (
+        filtered.groupby(['year', 'country', 'coffee_type'])['consumption_cups'].sum()
+        .reset_index().sort_values(['year', 'country', 'coffee_type'], ignore_index=True)
+    )
+    pd.testing.assert_frame_equal(cube.trend(selection), trend, check_dtype=False)
+
+    price = (
+        filtered.groupby(['year', 'country'])
+        .agg({'price_per_cup': 'mean', 'consumption_cups': 'sum'}).reset_index()
+    )
+    pd.testing.assert_frame_equal(cube.price_consumption(selection), price, check_dtype=False)
+
+def test_select_reports_axes(cube):
+    selection = cube.select(['Kenya', 'Brazil'], None, (2015, 2016))
+    assert list(selection['years']) == [2015, 2016]
+    assert selection['countries'] == ['Kenya', 'Brazil']
+    # Orden de aparición en los datos, como df[col].unique()
+    assert selection['coffee_types'] == cube.coffee_types
+    assert selection['rows'].shape == (2, 2, len(cube.coffee_types))
@@ -0,0 +1,165 @@
+# tests/test_anomaly_detection.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from anomaly_detection import AnomalyDetector, STATE_ARRAYS, append_anomalies
+
+CONFIG = {
+    'preprocessing': {
+        'country_column': 'country',
+        'coffee_type_column': 'coffee_type',
+        'consumption_column': 'consumption_cups',
+        'price_column': 'price_per_cup'
+    },
+    'anomaly_detection': {
+        'alpha': 0.3,
+        'seasonal_alpha': 0.2,
+        'variance_alpha': 0.1,
+        'robust_rate': 0.1,
+        'min_periods': 5,
+        'z_threshold': 4.0,
+        'robust_threshold': 3.5
+    }
+}
+
+def annual_df(countries=('Brazil', 'Vietnam'), years=range(2000, 2030), spikes=(), seed=0):
+    """Noisy annual series; spikes is a list of (country, year, added consumption)"""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for c, country in enumerate(countries):
+        for year in years:
+            rows.append({
+                'country': country,
+                'coffee_type': 'Arabica',
+                'date': pd.Timestamp(year=year, month=1, day=1),
+                'consumption_cups': 1000.0 * (c + 1) + 5 * (year - years[0]) + rng.normal(0, 10),
+                'price_per_cup': 2.0 + rng.normal(0, 0.05)
+            })
+    df = pd.DataFrame(rows)
+    for country, year, amount in spikes:
+        df.loc[(df['country'] == country) & (df['date'].dt.year == year), 'consumption_cups'] += amount
+    return df
+
+def state(detector):
+    return {name: getattr(detector, name).copy() for name in STATE_ARRAYS}
+
+def test_clean_series_are_not_flagged():
+    assert AnomalyDetector(CONFIG).update(annual_df()).empty
+
+def test_injected_spike_is_flagged():
+    anomalies = AnomalyDetector(CONFIG).update(annual_df(spikes=[('Vietnam', 2015, 400)]))
+    assert len(anomalies) == 1
+    row = anomalies.iloc[0]
+    assert (row['country'], row['date'].year, row['metric']) == ('Vietnam', 2015, 'consumption_cups')
+    assert row['value'] - row['expected'] > 300
+    assert row['z'] > CONFIG['anomaly_detection']['z_threshold']
+
+def test_no_flags_during_warm_up():
+    # Cuarta observación: count = 3 < min_periods
+    anomalies = AnomalyDetector(CONFIG).update(annual_df(spikes=[('Brazil', 2003, 400)]))
+    assert anomalies.empty
+
+def test_spike_is_clipped_out_of_the_state():
+    clean = AnomalyDetector(CONFIG)
+    clean.update(annual_df(years=range(2000, 2016)))
+    spiked = AnomalyDetector(CONFIG)
+    spiked.update(annual_df(years=range(2000, 2016), spikes=[('Brazil', 2015, 5000)]))
+
+    limit = CONFIG['anomaly_detection']['z_threshold'] * np.sqrt(clean.resid_var[0, 0])
+    level_shift = abs(spiked.level[0, 0] - clean.level[0, 0])
+    # Sin recorte el nivel se movería alpha * 5000 = 1500 tazas
+    assert level_shift <= CONFIG['anomaly_detection']['alpha'] * 2 * limit
+    assert spiked.resid_var[0, 0] < 3 * clean.resid_var[0, 0]
+    # La otra serie no se ve afectada
+    np.testing.assert_allclose(spiked.level[1], clean.level[1])
+
+def test_second_spike_is_still_detected():
+    df = annual_df(spikes=[('Brazil', 2012, 400), ('Brazil', 2020, 400)])
+    anomalies = AnomalyDetector(CONFIG).update(df)
+    assert sorted(anomalies['date'].dt.year) == [2012, 2020]
+
+def test_already_processed_rows_are_skipped():
+    df = annual_df(years=range(2000, 2020))
+    detector = AnomalyDetector(CONFIG)
+    detector.update(df)
+    before = state(detector)
+
+    assert detector.update(df).empty
+    for name, values in before.items():
+        np.testing.assert_array_equal(getattr(detector, name), values)
+
+    # Re-alimentar todo el dataset con un año nuevo sólo procesa ese año
+    longer = annual_df(years=range(2000, 2021), spikes=[('Brazil', 2020, 400)])
+    anomalies = detector.update(longer)
+    assert list(anomalies['date'].dt.year) == [2020]
+    np.testing.assert_array_equal(detector.count, before['count'] + 1)
+    assert detector.last_date[0] == pd.Timestamp('2020-01-01').value
+
+def test_incremental_updates_match_single_batch():
+    df = annual_df(countries=('Brazil', 'Vietnam', 'Kenya'), spikes=[('Kenya', 2018, 500)])
+    # Series de distinta longitud: Kenya empieza más tarde
+    df = df[(df['country'] != 'Kenya') | (df['date'].dt.year >= 2006)]
+    batch = AnomalyDetector(CONFIG)
+    batch_anomalies = batch.update(df.sample(frac=1, random_state=0))
+
+    incremental = AnomalyDetector(CONFIG)
+    parts = [incremental.update(group) for _, group in df.groupby(df['date'].dt.year)]
+    incremental_anomalies = pd.concat(parts, ignore_index=True)
+
+    pd.testing.assert_frame_equal(
+        batch_anomalies.reset_index(drop=True), incremental_anomalies, check_dtype=False
+    )
+    # El orden de aparición de las series difiere; se compara por clave
+    for key in batch.keys:
+        b, i = batch._positions[key], incremental._positions[key]
+        for name in STATE_ARRAYS:
+            np.testing.assert_allclose(getattr(batch, name)[b], getattr(incremental, name)[i])
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / 'state' / 'detector')
+    first = annual_df(years=range(2000, 2020))
+    later = annual_df(years=range(2000, 2030), spikes=[('Vietnam', 2025, 400)])
+
+    detector = AnomalyDetector(CONFIG)
+    detector.update(first)
+    detector.save(path)
+    loaded = AnomalyDetector.load(CONFIG, path)
+
+    assert loaded.keys == detector.keys
+    for name, values in state(detector).items():
+        np.testing.assert_array_equal(getattr(loaded, name), values)
+    pd.testing.assert_frame_equal(loaded.update(later), detector.update(later))
+
+def test_load_without_compatible_state_starts_fresh(tmp_path):
+    path = str(tmp_path / 'detector')
+    assert AnomalyDetector.load(CONFIG, path).keys == []
+
+    detector = AnomalyDetector(CONFIG)
+    detector.update(annual_df())
+    detector.save(path)
+    fresh = AnomalyDetector.load(CONFIG, path, frequency='monthly')
+    assert fresh.keys == [] and fresh.n_seasons == 12
+
+def test_append_anomalies_deduplicates(tmp_path):
+    path = str(tmp_path / 'anomalies.parquet')
+    anomalies = AnomalyDetector(CONFIG).update(annual_df(spikes=[('Vietnam', 2015, 400)]))
+    append_anomalies(anomalies, path)
+    log = append_anomalies(anomalies, path)
+    assert len(log) == 1
+    assert len(pd.read_parquet(path)) == 1
+
+@pytest.mark.parametrize('frequency', ['quarterly', 'monthly'])
+def test_seasonal_pattern_is_not_flagged(frequency):
+    periods = {'quarterly': 4, 'monthly': 12}[frequency]
+    dates = pd.date_range('2010-01-01', periods=periods * 8, freq='QS' if periods == 4 else 'MS')
+    rng = np.random.default_rng(0)
+    season = np.arange(len(dates)) % periods
+    df = pd.DataFrame({
+        'country': 'Brazil', 'coffee_type': 'Arabica', 'date': dates,
+        'consumption_cups': 1000 + 200 * np.sin(2 * np.pi * season / periods) + rng.normal(0, 5, len(dates)),
+        'price_per_cup': 2.0 + rng.normal(0, 0.05, len(dates))
+    })
+    df.loc[len(df) - 3, 'consumption_cups'] += 400
+    anomalies = AnomalyDetector(CONFIG, frequency).update(df)
+    assert list(anomalies['date']) == [dates[-3]]
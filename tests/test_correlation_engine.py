@@ -0,0 +1,105 @@
+# tests/test_correlation_engine.py
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from correlation_engine import (
+    CorrelationAccumulator, correlation_from_frame, correlation_from_parquet
+)
+
+@pytest.fixture
+def frame():
+    """Correlated columns with scattered NaNs and a large offset"""
+    rng = np.random.default_rng(0)
+    n = 1000
+    base = rng.normal(size=n)
+    df = pd.DataFrame({
+        'a': base + rng.normal(scale=0.5, size=n),
+        'b': 1e6 + 100 * base + rng.normal(scale=30, size=n),
+        'c': rng.normal(size=n),
+        'd': -base + rng.normal(scale=2, size=n),
+        'segment': rng.choice(['x', 'y', 'z'], n)
+    })
+    for column, rate in (('a', 0.1), ('b', 0.3), ('d', 0.05)):
+        df.loc[rng.random(n) < rate, column] = np.nan
+    # Primeras filas todas ausentes en una columna: el primer bloque no fija su desplazamiento
+    df.loc[:120, 'd'] = np.nan
+    return df
+
+COLUMNS = ['a', 'b', 'c', 'd']
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 100, 333, 10000])
+def test_frame_matches_pandas_pairwise(frame, chunk_size):
+    result = correlation_from_frame(frame, COLUMNS, chunk_size=chunk_size)
+    pd.testing.assert_frame_equal(result, frame[COLUMNS].corr(), atol=1e-10, rtol=0)
+
+def test_segmented_matches_pandas_groupby(frame):
+    result = correlation_from_frame(frame, COLUMNS, segment_col='segment', chunk_size=97)
+    assert set(result) == {'x', 'y', 'z'}
+    for segment, rows in frame.groupby('segment'):
+        pd.testing.assert_frame_equal(result[segment], rows[COLUMNS].corr(), atol=1e-10, rtol=0)
+
+def test_merge_with_different_shifts(frame):
+    values = frame[COLUMNS].to_numpy()
+    whole = CorrelationAccumulator(COLUMNS).update(values)
+    # Cada parte fija su propio desplazamiento: merge debe re-desplazar
+    first = CorrelationAccumulator(COLUMNS).update(values[:400])
+    second = CorrelationAccumulator(COLUMNS).update(values[400:])
+    assert not np.array_equal(first.shift, second.shift)
+    merged = first.merge(second)
+
+    pd.testing.assert_frame_equal(merged.correlation(), whole.correlation(), atol=1e-10, rtol=0)
+    np.testing.assert_array_equal(merged.count, whole.count)
+    # Las otras partes no se modifican
+    assert not np.array_equal(second.shift, merged.shift)
+
+def test_merge_part_without_values_in_a_column(frame):
+    values = frame[COLUMNS].to_numpy()
+    # En las primeras 100 filas 'd' no tiene datos
+    first = CorrelationAccumulator(COLUMNS).update(values[:100])
+    assert np.isnan(first.shift[3])
+    second = CorrelationAccumulator(COLUMNS).update(values[100:])
+    for merged in (first.copy().merge(second), second.copy().merge(first)):
+        pd.testing.assert_frame_equal(merged.correlation(), frame[COLUMNS].corr(), atol=1e-10, rtol=0)
+
+def test_merge_into_empty_and_mismatched_columns(frame):
+    partial = CorrelationAccumulator(COLUMNS).update(frame[COLUMNS])
+    empty = CorrelationAccumulator(COLUMNS).merge(partial)
+    pd.testing.assert_frame_equal(empty.correlation(), partial.correlation())
+    with pytest.raises(ValueError):
+        partial.merge(CorrelationAccumulator(['a', 'b']))
+
+def test_constant_and_sparse_pairs_are_nan():
+    df = pd.DataFrame({'x': [1.0, 2.0, 3.0, 4.0], 'k': 5.0, 'y': [1.0, np.nan, np.nan, np.nan]})
+    result = correlation_from_frame(df, ['x', 'k', 'y'])
+    assert result.loc['x', 'x'] == 1.0
+    assert np.isnan(result.loc['x', 'k'])
+    assert np.isnan(result.loc['x', 'y'])
+    pd.testing.assert_frame_equal(result, df[['x', 'k', 'y']].corr())
+
+def write_row_groups(df, path, row_group_size):
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path, row_group_size=row_group_size)
+    return pq.ParquetFile(path).num_row_groups
+
+@pytest.mark.parametrize('n_jobs', [1, 2, 3, 16])
+@pytest.mark.parametrize('batch_size', [50, 4096])
+def test_parquet_matches_pandas(frame, tmp_path, n_jobs, batch_size):
+    path = str(tmp_path / 'data.parquet')
+    assert write_row_groups(frame, path, 130) > 1
+    result = correlation_from_parquet(path, batch_size=batch_size, n_jobs=n_jobs)
+    pd.testing.assert_frame_equal(result, frame[COLUMNS].corr(), atol=1e-10, rtol=0)
+
+def test_parquet_directory_by_segment(frame, tmp_path):
+    directory = tmp_path / 'store'
+    directory.mkdir()
+    write_row_groups(frame.iloc[:600], str(directory / 'part-0.parquet'), 200)
+    write_row_groups(frame.iloc[600:], str(directory / 'part-1.parquet'), 150)
+    result = correlation_from_parquet(str(directory), segment_col='segment', batch_size=64, n_jobs=3)
+    for segment, rows in frame.groupby('segment'):
+        pd.testing.assert_frame_equal(result[segment], rows[COLUMNS].corr(), atol=1e-10, rtol=0)
+
+def test_missing_parquet_store(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        correlation_from_parquet(str(tmp_path))
@@ -0,0 +1,83 @@
+# tests/test_filter_index.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from filter_index import BitmapFilterIndex
+
+CONFIG = {
+    'preprocessing': {
+        'date_column': 'year',
+        'country_column': 'country',
+        'coffee_type_column': 'coffee_type'
+    }
+}
+
+COUNTRIES = ['Brazil', 'Vietnam', 'Kenya', 'Colombia', 'Peru']
+TYPES = ['Arabica', 'Robusta', 'Blend']
+
+@pytest.fixture(scope='module')
+def df():
+    # Número de filas no múltiplo de 8 para cubrir el último byte parcial
+    rng = np.random.default_rng(0)
+    n = 1003
+    return pd.DataFrame({
+        'year': rng.integers(1990, 2021, n),
+        'country': rng.choice(COUNTRIES, n),
+        'coffee_type': rng.choice(TYPES, n),
+        'consumption_cups': rng.uniform(0, 100, n)
+    })
+
+@pytest.fixture(scope='module')
+def index(df):
+    return BitmapFilterIndex(CONFIG).build(df)
+
+def isin_mask(df, countries, coffee_types, year_range):
+    """Row filter the dashboard used before the index"""
+    return (
+        df['country'].isin(countries)
+        & df['coffee_type'].isin(coffee_types)
+        & (df['year'] >= year_range[0]) & (df['year'] <= year_range[1])
+    )
+
+SELECTIONS = [
+    (COUNTRIES, TYPES, (1990, 2020)),
+    (['Brazil'], TYPES, (1990, 2020)),
+    (['Kenya', 'Peru'], ['Blend'], (2000, 2010)),
+    (COUNTRIES, ['Arabica', 'Robusta'], (2020, 2020)),
+    (['Vietnam', 'Atlantis'], TYPES, (1985, 1995)),
+    ([], TYPES, (1990, 2020)),
+    (COUNTRIES, [], (1990, 2020)),
+    (COUNTRIES, TYPES, (2030, 2040)),
+    (COUNTRIES, TYPES, (2005, 2004))
+]
+
+@pytest.mark.parametrize('countries, coffee_types, year_range', SELECTIONS)
+def test_query_matches_isin_mask(df, index, countries, coffee_types, year_range):
+    expected = np.flatnonzero(isin_mask(df, countries, coffee_types, year_range).to_numpy())
+    positions = index.query(countries, coffee_types, year_range)
+    np.testing.assert_array_equal(positions, expected)
+    pd.testing.assert_frame_equal(index.take(df, positions), df[isin_mask(df, countries, coffee_types, year_range)])
+
+def test_all_selected_returns_every_row_without_copy(df, index):
+    positions = index.query(COUNTRIES, TYPES, (1990, 2020))
+    np.testing.assert_array_equal(positions, np.arange(len(df)))
+    np.testing.assert_array_equal(index.query(), np.arange(len(df)))
+    assert index.take(df, positions) is df
+
+def test_empty_selection(df, index):
+    positions = index.query([], TYPES, (1990, 2020))
+    assert len(positions) == 0
+    assert index.take(df, positions).empty
+
+def test_contiguous_rows_are_sliced():
+    df = pd.DataFrame({
+        'year': [2000] * 5 + [2001] * 5,
+        'country': ['Brazil'] * 10,
+        'coffee_type': ['Arabica'] * 10
+    })
+    index = BitmapFilterIndex(CONFIG).build(df)
+    positions = index.query(year_range=(2001, 2001))
+    np.testing.assert_array_equal(positions, np.arange(5, 10))
+    taken = index.take(df, positions, columns=['year'])
+    assert list(taken.index) == list(range(5, 10)) and list(taken.columns) == ['year']
@@ -0,0 +1,74 @@
+# tests/test_job_runner.py
+import os
+import time
+import threading
+
+from job_runner import JobRunner, COMPLETED, FAILED, RUNNING
+
+def wait_for(runner, job_id, statuses, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = runner.get_job(job_id)
+        if job['status'] in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} still {runner.get_job(job_id)['status']}")
+
+def make_runner(tmp_path, **options):
+    return JobRunner(str(tmp_path / 'jobs.sqlite'), str(tmp_path / 'results'), **options)
+
+def test_second_runner_does_not_fail_live_jobs(tmp_path):
+    release = threading.Event()
+    first = make_runner(tmp_path, heartbeat_seconds=0.05)
+
+    def slow_job(context):
+        release.wait(5)
+        return 42
+
+    job_id = first.submit('slow', slow_job)
+    wait_for(first, job_id, {RUNNING})
+
+    # Otro proceso del servidor (o el mismo tras recargar el código) crea su propio runner
+    second = make_runner(tmp_path, heartbeat_seconds=0.05)
+    time.sleep(0.3)
+    assert second.get_job(job_id)['status'] == RUNNING
+
+    release.set()
+    assert wait_for(first, job_id, {COMPLETED})['status'] == COMPLETED
+    assert second.get_result(job_id) == 42
+    first.close()
+    second.close()
+
+def test_jobs_of_a_dead_runner_are_failed(tmp_path):
+    first = make_runner(tmp_path, heartbeat_seconds=0.05)
+    job_id = first.submit('slow', lambda context: time.sleep(0.5))
+    wait_for(first, job_id, {RUNNING})
+    # Simula la caída del proceso: deja de latir sin terminar el trabajo
+    first._stop.set()
+    first._execute("UPDATE runners SET heartbeat_at = 0 WHERE owner = ?", (first.owner,))
+
+    second = make_runner(tmp_path, heartbeat_seconds=0.05)
+    job = second.get_job(job_id)
+    assert job['status'] == FAILED
+    assert job['error'] == 'Interrupted by a server restart'
+    second.close()
+
+def test_cleanup_removes_expired_jobs_and_results(tmp_path):
+    runner = make_runner(tmp_path, retention_seconds=3600)
+    job_id = runner.submit('quick', lambda context: {'value': 1})
+    job = wait_for(runner, job_id, {COMPLETED})
+    assert os.path.exists(job['result_path'])
+
+    orphan = tmp_path / 'results' / 'orphan.joblib'
+    orphan.write_bytes(b'')
+    old = time.time() - 7200
+    os.utime(orphan, (old, old))
+    runner._update(job_id)
+    assert runner.cleanup() == 0
+
+    runner._execute("UPDATE jobs SET updated_at = ? WHERE job_id = ?", (old, job_id))
+    assert runner.cleanup() == 1
+    assert runner.get_job(job_id) is None
+    assert not os.path.exists(job['result_path'])
+    assert not orphan.exists()
+    runner.close()
@@ -0,0 +1,224 @@
+# tests/test_llm_client.py
+import json
+import time
+import asyncio
+import threading
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from llm_client import AsyncLLMClient
+
+class MockOpenAI:
+    """Local OpenAI-compatible server that streams chat completions as SSE
+
+    Each request takes the next behaviour from `script`: 'ok' streams the
+    tokens, 'error' answers 500, 'stall' sends nothing, 'stall_after_first'
+    sends one token and then stalls. Stalling handlers keep writing SSE
+    comments so they notice when the client closes the connection.
+    """
+
+    def __init__(self, script, tokens=('Hola', ' mundo')):
+        self.script = list(script)
+        self.tokens = tokens
+        self.requests = 0
+        self.disconnects = 0
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers['Content-Length']))
+                with mock._lock:
+                    mock.requests += 1
+                    behaviour = mock.script.pop(0) if mock.script else 'ok'
+                if behaviour == 'error':
+                    body = json.dumps({'error': {'message': 'boom', 'type': 'server_error'}}).encode()
+                    self.send_response(500)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                try:
+                    if behaviour == 'ok':
+                        for token in mock.tokens:
+                            self._event(token)
+                        self.wfile.write(b"data: [DONE]\n\n")
+                        self.wfile.flush()
+                        return
+                    if behaviour == 'stall_after_first':
+                        self._event(mock.tokens[0])
+                    while not mock.release.wait(0.05):
+                        self.wfile.write(b": keep-alive\n\n")
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    with mock._lock:
+                        mock.disconnects += 1
+
+            def _event(self, token):
+                chunk = {
+                    'id': 'chatcmpl-test', 'object': 'chat.completion.chunk', 'created': 0,
+                    'model': 'test', 'choices': [{'index': 0, 'delta': {'content': token}, 'finish_reason': None}]
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def wait_disconnects(self, expected, timeout=5.0):
+        deadline = time.time() + timeout
+        while time.time() < deadline and self.disconnects < expected:
+            time.sleep(0.02)
+        return self.disconnects
+
+    def close(self):
+        self.release.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def make_client():
+    created = []
+
+    def factory(script, **options):
+        server = MockOpenAI(script)
+        client = AsyncLLMClient('test-key', base_url=server.url, **options)
+        created.append((server, client))
+        return server, client
+
+    yield factory
+    for server, client in created:
+        server.close()
+        client.close()
+
+MESSAGES = [{'role': 'user', 'content': 'hola'}]
+
+def test_streams_tokens(make_client):
+    server, client = make_client(['ok'])
+    assert list(client.stream_chat(MESSAGES, model='test')) == ['Hola', ' mundo']
+    assert server.requests == 1
+
+def test_retries_before_first_token_without_sdk_retries(make_client):
+    server, client = make_client(['error', 'error', 'ok'], max_retries=2)
+    assert client.complete(MESSAGES, model='test') == 'Hola mundo'
+    # max_retries + 1 intentos como máximo; el SDK no reintenta por su cuenta
+    assert server.requests == 3
+
+def test_gives_up_after_max_retries(make_client):
+    server, client = make_client(['error'] * 10, max_retries=1)
+    with pytest.raises(Exception):
+        client.complete(MESSAGES, model='test')
+    assert server.requests == 2
+
+def test_first_token_timeout_closes_connection(make_client):
+    server, client = make_client(['stall', 'ok'], max_retries=1, first_token_timeout=0.3)
+    assert client.complete(MESSAGES, model='test') == 'Hola mundo'
+    assert server.requests == 2
+    assert server.wait_disconnects(1) == 1
+
+def test_mid_stream_stall_is_not_retried_and_closes_connection(make_client):
+    server, client = make_client(['stall_after_first'], max_retries=2, timeout=0.3)
+    tokens = []
+    with pytest.raises(Exception):
+        for token in client.stream_chat(MESSAGES, model='test'):
+            tokens.append(token)
+    assert tokens == ['Hola']
+    assert server.requests == 1
+    assert server.wait_disconnects(1) == 1
+
+def test_abandoned_stream_is_cancelled_and_closed(make_client):
+    server, client = make_client(['stall_after_first'], timeout=30)
+    stream = client.stream_chat(MESSAGES, model='test')
+    assert next(stream) == 'Hola'
+    # La sesión deja de leer (p. ej. Streamlit recarga la página)
+    stream.close()
+    assert server.wait_disconnects(1) == 1
+
+def test_concurrency_is_limited(make_client):
+    server, client = make_client(['stall'] * 3, max_concurrency=2, first_token_timeout=30)
+    streams = [client.stream_chat(MESSAGES, model='test') for _ in range(3)]
+    threads = [threading.Thread(target=lambda s=s: list(s), daemon=True) for s in streams]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.5)
+    assert server.requests == 2
+    server.release.set()
+    for thread in threads:
+        thread.join(5)
+    assert server.requests == 3
+
+class FakeStream:
+    """SDK stream stand-in: yields the given items (exceptions are raised, None stalls)"""
+
+    def __init__(self, items):
+        self.items = list(items)
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.items:
+            raise StopAsyncIteration
+        item = self.items.pop(0)
+        if item is None:
+            await asyncio.sleep(3600)
+        if isinstance(item, Exception):
+            raise item
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=item))])
+
+    async def close(self):
+        self.closed = True
+
+class FakeClient:
+    def __init__(self, streams):
+        self.streams = streams
+        self.opened = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **params):
+        stream = self.streams[len(self.opened)]
+        self.opened.append(stream)
+        return stream
+
+@pytest.mark.parametrize('items', [
+    ['a', 'b'],                       # fin normal
+    ['a', RuntimeError('corte')],     # error a mitad del stream
+    ['a', None],                      # timeout entre tokens
+])
+def test_stream_is_always_closed(items):
+    stream = FakeStream(items)
+    client = AsyncLLMClient('test-key', timeout=0.2, max_retries=0, client=FakeClient([stream]))
+    try:
+        try:
+            client.complete(MESSAGES)
+        except Exception:
+            pass
+        assert stream.closed
+    finally:
+        client.close()
+
+def test_every_retried_stream_is_closed():
+    streams = [FakeStream([None]), FakeStream([RuntimeError('x')]), FakeStream(['ok'])]
+    client = AsyncLLMClient('test-key', first_token_timeout=0.2, max_retries=2, client=FakeClient(streams))
+    try:
+        assert client.complete(MESSAGES) == 'ok'
+        assert all(stream.closed for stream in streams)
+    finally:
+        client.close()
@@ -0,0 +1,108 @@
+# tests/test_local_query.py
+import pytest
+
+from generative_ai_chatbot import CoffeeAnalyticsChatbot
+from local_query import LocalQueryEngine
+
+def make_chatbot(df, llm, fingerprint='test'):
+    return CoffeeAnalyticsChatbot(df, 'test-key', llm=llm, data_fingerprint=fingerprint)
+
+def parse(chatbot, question):
+    builder = chatbot.context_builder()
+    return LocalQueryEngine(chatbot.df, builder.fingerprint, builder).parse(question)
+
+def test_lookup_is_answered_locally(coffee_df, stub_llm):
+    chatbot = make_chatbot(coffee_df, stub_llm)
+    answer = chatbot.ask_question("¿Cuál fue el consumo en Brasil en 2020?")
+    # Brazil 2020: (100 + 2) + (110 + 2)
+    assert answer == "El consumo de Brazil en 2020 fue de 214 tazas."
+    assert stub_llm.calls == []
+
+def test_total_without_year_uses_full_range(coffee_df, stub_llm):
+    chatbot = make_chatbot(coffee_df, stub_llm)
+    answer = chatbot.ask_question("consumo total de Brazil")
+    assert "2018-2020" in answer
+    assert "636 tazas" in answer
+    assert stub_llm.calls == []
+
+def test_average_without_year_uses_full_range(coffee_df, stub_llm):
+    chatbot = make_chatbot(coffee_df, stub_llm)
+    answer = chatbot.ask_question("consumo promedio de Vietnam")
+    assert "2018-2020" in answer
+    assert "206.0 tazas" in answer
+
+def test_top_uses_last_year(coffee_df, stub_llm):
+    chatbot = make_chatbot(coffee_df, stub_llm)
+    answer = chatbot.ask_question("¿Qué país consume más café?")
+    assert answer.startswith("Ethiopia tuvo el mayor consumo en 2020")
+
+def test_growth(coffee_df, stub_llm):
+    chatbot = make_chatbot(coffee_df, stub_llm)
+    answer = chatbot.ask_question("crecimiento del consumo de Ethiopia")
+    assert "en 2018" in answer and "en 2020" in answer
+
+def test_country_not_in_data_goes_to_llm(coffee_df, stub_llm):
+    chatbot = make_chatbot(coffee_df, stub_llm)
+    for question in ("consumo en Colombia en 2020", "consumo en colombia en 2020", "consumo en Japón"):
+        assert chatbot.local_answer(question) is None
+    assert chatbot.ask_question("consumo en Colombia en 2020") == "respuesta del LLM"
+    assert len(stub_llm.calls) == 1
+
+def test_unknown_place_goes_to_llm(coffee_df, stub_llm):
+    chatbot = make_chatbot(coffee_df, stub_llm)
+    assert chatbot.local_answer("consumo en Springfield en 2020") is None
+
+def test_open_ended_goes_to_llm(coffee_df, stub_llm):
+    chatbot = make_chatbot(coffee_df, stub_llm)
+    assert chatbot.local_answer("¿Por qué creció el consumo en Brasil?") is None
+
+def test_year_outside_data_goes_to_llm(coffee_df, stub_llm):
+    chatbot = make_chatbot(coffee_df, stub_llm)
+    assert chatbot.local_answer("consumo en Brasil en 1995") is None
+
+def test_llm_error_is_reported(coffee_df):
+    from conftest import StubLLM
+    chatbot = make_chatbot(coffee_df, StubLLM(error=RuntimeError("sin conexión")))
+    assert chatbot.ask_question("explica el mercado") == "Error al procesar la pregunta: sin conexión"
+
+def test_consumption_question_with_year_is_a_lookup(coffee_df, stub_llm):
+    chatbot = make_chatbot(coffee_df, stub_llm)
+    # "consumo" contiene "sum": la intención no debe detectarse por subcadenas
+    assert parse(chatbot, "¿Cuál fue el consumo de Brasil en 2020?")['intent'] == 'lookup'
+    # "mayoristas" y "disminuyó" no son "mayor"/"cambio"
+    assert parse(chatbot, "consumo de los mayoristas de Brasil en 2020")['intent'] == 'lookup'
+    assert parse(chatbot, "consumo de Brasil intercambio 2020")['intent'] == 'lookup'
+
+def test_question_without_year_uses_last_year_for_both_metrics(coffee_df, stub_llm):
+    chatbot = make_chatbot(coffee_df, stub_llm)
+    assert chatbot.local_answer("consumo de Brasil") == "El consumo de Brazil en 2020 fue de 214 tazas."
+    assert chatbot.local_answer("precio de Brasil") == "El precio promedio por taza de Brazil en 2020 fue de $2.25."
+
+@pytest.fixture
+def priced_df(coffee_df):
+    # Precio distinto por país y creciente en el tiempo; Brazil es el más caro
+    country_premium = coffee_df['country'].map({'Brazil': 2.0, 'Vietnam': 0.0, 'Ethiopia': 1.0})
+    coffee_df['price_per_cup'] = coffee_df['price_per_cup'] + country_premium + 0.25 * (coffee_df['year'] - 2018)
+    return coffee_df
+
+def test_price_top_ranks_by_mean_price(priced_df, stub_llm):
+    chatbot = make_chatbot(priced_df, stub_llm, fingerprint='priced')
+    answer = chatbot.local_answer("¿Qué país tiene el mayor precio en 2020?")
+    # Brazil 2020: (4.5 + 5.0) / 2; Ethiopia tiene más consumo pero menor precio
+    assert answer == "Brazil tuvo el mayor precio promedio en 2020: $4.75 por taza."
+
+    ranking = chatbot.local_answer("ranking de países por menor precio en 2018")
+    assert ranking.splitlines() == [
+        "Top 3 países por menor precio promedio en 2018:",
+        "1. Vietnam: $2.25 por taza",
+        "2. Ethiopia: $3.25 por taza",
+        "3. Brazil: $4.25 por taza"
+    ]
+    assert stub_llm.calls == []
+
+def test_price_growth_uses_mean_price(priced_df, stub_llm):
+    chatbot = make_chatbot(priced_df, stub_llm, fingerprint='priced')
+    answer = chatbot.local_answer("crecimiento del precio de Vietnam")
+    # 2.25 -> 2.75 en dos años
+    assert answer.startswith("El precio promedio por taza de Vietnam pasó de $2.25 por taza en 2018 "
+                             "a $2.75 por taza en 2020 (+22.2%")
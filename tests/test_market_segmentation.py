@@ -0,0 +1,131 @@
+# tests/test_market_segmentation.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from market_segmentation import MarketSegmentation
+
+@pytest.fixture
+def config(tmp_path):
+    return {
+        'preprocessing': {
+            'date_column': 'year',
+            'country_column': 'country',
+            'coffee_type_column': 'coffee_type',
+            'consumption_column': 'consumption_cups',
+            'price_column': 'price_per_cup'
+        },
+        'segmentation': {
+            'n_clusters': 3,
+            'k_range': [2, 4],
+            'batch_size': 16,
+            'n_epochs': 2,
+            'silhouette_sample_size': 100,
+            'n_jobs': 1,
+            'random_state': 42,
+            'cache_dir': str(tmp_path / 'cache'),
+            'model_path': str(tmp_path / 'segmentation_model.joblib')
+        }
+    }
+
+@pytest.fixture
+def series_df():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame([
+        {'country': f'C{c}', 'coffee_type': coffee_type, 'year': year,
+         'consumption_cups': rng.uniform(50, 500), 'price_per_cup': 2.0}
+        for c in range(10) for coffee_type in ('Arabica', 'Robusta') for year in range(2000, 2021)
+    ])
+
+@pytest.mark.parametrize('mode', ['kmeans', 'minibatch'])
+def test_segmentation_job_views(config, series_df, mode):
+    """Same sequence as the background segmentation job"""
+    segmenter = MarketSegmentation(config)
+    data = segmenter.prepare_clustering_data(series_df)
+    if mode == 'kmeans':
+        clusters, _ = segmenter.perform_kmeans_clustering(data)
+    else:
+        clusters, _, _ = segmenter.perform_minibatch_clustering(data)
+
+    figure = segmenter.visualize_clusters(data, clusters)
+    hover = {(trace_point[0], trace_point[1]) for trace in figure.data for trace_point in trace.customdata}
+    assert hover == set(zip(data['country'], data['coffee_type']))
+
+    growth = segmenter.identify_growth_markets(data, clusters)
+    assert 'growth_score' in growth.columns
+    assert len(growth) == len(np.unique(clusters))
+
+LEVELS = {'low': 100.0, 'mid': 1000.0, 'high': 2000.0}
+
+def segment_df(levels=LEVELS, countries_per_level=4, seed=0):
+    """Series in well separated consumption levels (country name starts with the level)
+
+    Every series has the same relative yearly pattern, so all the clustering
+    features (mean, std, sum) scale with the level.
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame([
+        {'country': f'{level}{c}', 'coffee_type': coffee_type, 'year': year,
+         'consumption_cups': value * (1 + 0.1 * np.sin(year)) * rng.uniform(0.995, 1.005),
+         'price_per_cup': 2.0}
+        for level, value in levels.items() for c in range(countries_per_level)
+        for coffee_type in ('Arabica', 'Robusta') for year in range(2010, 2021)
+    ])
+
+def segments_by_level(assignments):
+    """Segment label of each level (every series of a level must share it)"""
+    level = assignments['country'].str.rstrip('0123456789')
+    labels = assignments.groupby(level)['segment'].unique()
+    assert labels.map(len).eq(1).all()
+    return {name: int(values[0]) for name, values in labels.items()}
+
+def test_first_fit_numbers_segments_by_consumption(config):
+    assignments = MarketSegmentation(config).fit_segment_model(segment_df())
+    assert segments_by_level(assignments) == {'low': 0, 'mid': 1, 'high': 2}
+
+def test_refit_with_same_k_keeps_labels(config):
+    segmenter = MarketSegmentation(config)
+    segmenter.fit_segment_model(segment_df())
+    # Etiquetas no consecutivas persistidas: deben heredarse tal cual
+    segmenter.segment_model['segment_labels'] = np.array([7, 3, 5])
+    segmenter.save_segment_model()
+
+    refit = MarketSegmentation(config).fit_segment_model(segment_df(seed=1))
+    assert segments_by_level(refit) == {'low': 7, 'mid': 3, 'high': 5}
+
+def test_refit_with_smaller_k_then_larger_k(config):
+    MarketSegmentation(config).fit_segment_model(segment_df())
+
+    without_mid = {'low': LEVELS['low'], 'high': LEVELS['high']}
+    smaller = MarketSegmentation(config).fit_segment_model(segment_df(without_mid), n_clusters=2)
+    assert segments_by_level(smaller) == {'low': 0, 'high': 2}
+
+    # El segmento que reaparece recibe una etiqueta nueva, sin chocar con las previas
+    larger = MarketSegmentation(config).fit_segment_model(segment_df(seed=2))
+    assert segments_by_level(larger) == {'low': 0, 'high': 2, 'mid': 3}
+
+def test_assign_segments_matches_fit(config):
+    df = segment_df()
+    fitted = MarketSegmentation(config).fit_segment_model(df)
+    assigned = MarketSegmentation(config).assign_segments(df[df['country'].str.startswith('mid')])
+    expected = fitted.set_index(['country', 'coffee_type'])['segment']
+    assert (assigned.set_index(['country', 'coffee_type'])['segment'] == expected.loc[
+        assigned.set_index(['country', 'coffee_type']).index]).all()
+
+def test_update_segments_refits_only_on_drift(config):
+    df = segment_df()
+    segmenter = MarketSegmentation(config)
+    segmenter.fit_segment_model(df)
+
+    same = df[~df['country'].str.startswith('high')]
+    assignments, refitted = segmenter.update_segments(same, full_df=df)
+    assert not refitted
+    assert set(assignments['segment']) == {0, 1}
+
+    # Series nuevas muy lejos de todos los segmentos
+    new = segment_df({'huge': 50 * LEVELS['high']}, countries_per_level=2)
+    full = pd.concat([df, new], ignore_index=True)
+    assignments, refitted = segmenter.update_segments(new, full_df=full)
+    assert refitted
+    assert len(assignments) == 4 and assignments['segment'].notna().all()
+    assert set(segmenter.segment_model['assignments']['country']) == set(full['country'])
@@ -0,0 +1,188 @@
+# tests/test_metrics.py
+import json
+import functools
+import threading
+import urllib.request
+
+import pytest
+
+import metrics
+from metrics import MetricsRegistry, MetricsExporter
+
+CATALOG = {
+    'requests_total': ('counter', "Requests by result"),
+    'latency_seconds': ('histogram', "Request latency")
+}
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry(CATALOG)
+
+def test_counter_text_format(registry):
+    registry.inc('requests_total', result='hit')
+    registry.inc('requests_total', 2, result='hit')
+    registry.inc('requests_total', result='miss')
+    registry.inc('requests_total', 0.5, result='say "hi"\n\\')
+    assert registry.prometheus_text() == (
+        '# HELP requests_total Requests by result\n'
+        '# TYPE requests_total counter\n'
+        'requests_total{result="hit"} 3\n'
+        'requests_total{result="miss"} 1\n'
+        'requests_total{result="say \\"hi\\"\\n\\\\"} 0.5\n'
+    )
+
+def test_histogram_text_format():
+    registry = MetricsRegistry(CATALOG)
+    registry.metric('latency_seconds', 'histogram').buckets = (0.1, 1.0)
+    # Los límites son inclusivos (le): 0.1 cae en el primer bucket
+    for value in (0.05, 0.1, 0.5, 2.0):
+        registry.observe('latency_seconds', value, page='home')
+    assert registry.prometheus_text() == (
+        '# HELP latency_seconds Request latency\n'
+        '# TYPE latency_seconds histogram\n'
+        'latency_seconds_bucket{page="home",le="0.1"} 2\n'
+        'latency_seconds_bucket{page="home",le="1.0"} 3\n'
+        'latency_seconds_bucket{page="home",le="+Inf"} 4\n'
+        'latency_seconds_sum{page="home"} 2.65\n'
+        'latency_seconds_count{page="home"} 4\n'
+    )
+
+def test_metrics_without_labels_and_kind_mismatch(registry):
+    registry.inc('requests_total')
+    assert 'requests_total 1\n' in registry.prometheus_text()
+    with pytest.raises(ValueError):
+        registry.observe('requests_total', 1.0)
+
+def test_snapshot_quantiles(registry):
+    for value in [0.002] * 50 + [0.2] * 50:
+        registry.observe('latency_seconds', value)
+    series = registry.snapshot()['metrics']['latency_seconds']['series'][0]
+    assert series['count'] == 100
+    assert series['mean'] == pytest.approx(0.101)
+    # p50 cae al final del bucket (0.001, 0.0025]; p99 dentro de (0.1, 0.25]
+    assert series['p50'] == pytest.approx(0.0025)
+    assert 0.1 < series['p99'] <= 0.25
+
+def test_timed_as_context_manager_and_decorator(registry, monkeypatch):
+    clock = iter([10.0, 10.5, 20.0, 20.25, 30.0, 31.0])
+    monkeypatch.setattr(metrics.time, 'perf_counter', lambda: next(clock))
+
+    with registry.timed('latency_seconds', page='home'):
+        pass
+
+    @registry.timed('latency_seconds', page='api')
+    def handler(fail=False):
+        if fail:
+            raise RuntimeError("fallo")
+        return 'ok'
+
+    assert handler() == 'ok'
+    # Las excepciones se propagan y la duración se registra igualmente
+    with pytest.raises(RuntimeError):
+        handler(fail=True)
+
+    series = {
+        entry['labels']['page']: entry
+        for entry in registry.snapshot()['metrics']['latency_seconds']['series']
+    }
+    assert series['home']['sum'] == 0.5
+    assert (series['api']['count'], series['api']['sum']) == (2, 1.25)
+
+def test_timed_decorator_is_reentrant(registry):
+    @registry.timed('latency_seconds')
+    def recurse(depth):
+        return recurse(depth - 1) if depth else 0
+
+    recurse(3)
+    assert registry.snapshot()['metrics']['latency_seconds']['series'][0]['count'] == 4
+
+def test_concurrent_updates_are_not_lost(registry):
+    def work():
+        for _ in range(1000):
+            registry.inc('requests_total', result='hit')
+            registry.observe('latency_seconds', 0.01, page='home')
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    snapshot = registry.snapshot()['metrics']
+    assert snapshot['requests_total']['series'][0]['value'] == 8000
+    assert snapshot['latency_seconds']['series'][0]['count'] == 8000
+
+def test_cached_counts_hits_and_misses(monkeypatch):
+    registry = MetricsRegistry()
+    monkeypatch.setattr(metrics, 'REGISTRY', registry)
+    builds = []
+
+    @metrics.cached('squares', functools.lru_cache(maxsize=None))
+    def square(x):
+        builds.append(x)
+        return x * x
+
+    assert [square(2), square(2), square(3), square(2)] == [4, 4, 9, 4]
+    assert builds == [2, 3]
+    results = {
+        entry['labels']['result']: entry['value']
+        for entry in registry.snapshot()['metrics']['cache_requests_total']['series']
+    }
+    assert results == {'hit': 2, 'miss': 2}
+    lookups = registry.snapshot()['metrics']['cache_lookup_seconds']['series']
+    assert lookups[0]['labels'] == {'cache': 'squares'} and lookups[0]['count'] == 4
+
+def test_cached_nested_lookups_are_attributed_separately(monkeypatch):
+    registry = MetricsRegistry()
+    monkeypatch.setattr(metrics, 'REGISTRY', registry)
+
+    @metrics.cached('inner', functools.lru_cache(maxsize=None))
+    def inner():
+        return 1
+
+    @metrics.cached('outer', functools.lru_cache(maxsize=None))
+    def outer(x):
+        # Un acierto interno no convierte el fallo externo en acierto
+        return inner() + x
+
+    inner()
+    outer(1)
+    counts = {
+        (entry['labels']['cache'], entry['labels']['result']): entry['value']
+        for entry in registry.snapshot()['metrics']['cache_requests_total']['series']
+    }
+    assert counts == {('inner', 'miss'): 1, ('inner', 'hit'): 1, ('outer', 'miss'): 1}
+
+def exporter_config(tmp_path, enabled=True):
+    return {'metrics': {
+        'enabled': enabled,
+        'host': '127.0.0.1',
+        'port': 0,
+        'snapshot_path': str(tmp_path / 'snapshot-{pid}.json'),
+        'snapshot_interval_seconds': 3600
+    }}
+
+def test_disabled_registry_records_nothing(tmp_path, registry):
+    exporter = MetricsExporter(exporter_config(tmp_path, enabled=False), registry).start()
+    registry.inc('requests_total')
+    registry.observe('latency_seconds', 0.1)
+    with registry.timed('latency_seconds'):
+        pass
+    assert registry.prometheus_text() == '\n'
+    assert exporter.server is None and exporter.snapshot_path is None
+    exporter.stop()
+    assert list(tmp_path.iterdir()) == []
+
+def test_exporter_serves_text_and_json(tmp_path, registry):
+    exporter = MetricsExporter(exporter_config(tmp_path), registry).start()
+    try:
+        registry.inc('requests_total', result='hit')
+        base = f"http://127.0.0.1:{exporter.server.server_address[1]}"
+        with urllib.request.urlopen(f"{base}/metrics") as response:
+            assert response.headers['Content-Type'] == 'text/plain; version=0.0.4; charset=utf-8'
+            assert 'requests_total{result="hit"} 1' in response.read().decode()
+        with urllib.request.urlopen(f"{base}/metrics.json") as response:
+            assert json.load(response)['metrics']['requests_total']['series'][0]['value'] == 1
+    finally:
+        exporter.stop()
+    with open(exporter.snapshot_path) as file:
+        assert json.load(file)['metrics']['requests_total']['type'] == 'counter'
@@ -0,0 +1,129 @@
+# tests/test_pipeline.py
+import json
+import threading
+
+import pytest
+import yaml
+
+import pipeline
+from pipeline import Pipeline, COMPLETED, FAILED, SKIPPED
+from shared_dataset import publish_dataset, current_version
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    # setup_logging escribe el log en el directorio actual
+    monkeypatch.chdir(tmp_path)
+    return {
+        'data': {'shared_dir': str(tmp_path / 'shared')},
+        'pipeline': {'state_path': str(tmp_path / 'state.json'), 'max_workers': 2},
+        'metrics': {'enabled': False}
+    }
+
+class StubStages:
+    """Graph process -> (a, b), a -> c with stages that record their runs"""
+
+    def __init__(self, df, failing=()):
+        self.df = df
+        self.failing = set(failing)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _record(self, name, context):
+        with self._lock:
+            self.calls.append(name)
+        assert context['df'] is not None
+        if name in self.failing:
+            raise RuntimeError(f"{name} falló")
+        return {'rows': len(context['df'])}
+
+    def process(self, context):
+        publish_dataset(self.df, context['config']['data']['shared_dir'])
+        context['df'] = self.df
+        with self._lock:
+            self.calls.append('process')
+        return {'rows': len(self.df)}
+
+    def graph(self):
+        stage = lambda name: (lambda context: self._record(name, context))
+        return {
+            'process': (self.process, ()),
+            'a': (stage('a'), ('process',)),
+            'b': (stage('b'), ('process',)),
+            'c': (stage('c'), ('a',))
+        }
+
+@pytest.fixture
+def stages(coffee_df, monkeypatch):
+    stubs = StubStages(coffee_df)
+    monkeypatch.setattr(pipeline, 'STAGES', stubs.graph())
+    return stubs
+
+def test_stages_run_after_their_dependencies(config, stages):
+    statuses = Pipeline(config).run()
+    assert statuses == {'process': COMPLETED, 'a': COMPLETED, 'b': COMPLETED, 'c': COMPLETED}
+    assert stages.calls[0] == 'process'
+    assert stages.calls.index('a') < stages.calls.index('c')
+    assert sorted(stages.calls) == ['a', 'b', 'c', 'process']
+
+    with open(config['pipeline']['state_path']) as file:
+        state = json.load(file)
+    version = current_version(config['data']['shared_dir'])
+    assert all(entry['data_version'] == version for entry in state['stages'].values())
+    assert state['last_run'] == statuses
+
+def test_resume_skips_completed_stages(config, stages):
+    Pipeline(config).run()
+    stages.calls.clear()
+    statuses = Pipeline(config).run(resume=True)
+    assert stages.calls == []
+    assert set(statuses.values()) == {COMPLETED}
+
+    # Sin --resume se ejecuta todo otra vez
+    Pipeline(config).run()
+    assert sorted(stages.calls) == ['a', 'b', 'c', 'process']
+
+def test_resume_reruns_failed_stage_and_its_dependents(config, stages):
+    stages.failing = {'a'}
+    assert Pipeline(config).run() == {'process': COMPLETED, 'a': FAILED, 'b': COMPLETED, 'c': SKIPPED}
+    assert 'c' not in stages.calls
+
+    stages.failing = set()
+    stages.calls.clear()
+    statuses = Pipeline(config).run(resume=True)
+    # process no se repite: a y c leen el dataset publicado
+    assert sorted(stages.calls) == ['a', 'c']
+    assert set(statuses.values()) == {COMPLETED}
+
+def test_resume_reruns_everything_when_the_dataset_changes(config, stages, coffee_df):
+    Pipeline(config).run()
+    publish_dataset(coffee_df.head(5), config['data']['shared_dir'])
+    stages.calls.clear()
+    Pipeline(config).run(resume=True)
+    assert sorted(stages.calls) == ['a', 'b', 'c', 'process']
+
+def test_selected_stages_read_the_published_dataset(config, stages):
+    with pytest.raises(FileNotFoundError):
+        Pipeline(config, stages=['b']).run()
+
+    Pipeline(config, stages=['process']).run()
+    stages.calls.clear()
+    # Las dependencias no pedidas no se ejecutan
+    assert Pipeline(config, stages=['c', 'a']).run() == {'a': COMPLETED, 'c': COMPLETED}
+    assert stages.calls == ['a', 'c']
+
+def test_unknown_stage(config, stages):
+    with pytest.raises(ValueError):
+        Pipeline(config, stages=['a', 'deploy'])
+
+def test_exit_code(config, stages, tmp_path):
+    config_path = tmp_path / 'parameters.yaml'
+    config_path.write_text(yaml.safe_dump(config))
+    assert pipeline.main(['--config', str(config_path)]) == 0
+
+    stages.failing = {'b'}
+    assert pipeline.main(['--config', str(config_path)]) == 1
+    # Tras corregir el fallo, --resume sólo repite la etapa fallida
+    stages.failing = set()
+    stages.calls.clear()
+    assert pipeline.main(['--config', str(config_path), '--resume']) == 0
+    assert stages.calls == ['b']
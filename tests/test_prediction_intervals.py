@@ -0,0 +1,115 @@
+# tests/test_prediction_intervals.py
+import numpy as np
+import pandas as pd
+import pytest
+
+# predictive_modeling importa los modelos de boosting y mlflow al cargarse
+for module in ('xgboost', 'lightgbm', 'mlflow'):
+    pytest.importorskip(module)
+
+from sklearn.ensemble import RandomForestRegressor
+
+from predictive_modeling import PredictiveModeling
+
+ALPHA = 0.1
+CONFIG = {'prediction_intervals': {'alpha': ALPHA, 'min_group_size': 10}}
+
+class MeanModel:
+    """Predicts the noiseless mean stored in the first feature"""
+
+    def predict(self, X):
+        return np.asarray(X, dtype=float)[:, 0]
+
+def grouped_sample(rng, sizes, scales):
+    """Rows of several groups whose noise scale depends on the group"""
+    groups = np.concatenate([[name] * size for name, size in sizes.items()])
+    mean = rng.uniform(0, 100, len(groups))
+    noise = rng.normal(size=len(groups)) * np.array([scales[group] for group in groups])
+    return mean[:, None], mean + noise, pd.Series(groups, name='country')
+
+@pytest.fixture
+def modeling():
+    return PredictiveModeling(CONFIG)
+
+SCALES = {'quiet': 1.0, 'noisy': 5.0, 'small': 3.0}
+
+def test_group_quantiles_match_sorted_order_statistic(modeling):
+    rng = np.random.default_rng(0)
+    groups = rng.choice(['a', 'b', 'c'], 300)
+    residuals = rng.normal(size=300) * np.where(groups == 'a', 1, 4)
+    labels, q_group, q_global = modeling.conformal_quantiles(residuals, groups)
+
+    def expected(scores):
+        scores = np.sort(np.abs(scores))
+        return scores[int(np.ceil((len(scores) + 1) * (1 - ALPHA))) - 1]
+
+    assert q_global == expected(residuals)
+    for label, q in zip(labels, q_group):
+        assert q == expected(residuals[groups == label])
+
+def test_conformal_coverage_per_group_and_fallback(modeling):
+    rng = np.random.default_rng(1)
+    X_cal, y_cal, groups_cal = grouped_sample(rng, {'quiet': 500, 'noisy': 500, 'small': 5}, SCALES)
+    X, y, groups = grouped_sample(rng, {'quiet': 5000, 'noisy': 5000, 'small': 5000}, SCALES)
+    lower, upper = modeling.conformal_intervals(MeanModel(), X_cal, y_cal, X, groups_cal, groups)
+
+    labels, q_group, q_global = modeling.conformal_quantiles(y_cal - X_cal[:, 0], groups_cal)
+    # Menos de min_group_size filas de calibración: cuantil global
+    assert q_group[list(labels).index('small')] == q_global
+
+    for name in SCALES:
+        mask = (groups == name).to_numpy()
+        coverage = modeling.interval_metrics(y[mask], lower[mask], upper[mask])['interval_coverage']
+        assert coverage >= 1 - ALPHA - 0.02, name
+    # Los intervalos por grupo se adaptan al ruido de cada grupo
+    width = upper - lower
+    assert width[(groups == 'noisy').to_numpy()].mean() > 3 * width[(groups == 'quiet').to_numpy()].mean()
+
+def test_global_conformal_coverage_without_groups(modeling):
+    rng = np.random.default_rng(2)
+    X_cal, y_cal, _ = grouped_sample(rng, {'quiet': 500, 'noisy': 500}, SCALES)
+    X, y, _ = grouped_sample(rng, {'quiet': 5000, 'noisy': 5000}, SCALES)
+    lower, upper = modeling.conformal_intervals(MeanModel(), X_cal, y_cal, X)
+    assert np.allclose(upper - lower, (upper - lower)[0])
+    assert modeling.interval_metrics(y, lower, upper)['interval_coverage'] >= 1 - ALPHA - 0.02
+
+def test_unseen_groups_use_global_quantile(modeling):
+    rng = np.random.default_rng(3)
+    X_cal, y_cal, groups_cal = grouped_sample(rng, {'quiet': 200, 'noisy': 200}, SCALES)
+    X = np.array([[10.0], [20.0]])
+    groups = pd.Series(['quiet', 'unseen'])
+    lower, upper = modeling.conformal_intervals(MeanModel(), X_cal, y_cal, X, groups_cal, groups)
+
+    labels, q_group, q_global = modeling.conformal_quantiles(y_cal - X_cal[:, 0], groups_cal)
+    assert upper[0] - X[0, 0] == pytest.approx(q_group[list(labels).index('quiet')])
+    assert upper[1] - X[1, 0] == pytest.approx(q_global)
+    assert X[1, 0] - lower[1] == pytest.approx(q_global)
+
+def test_multi_column_groups(modeling):
+    residuals = np.arange(1, 21, dtype=float)
+    groups = pd.DataFrame({'country': ['A'] * 10 + ['B'] * 10, 'coffee_type': ['x'] * 20})
+    labels, q_group, _ = modeling.conformal_quantiles(residuals, groups)
+    assert list(labels) == [('A', 'x'), ('B', 'x')]
+    # ceil(11 * 0.9) = 10: el máximo de cada grupo
+    assert list(q_group) == [10.0, 20.0]
+
+def test_winkler_score():
+    metrics = PredictiveModeling(CONFIG).interval_metrics(
+        y_true=[0.0, 2.0, 5.0, 12.0], lower=np.ones(4), upper=np.full(4, 3.0)
+    )
+    # Anchura 2; penalizaciones 2/alpha * (1, 0, 2, 9)
+    assert metrics['interval_coverage'] == 0.25
+    assert metrics['interval_width'] == 2.0
+    assert metrics['interval_score'] == pytest.approx(2 + 20 * (1 + 0 + 2 + 9) / 4)
+
+def test_tree_quantile_intervals(modeling):
+    rng = np.random.default_rng(4)
+    X = rng.uniform(0, 10, size=(200, 2))
+    y = X[:, 0] + rng.normal(size=200)
+    model = RandomForestRegressor(n_estimators=20, random_state=0).fit(X, y)
+    lower, upper = modeling.tree_quantile_intervals(model, X[:5])
+
+    per_tree = np.stack([tree.predict(X[:5].astype(np.float32)) for tree in model.estimators_])
+    np.testing.assert_allclose(lower, np.quantile(per_tree, ALPHA / 2, axis=0))
+    np.testing.assert_allclose(upper, np.quantile(per_tree, 1 - ALPHA / 2, axis=0))
+    assert (lower <= upper).all()
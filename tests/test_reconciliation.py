@@ -0,0 +1,102 @@
+# tests/test_reconciliation.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from reconciliation import HierarchyReconciler, METHODS, TOTAL
+
+CONFIG = {
+    'preprocessing': {
+        'date_column': 'year',
+        'country_column': 'country',
+        'coffee_type_column': 'coffee_type',
+        'consumption_column': 'consumption_cups'
+    }
+}
+
+@pytest.fixture
+def reconciler(coffee_df):
+    return HierarchyReconciler(CONFIG).build(coffee_df)
+
+def incoherent_base(reconciler, horizons=2, seed=0):
+    """Base forecasts: the aggregated history plus independent noise per node"""
+    rng = np.random.default_rng(seed)
+    last = reconciler.history.iloc[:, -1].to_numpy()
+    values = last[:, None] * rng.uniform(0.8, 1.2, size=(len(last), horizons))
+    return pd.DataFrame(values, index=reconciler.index, columns=range(horizons))
+
+def test_hierarchy_layout(reconciler):
+    # total + 3 países + 2 tipos + 6 series
+    assert reconciler.S.shape == (12, 6)
+    assert reconciler.index[0] == (TOTAL, TOTAL)
+    assert reconciler.coherence_error(reconciler.history) == 0
+    assert reconciler.history.loc[(TOTAL, TOTAL), 2020] == pytest.approx(
+        sum(100.0 * (c + 1) + 10.0 * t + 2 for c in range(3) for t in range(2))
+    )
+
+@pytest.mark.parametrize('method', METHODS)
+@pytest.mark.parametrize('horizons', [1, 3])
+def test_every_method_is_coherent(reconciler, method, horizons):
+    base = incoherent_base(reconciler, horizons)
+    assert reconciler.coherence_error(base) > 1
+    residuals = incoherent_base(reconciler, 5, seed=1) - reconciler.history.iloc[:, [-1]].to_numpy()
+    reconciled = reconciler.reconcile(base, method=method, residuals=residuals)
+    assert reconciled.shape == base.shape
+    assert reconciler.coherence_error(reconciled) < 1e-8
+
+    # S · bottom reproduce todos los nodos
+    bottom = reconciled.iloc[reconciler.n_aggregates:].to_numpy()
+    np.testing.assert_allclose(reconciler.S @ bottom, reconciled.to_numpy(), atol=1e-8)
+
+@pytest.mark.parametrize('method', ['ols', 'wls_struct', 'wls_var'])
+def test_mint_matches_dense_formula(reconciler, method):
+    base = incoherent_base(reconciler, 2)
+    residuals = incoherent_base(reconciler, 5, seed=1) - reconciler.history.iloc[:, [-1]].to_numpy()
+    reconciled = reconciler.reconcile(base, method=method, residuals=residuals)
+
+    S = reconciler.S.toarray()
+    W_inv = np.diag(1 / reconciler._weights(method, residuals))
+    if method == 'ols':
+        assert np.allclose(W_inv, np.eye(len(S)))
+    elif method == 'wls_struct':
+        np.testing.assert_array_equal(np.diag(W_inv), 1 / np.array([6, 2, 2, 2, 3, 3, 1, 1, 1, 1, 1, 1]))
+    P = np.linalg.solve(S.T @ W_inv @ S, S.T @ W_inv)
+    expected = S @ P @ base.to_numpy()
+    np.testing.assert_allclose(reconciled.to_numpy(), expected, rtol=1e-10, atol=1e-8)
+
+def test_bottom_up_sums_bottom_forecasts(reconciler):
+    base = incoherent_base(reconciler, 2)
+    reconciled = reconciler.reconcile(base, method='bottom_up')
+    bottom = base.iloc[reconciler.n_aggregates:]
+    pd.testing.assert_frame_equal(reconciled.iloc[reconciler.n_aggregates:], bottom)
+    assert reconciled.loc[('Brazil', TOTAL)].tolist() == pytest.approx(
+        (base.loc[('Brazil', 'Arabica')] + base.loc[('Brazil', 'Robusta')]).tolist()
+    )
+    assert reconciled.loc[(TOTAL, TOTAL)].tolist() == pytest.approx(bottom.sum().tolist())
+
+def test_top_down_splits_total_by_historical_shares(reconciler, coffee_df):
+    base = incoherent_base(reconciler, 2)
+    reconciled = reconciler.reconcile(base, method='top_down')
+
+    # Proporción media de cada serie en el total de cada año
+    yearly = coffee_df.pivot_table(index=['country', 'coffee_type'], columns='year',
+                                   values='consumption_cups', aggfunc='sum')
+    shares = (yearly / yearly.sum()).mean(axis=1)
+    for key, share in shares.items():
+        assert reconciled.loc[key].tolist() == pytest.approx((share * base.loc[(TOTAL, TOTAL)]).tolist())
+    assert reconciled.loc[(TOTAL, TOTAL)].tolist() == pytest.approx(base.loc[(TOTAL, TOTAL)].tolist())
+
+def test_coherent_base_is_left_unchanged(reconciler):
+    coherent = reconciler.history.iloc[:, -2:]
+    for method in ('ols', 'wls_struct'):
+        reconciled = reconciler.reconcile(coherent, method=method)
+        np.testing.assert_allclose(reconciled.to_numpy(), coherent.to_numpy())
+
+def test_invalid_inputs(reconciler):
+    base = incoherent_base(reconciler, 1)
+    with pytest.raises(ValueError):
+        reconciler.reconcile(base, method='middle_out')
+    with pytest.raises(ValueError):
+        reconciler.reconcile(base, method='wls_var')
+    with pytest.raises(ValueError):
+        reconciler.reconcile(base.iloc[1:], method='ols')
@@ -0,0 +1,92 @@
+# tests/test_response_cache.py
+import time
+import sqlite3
+
+from response_cache import ResponseCache
+from generative_ai_chatbot import CoffeeAnalyticsChatbot
+
+def test_key_ignores_case_punctuation_and_whitespace():
+    cache = ResponseCache()
+    settings = {'model': 'test'}
+    key = cache.make_key("¿Cómo evolucionó el mercado?", 'v1', settings)
+    assert key == cache.make_key("cómo   evolucionó el MERCADO", 'v1', settings)
+    assert key != cache.make_key("cómo evolucionó el mercado", 'v2', settings)
+    assert key != cache.make_key("cómo evolucionó el mercado", 'v1', {'model': 'other'})
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = ResponseCache(memory_entries=2)
+    cache.set('a', 'A')
+    cache.set('b', 'B')
+    assert cache.get('a') == 'A'  # 'a' pasa a ser la más reciente
+    cache.set('c', 'C')
+    assert cache.get('b') is None
+    assert cache.get('a') == 'A'
+    assert cache.get('c') == 'C'
+
+def test_disk_tier_evicts_beyond_max_entries(tmp_path):
+    db_path = str(tmp_path / 'cache.sqlite')
+    cache = ResponseCache(db_path=db_path, max_entries=2, memory_entries=1)
+    for key in ('a', 'b', 'c'):
+        cache.set(key, key.upper())
+        time.sleep(0.01)
+    with sqlite3.connect(db_path) as connection:
+        keys = [row[0] for row in connection.execute("SELECT key FROM responses ORDER BY key")]
+    assert keys == ['b', 'c']
+
+def test_disk_tier_survives_restart(tmp_path):
+    db_path = str(tmp_path / 'cache.sqlite')
+    ResponseCache(db_path=db_path).set('a', 'A')
+    cache = ResponseCache(db_path=db_path)
+    assert cache.get('a') == 'A'
+    assert cache.stats()['disk_hits'] == 1
+    # Segunda lectura desde memoria
+    assert cache.get('a') == 'A'
+    assert cache.stats()['memory_hits'] == 1
+
+def test_entries_expire_after_ttl(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    cache = ResponseCache(db_path=str(tmp_path / 'cache.sqlite'), ttl_seconds=60)
+    cache.set('a', 'A')
+    now[0] += 59
+    assert cache.get('a') == 'A'
+    now[0] += 2
+    assert cache.get('a') is None
+    assert cache._execute("SELECT COUNT(*) FROM responses", fetch='one')[0] == 0
+
+def test_hit_rate():
+    cache = ResponseCache()
+    assert cache.stats()['hit_rate'] == 0.0
+    cache.set('a', 'A')
+    cache.get('a')
+    cache.get('a')
+    cache.get('missing')
+    stats = cache.stats()
+    assert (stats['memory_hits'], stats['misses']) == (2, 1)
+    assert stats['hit_rate'] == 2 / 3
+
+def test_chatbot_caches_llm_answers(coffee_df, stub_llm):
+    cache = ResponseCache()
+    question = "Explica la estrategia para el mercado de café"
+    first = CoffeeAnalyticsChatbot(coffee_df, 'test-key', cache=cache, llm=stub_llm, data_fingerprint='v1')
+    assert first.ask_question(question) == "respuesta del LLM"
+
+    # Otra sesión con los mismos datos: responde la caché, sin llamar al LLM
+    second = CoffeeAnalyticsChatbot(coffee_df, 'test-key', cache=cache, llm=stub_llm, data_fingerprint='v1')
+    assert second.ask_question(question.upper()) == "respuesta del LLM"
+    assert len(stub_llm.calls) == 1
+
+    # Datos distintos: nueva llamada
+    third = CoffeeAnalyticsChatbot(coffee_df, 'test-key', cache=cache, llm=stub_llm, data_fingerprint='v2')
+    third.ask_question(question)
+    assert len(stub_llm.calls) == 2
+
+def test_chatbot_does_not_cache_errors(coffee_df):
+    from conftest import StubLLM
+    cache = ResponseCache()
+    question = "Explica la estrategia para el mercado de café"
+    failing = CoffeeAnalyticsChatbot(
+        coffee_df, 'test-key', cache=cache, llm=StubLLM(error=RuntimeError('caído')), data_fingerprint='v1'
+    )
+    assert failing.ask_question(question).startswith("Error al procesar la pregunta")
+    assert cache.stats()['memory_entries'] == 0
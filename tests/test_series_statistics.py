@@ -0,0 +1,81 @@
+# tests/test_series_statistics.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from series_statistics import SeriesStatistics
+
+CONFIG = {
+    'preprocessing': {
+        'date_column': 'year',
+        'country_column': 'country',
+        'coffee_type_column': 'coffee_type',
+        'consumption_column': 'consumption_cups'
+    }
+}
+
+@pytest.fixture
+def df():
+    """Unsorted rows, a missing value, a two-row and a single-row series"""
+    rng = np.random.default_rng(0)
+    rows = [
+        {'country': country, 'coffee_type': coffee_type, 'year': year,
+         'consumption_cups': 100 + 7 * (year - 1990) + rng.normal(0, 5)}
+        for country in ('Brazil', 'Vietnam') for coffee_type in ('Arabica', 'Robusta')
+        for year in range(1990, 2021)
+    ]
+    rows += [
+        {'country': 'Kenya', 'coffee_type': 'Arabica', 'year': 2005, 'consumption_cups': 50.0},
+        {'country': 'Kenya', 'coffee_type': 'Arabica', 'year': 2009, 'consumption_cups': 80.0},
+        {'country': 'Peru', 'coffee_type': 'Arabica', 'year': 2010, 'consumption_cups': 30.0}
+    ]
+    df = pd.DataFrame(rows)
+    df.loc[(df['country'] == 'Vietnam') & (df['year'] == 1990), 'consumption_cups'] = np.nan
+    return df.sample(frac=1, random_state=0, ignore_index=True)
+
+def reference(df, x_col='year'):
+    """Per-series statistics with np.polyfit and an explicit CAGR"""
+    expected = {}
+    for key, rows in df.dropna(subset=['consumption_cups']).groupby(['country', 'coffee_type']):
+        rows = rows.sort_values(x_col)
+        x = rows[x_col].to_numpy(dtype=float)
+        y = rows['consumption_cups'].to_numpy()
+        periods = x[-1] - x[0]
+        expected[key] = {
+            'trend': np.polyfit(x, y, 1)[0] if len(rows) > 1 else np.nan,
+            'cagr': (y[-1] / y[0]) ** (1 / periods) - 1 if periods > 0 else np.nan,
+            'mean': y.mean(),
+            'count': len(y)
+        }
+    return pd.DataFrame.from_dict(expected, orient='index')
+
+def test_matches_polyfit_and_manual_cagr(df):
+    stats = SeriesStatistics(CONFIG).compute(df)
+    expected = reference(df)
+    assert list(stats.index) == list(expected.index)
+    for column in ('trend', 'cagr', 'mean', 'count'):
+        np.testing.assert_allclose(stats[column].to_numpy(dtype=float), expected[column].to_numpy(dtype=float),
+                                   rtol=1e-9, err_msg=column)
+
+def test_short_series(df):
+    stats = SeriesStatistics(CONFIG).compute(df)
+    # Dos puntos: la recta pasa por ambos
+    assert stats.loc[('Kenya', 'Arabica'), 'trend'] == pytest.approx(30 / 4)
+    assert stats.loc[('Kenya', 'Arabica'), 'cagr'] == pytest.approx((80 / 50) ** 0.25 - 1)
+    # Un punto: sin pendiente ni CAGR
+    single = stats.loc[('Peru', 'Arabica')]
+    assert single['count'] == 1 and single['mean'] == 30.0
+    assert np.isnan(single['trend']) and np.isnan(single['cagr']) and np.isnan(single['std'])
+
+def test_sub_annual_dates_use_fractional_years():
+    dates = pd.date_range('2018-01-01', periods=36, freq='MS')
+    df = pd.DataFrame({
+        'country': 'Brazil', 'coffee_type': 'Arabica', 'date': dates, 'year': dates.year,
+        'consumption_cups': 100 * 1.1 ** (np.arange(36) / 12)
+    })
+    stats = SeriesStatistics(CONFIG).compute(df)
+    fractional = dates.year + (dates.dayofyear - 1) / np.where(dates.is_leap_year, 366.0, 365.0)
+    expected = reference(df.assign(fractional=fractional), 'fractional').iloc[0]
+    assert stats['trend'].iloc[0] == pytest.approx(expected['trend'])
+    # Crecimiento del 10% anual
+    assert stats['cagr'].iloc[0] == pytest.approx(0.1, abs=2e-3)
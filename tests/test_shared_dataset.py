@@ -0,0 +1,55 @@
+# tests/test_shared_dataset.py
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import shared_dataset
+from shared_dataset import publish_dataset, load_shared_dataset, current_version
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        'country': ['Brazil', 'Vietnam', 'Kenya'],
+        'year': [2010, 2011, 2012],
+        'consumption_cups': [1.5, np.nan, 3.0]
+    })
+
+def versions(shared_dir):
+    return sorted(name for name in os.listdir(shared_dir) if name.endswith('.arrow'))
+
+def test_round_trip(tmp_path, df):
+    shared_dir = str(tmp_path)
+    publish_dataset(df, shared_dir)
+    pd.testing.assert_frame_equal(load_shared_dataset(shared_dir), df)
+
+def test_publish_keeps_the_previous_version(tmp_path, df):
+    shared_dir = str(tmp_path)
+    published = [os.path.basename(publish_dataset(df.head(n), shared_dir)) for n in (1, 2, 3)]
+    # La versión anterior sigue en disco para quien leyó el puntero viejo
+    assert versions(shared_dir) == published[1:]
+    assert current_version(shared_dir) == published[-1]
+    assert len(shared_dataset._load_version(shared_dir, published[1])) == 2
+
+    publish_dataset(df, shared_dir, keep_versions=1)
+    assert versions(shared_dir) == [current_version(shared_dir)]
+
+def test_load_retries_when_the_pointer_is_stale(tmp_path, df, monkeypatch):
+    shared_dir = str(tmp_path)
+    publish_dataset(df, shared_dir)
+    pointers = iter(['dataset-0.arrow', current_version(shared_dir)])
+    monkeypatch.setattr(shared_dataset, 'current_version', lambda _: next(pointers))
+    # La versión leída del puntero ya se borró: se relee el puntero
+    pd.testing.assert_frame_equal(load_shared_dataset(shared_dir), df)
+
+def test_load_gives_up_after_repeated_misses(tmp_path, df, monkeypatch):
+    shared_dir = str(tmp_path)
+    publish_dataset(df, shared_dir)
+    monkeypatch.setattr(shared_dataset, 'current_version', lambda _: 'dataset-0.arrow')
+    with pytest.raises(FileNotFoundError):
+        load_shared_dataset(shared_dir)
+
+def test_nothing_published(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        load_shared_dataset(str(tmp_path))
@@ -0,0 +1,36 @@
+# tests/test_startup_imports.py
+import os
+import sys
+import json
+import subprocess
+import textwrap
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Back ends que sólo deben importarse al usar la página que los necesita
+HEAVY_MODULES = ('prophet', 'sklearn', 'openai', 'umap', 'xgboost', 'lightgbm', 'mlflow', 'statsmodels')
+
+SCRIPT = textwrap.dedent("""
+    import sys, json, types
+    sys.path.insert(0, sys.argv[1])
+    try:
+        import streamlit
+    except ImportError:
+        # Sin streamlit instalado basta con un módulo mínimo: sólo se importa main
+        streamlit = types.ModuleType('streamlit')
+        streamlit.cache_resource = lambda func=None, **kwargs: func if func else (lambda f: f)
+        streamlit.cache_data = streamlit.cache_resource
+        sys.modules['streamlit'] = streamlit
+    import main
+    print(json.dumps(sorted(name.split('.')[0] for name in sys.modules)))
+""")
+
+def test_import_main_does_not_load_heavy_backends(tmp_path):
+    # Proceso nuevo (los módulos importados por otros tests no cuentan), fuera del repo
+    # para no dejar el log de la aplicación
+    output = subprocess.run(
+        [sys.executable, '-c', SCRIPT, os.path.join(REPO_DIR, 'src')],
+        cwd=tmp_path, capture_output=True, text=True, check=True
+    ).stdout
+    loaded = set(json.loads(output.strip().splitlines()[-1]))
+    assert not loaded & set(HEAVY_MODULES), sorted(loaded & set(HEAVY_MODULES))
@@ -0,0 +1,71 @@
+# tests/test_visualization.py
+import pytest
+
+import visualization
+from visualization import create_presentation_visualizations
+
+def _written(status):
+    return sorted(filename for filename, value in status.items() if value == 'written')
+
+@pytest.fixture
+def render_calls(monkeypatch):
+    """Record the rendered reports without building the figures"""
+    calls = []
+
+    def fake_render(output_dir, filename, plot, data):
+        calls.append(filename)
+        open(f'{output_dir}/{filename}', 'w').close()
+        return filename
+
+    monkeypatch.setattr(visualization, '_render', fake_render)
+    return calls
+
+def test_unchanged_reports_are_skipped(coffee_df, tmp_path, render_calls):
+    first = create_presentation_visualizations(coffee_df, str(tmp_path), countries=['Brazil'])
+    assert len(_written(first)) == len(visualization.REPORTS) + 1
+    second = create_presentation_visualizations(coffee_df, str(tmp_path), countries=['Brazil'])
+    assert _written(second) == []
+
+def test_changed_data_rewrites_only_affected_reports(coffee_df, tmp_path, render_calls):
+    create_presentation_visualizations(coffee_df, str(tmp_path), countries=['Brazil', 'Vietnam'])
+    coffee_df.loc[coffee_df['country'] == 'Vietnam', 'consumption_cups'] += 1
+    status = create_presentation_visualizations(coffee_df, str(tmp_path), countries=['Brazil', 'Vietnam'])
+    assert 'country_vietnam.html' in _written(status)
+    assert 'country_brazil.html' not in _written(status)
+    # El precio no cambió
+    assert 'price_trend.html' not in _written(status)
+
+def test_plotly_upgrade_rewrites_every_report(coffee_df, tmp_path, render_calls, monkeypatch):
+    create_presentation_visualizations(coffee_df, str(tmp_path), countries=['Brazil'])
+    monkeypatch.setattr(visualization.plotly, '__version__', '0.0.0-test')
+    status = create_presentation_visualizations(coffee_df, str(tmp_path), countries=['Brazil'])
+    assert _written(status) == sorted(status)
+
+def test_changed_plot_code_rewrites_that_report(coffee_df, tmp_path, render_calls, monkeypatch):
+    create_presentation_visualizations(coffee_df, str(tmp_path))
+
+    def restyled_global_trend(data):
+        return visualization.px.line(data, x='year', y='consumption_cups', title='Nuevo título')
+
+    aggregate, _ = visualization.REPORTS['global_trend.html']
+    monkeypatch.setitem(visualization.REPORTS, 'global_trend.html', (aggregate, restyled_global_trend))
+    status = create_presentation_visualizations(coffee_df, str(tmp_path))
+    assert _written(status) == ['global_trend.html']
+
+def test_reports_render(coffee_df, tmp_path):
+    status = create_presentation_visualizations(coffee_df, str(tmp_path), countries=['Ethiopia'])
+    for filename in status:
+        assert (tmp_path / filename).stat().st_size > 0
+
+def test_plotly_upgrade_rewrites_shared_bundle(coffee_df, tmp_path, render_calls, monkeypatch):
+    bundle = tmp_path / visualization.PLOTLYJS_FILE
+    create_presentation_visualizations(coffee_df, str(tmp_path))
+    bundle.write_text('// plotly.js anterior')
+
+    create_presentation_visualizations(coffee_df, str(tmp_path))
+    assert bundle.read_text() == '// plotly.js anterior'
+
+    monkeypatch.setattr(visualization.plotly, '__version__', '0.0.0-test')
+    monkeypatch.setattr(visualization, 'get_plotlyjs', lambda: '// plotly.js 0.0.0-test')
+    create_presentation_visualizations(coffee_df, str(tmp_path))
+    assert bundle.read_text() == '// plotly.js 0.0.0-test'